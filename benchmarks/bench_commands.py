@@ -0,0 +1,66 @@
+"""Measures the CPU cost of encoding one command into a request
+
+    python benchmarks/bench_commands.py [--number N]
+
+Compares encoding the full query string with `urlencode` on every call, and with
+`requests`, against splicing the variable fields into the command templates of
+`mebo.commands`. No request is sent: only the encoding is timed.
+"""
+
+import argparse
+import timeit
+from urllib.parse import urlencode
+
+from mebo.commands import CommandRegistry
+
+HOST = "192.168.1.10"
+
+COMMANDS = {
+    "fb_stop": {"req": "fb_stop"},
+    "inch_w_left": {"req": "inch_w_left"},
+    "move_forward": {"req": "move_forward", "dur": 1000, "value": 255},
+    "set_spk_volume": {"req": "set_spk_volume", "value": 6},
+}
+
+
+def urlencode_line(params):
+    return f"GET /?{urlencode(params)} HTTP/1.1\r\nHost: {HOST}\r\n\r\n".encode(
+        "latin-1"
+    )
+
+
+def requests_encoder():
+    try:
+        from requests import Request
+    except ImportError:
+        return None
+    url = f"http://{HOST}"
+    return lambda params: Request("GET", url, params=params).prepare().url
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=100000)
+    args = parser.parse_args()
+
+    encoders = {
+        "urlencode": urlencode_line,
+        "template": CommandRegistry(HOST),
+    }
+    prepare = requests_encoder()
+    if prepare is not None:
+        encoders["requests"] = prepare
+
+    print(f"ns per command, best of 5 x {args.number}")
+    print(f"{'command':<16}" + "".join(f"{name:>12}" for name in encoders))
+    for command, params in COMMANDS.items():
+        row = f"{command:<16}"
+        for encode in encoders.values():
+            number = args.number if encode is not prepare else args.number // 100
+            best = min(timeit.repeat(lambda: encode(params), number=number, repeat=5))
+            row += f"{best / number * 1e9:>12.0f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Measures how long `import mebo` takes in a fresh interpreter
+
+    python benchmarks/bench_import.py [--runs N]
+
+Compares a bare `import mebo` with one that also loads the dependencies it defers:
+zeroconf, requests, xml.etree and the mebo.stream package, plus asyncio for the
+asyncio client. The difference is what CLI tools save on every start.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+DEFERRED = [
+    "zeroconf",
+    "requests",
+    "xml.etree.ElementTree",
+    "mebo.stream.session",
+    "mebo.aio",
+]
+
+
+def timed_import(statement, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", statement], check=True)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    baseline = timed_import("pass", args.runs)
+    cases = {
+        "import mebo": "import mebo",
+        "+ deferred": "import mebo; " + "; ".join(f"import {m}" for m in DEFERRED),
+    }
+    print(f"{args.runs} runs each, interpreter startup subtracted")
+    print(f"{'case':<14} {'median ms':>10} {'min ms':>8}")
+    for name, statement in cases.items():
+        samples = timed_import(statement, args.runs)
+        median = statistics.median(samples) - statistics.median(baseline)
+        fastest = min(samples) - min(baseline)
+        print(f"{name:<14} {median * 1e3:>10.1f} {fastest * 1e3:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Compares the per-command cost of Mebo's transports against a simulated robot
+
+    python benchmarks/bench_transport.py [--commands N] [--close] [--latency S]
+
+Reports wall-clock latency percentiles and the CPU time spent per command, so the raw
+socket path can be compared with the `requests` path. The simulator runs in this
+process, so its share of the CPU time is the same for every transport. Its latency
+and jitter are seeded, so runs can be compared with each other.
+"""
+
+import argparse
+import statistics
+import time
+
+from mebo import Mebo
+from mebo.simulator import MeboSimulator
+from mebo.transport import TRANSPORTS
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def bench(transport, port, commands):
+    with Mebo(ip="127.0.0.1", port=port, autoconnect=False, transport=transport) as m:
+        # warm up: keep-alive detection and pool creation are not what we measure
+        m.stop()
+        latencies = []
+        cpu_start = time.process_time()
+        for _ in range(commands):
+            start = time.perf_counter()
+            m.stop()
+            latencies.append(time.perf_counter() - start)
+        cpu = time.process_time() - cpu_start
+        return latencies, cpu, m.transport.stats.as_dict()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--commands", type=int, default=2000)
+    parser.add_argument(
+        "--close", action="store_true", help="serve HTTP/1.0, closing every connection"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="simulated robot latency, seconds"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.0, help="simulated latency jitter, seconds"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = MeboSimulator(
+        latency=args.latency,
+        jitter=args.jitter,
+        keep_alive=not args.close,
+        seed=args.seed,
+    ).start()
+    port = server.port
+
+    print(
+        f"{args.commands} x fb_stop, {'HTTP/1.0' if args.close else 'HTTP/1.1'}, "
+        f"latency {args.latency * 1e3:.1f}ms +/- {args.jitter * 1e3:.1f}ms"
+    )
+    print(
+        f"{'transport':<10} {'p50 us':>8} {'p95 us':>8} {'p99 us':>8} "
+        f"{'mean us':>8} {'cpu us/cmd':>10}  counters"
+    )
+    for name in TRANSPORTS:
+        latencies, cpu, counters = bench(name, port, args.commands)
+        print(
+            f"{name:<10} "
+            f"{percentile(latencies, 50) * 1e6:>8.0f} "
+            f"{percentile(latencies, 95) * 1e6:>8.0f} "
+            f"{percentile(latencies, 99) * 1e6:>8.0f} "
+            f"{statistics.mean(latencies) * 1e6:>8.0f} "
+            f"{cpu / args.commands * 1e6:>10.0f}  {counters}"
+        )
+    server.close()
+
+
+if __name__ == "__main__":
+    main()
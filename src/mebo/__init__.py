@@ -2,8 +2,20 @@
 .. include:: ../README.rst
 """
 
+from .fleet import MeboFleet
 from .robot import Mebo
 
 __all__ = [
+    "AsyncMebo",
     "Mebo",
+    "MeboFleet",
 ]
+
+
+def __getattr__(name):
+    # asyncio is slow to import, so the asyncio client is loaded on first use
+    if name == "AsyncMebo":
+        from .aio import AsyncMebo
+
+        return AsyncMebo
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
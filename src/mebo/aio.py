@@ -0,0 +1,436 @@
+"""An asyncio-native client for the Mebo robot
+
+:class:`AsyncMebo` mirrors :class:`mebo.robot.Mebo`, but every command is a coroutine
+sent over non-blocking sockets, so a single event loop can drive many robots at once.
+
+>>> async def main():
+...     async with AsyncMebo("192.168.1.10") as m:
+...         await m.move("n", speed=255, dur=1000)
+...         await m.arm.up(dur=1000)
+...         print(await m.version)
+>>> asyncio.run(main())
+"""
+
+import asyncio
+import logging
+from http.client import HTTPException
+from ipaddress import AddressValueError, IPv4Address
+
+from .commands import CommandRegistry
+from .discovery import async_discover
+from .exceptions import (
+    MeboCommandError,
+    MeboConfigurationError,
+    MeboRequestError,
+)
+from .robot import (
+    DIRECTIONS,
+    MOVE_COMMANDS,
+    Arm,
+    Claw,
+    Mebo,
+    Speaker,
+    Wrist,
+    component,
+    iter_networks,
+    media_session,
+    parse_boundary_position,
+    parse_networks,
+    parse_value,
+)
+from .survey import SiteSurvey
+from .transport import (
+    DROPPED_ERRORS,
+    PooledConnection,
+    Response,
+    TransportStats,
+    parse_head,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class _AsyncConnection(PooledConnection):
+    """A stream pair with the bookkeeping the transport needs"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    def close(self):
+        self.writer.close()
+
+
+class AsyncTransport:
+    """Sends commands to the robot over non-blocking sockets
+
+    Connections are reused for as long as the robot keeps them open. When it closes
+    them, a replacement is connected in the background so the next command doesn't
+    wait for the TCP handshake.
+
+    :param host: hostname or IP address of the robot
+    :param port: port of the robot's HTTP server
+    :param timeout: seconds allowed for connecting and for each request/response exchange
+    :param pool_size: number of idle, connected sockets to keep ready
+    """
+
+    def __init__(self, host, port=80, timeout=10.0, pool_size=2):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.stats = TransportStats()
+
+        # None until the first response tells us otherwise
+        self.keep_alive = None
+
+        self._idle = []
+        self._serialize = CommandRegistry(host, port)
+        self._filling = None
+
+    def __repr__(self):
+        return (
+            f"<{self.__class__.__name__} {self.host}:{self.port} "
+            f"keep_alive={self.keep_alive} {self.stats.as_dict()}>"
+        )
+
+    async def close(self):
+        """Closes all idle connections. The transport reconnects on next use."""
+        if self._filling is not None:
+            self._filling.cancel()
+        while self._idle:
+            self._idle.pop().close()
+
+    async def request(self, params):
+        """Sends a command to the robot
+
+        :param params: query parameters of the command, e.g. ``{"req": "fb_stop"}``
+        :returns: :class:`mebo.transport.Response`
+        :raises: `OSError`, `asyncio.TimeoutError` or `http.client.HTTPException` \
+            if the exchange fails
+        """
+        line = self._serialize(params)
+        conn = self._idle.pop() if self._idle else await self._open()
+        try:
+            response, will_close = await self._send(conn, line)
+        except DROPPED_ERRORS:
+            conn.close()
+            if not conn.stale:
+                raise
+            # the robot dropped an idle connection; the command never reached it
+            conn = await self._open()
+            response, will_close = await self._send(conn, line)
+        except BaseException:
+            conn.close()
+            raise
+        self.keep_alive = not will_close
+        if will_close or len(self._idle) >= self.pool_size:
+            conn.close()
+            self._prefetch()
+        else:
+            conn.pooled = True
+            self._idle.append(conn)
+        return response
+
+    async def _open(self):
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout
+        )
+        self.stats.incr("connects")
+        return _AsyncConnection(reader, writer)
+
+    async def _send(self, conn, line):
+        if conn.served:
+            self.stats.incr("reuses")
+        response, will_close = await asyncio.wait_for(
+            self._exchange(conn, line), self.timeout
+        )
+        conn.served += 1
+        self.stats.incr("requests")
+        return response, will_close
+
+    async def _exchange(self, conn, line):
+        conn.writer.write(line)
+        await conn.writer.drain()
+        try:
+            head = await conn.reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            raise conn.closed_early()
+        status, reason, will_close, length = parse_head(head[:-4])
+        try:
+            if length is None:
+                body = await conn.reader.read()
+            else:
+                body = await conn.reader.readexactly(length)
+        except asyncio.IncompleteReadError:
+            raise HTTPException("Connection closed before the body was received")
+        return Response(status, reason, body), will_close
+
+    def _prefetch(self):
+        if self._filling is None or self._filling.done():
+            self._filling = asyncio.ensure_future(self._fill())
+
+    async def _fill(self):
+        try:
+            while len(self._idle) < self.pool_size:
+                conn = await self._open()
+                conn.pooled = True
+                self._idle.append(conn)
+        except (OSError, asyncio.TimeoutError) as e:
+            logger.debug("Unable to pre-connect to %s:%s: %s", self.host, self.port, e)
+
+
+class AsyncMebo:
+    """Mebo represents a single physical robot, controlled from an asyncio event loop
+
+    The API mirrors :class:`mebo.robot.Mebo`. Commands and component actions are
+    coroutines, and queries exposed as properties on `Mebo` (``version``, ``model`` and
+    ``is_connected``) are awaitable properties here.
+
+    :param ip: IPv4 address of the robot as a string.
+    :type ip: str
+    :param port: port of the HTTP control API. default: 80
+    :type port: int
+    :param timeout: seconds allowed for each request. default: 10
+    :type timeout: float
+    """
+
+    RTSP_PORT = Mebo.RTSP_PORT
+    HTTP_PORT = Mebo.HTTP_PORT
+
+    def __init__(self, ip, port=None, timeout=10.0):
+        try:
+            self._ip = IPv4Address(ip)
+        except AddressValueError:
+            raise MeboConfigurationError(f"{ip} is not a valid IPv4Address")
+        self._port = port or self.HTTP_PORT
+        self._transport = AsyncTransport(
+            str(self._ip), port=self._port, timeout=timeout
+        )
+        self._move_directions = dict(zip(DIRECTIONS, MOVE_COMMANDS))
+
+        self._rtsp_session = None
+
+    @classmethod
+    async def discover(cls, mac=None, name=None, timeout=3, **kwargs):
+        """Finds a robot on the LAN and returns an `AsyncMebo` for it
+
+        Returns as soon as a matching robot resolves over mDNS.
+
+        :param mac: MAC address of the wanted robot. default: the first one found
+        :param name: mDNS name of the wanted robot. default: any
+        :param timeout: seconds to wait for it. default: 3
+        :param kwargs: passed on to `AsyncMebo`
+        :raises: :class:`mebo.exceptions.MeboDiscoveryError` if no robot is found
+
+        >>> m = await AsyncMebo.discover(mac="aa:bb:cc:dd:ee:ff")
+        """
+        robot = await async_discover(mac=mac, name=name, timeout=timeout)
+        return cls(robot.ip, **kwargs)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        """Closes any open connections to the robot"""
+        await self._transport.close()
+
+    @property
+    def ip(self) -> IPv4Address:
+        """The IPv4Address of the robot on the LAN"""
+        return self._ip
+
+    @property
+    def endpoint(self):
+        """HTTP Endpoint serving the Mebo control API"""
+        if self._port == self.HTTP_PORT:
+            return f"http://{self.ip}"
+        return f"http://{self.ip}:{self._port}"
+
+    @property
+    def transport(self):
+        """The :class:`AsyncTransport` carrying commands to the robot"""
+        return self._transport
+
+    async def _request(self, **params):
+        """private coroutine to submit HTTP requests to Mebo's API
+
+        :param params: arguments to pass as query params to the Mebo API
+
+        :returns: The :class:`mebo.transport.Response`
+        """
+        try:
+            response = await self._transport.request(params)
+            response.raise_for_status()
+            return response
+        except (OSError, HTTPException, asyncio.TimeoutError) as e:
+            raise MeboRequestError(f"Request to Mebo failed: {e}")
+
+    async def _query(self, req):
+        try:
+            resp = await self._request(req=req)
+            return parse_value(resp.text)
+        except MeboRequestError as e:
+            logger.debug("Error requesting %s: %s", req, e)
+            return None
+
+    @property
+    def version(self):
+        """awaitable software version of the robot, or None if it can't be reached
+
+        >>> await m.version == '03.02.37'
+        """
+        return self._query("get_version")
+
+    @property
+    def model(self):
+        """awaitable robot model. For this version, always expected to be `001`"""
+        return self._query("get_model")
+
+    @property
+    def is_connected(self):
+        """awaitable; True if the version can be retrieved via HTTP"""
+        return self._is_connected()
+
+    async def _is_connected(self):
+        return await self.version is not None
+
+    async def start_media(self):
+        """Negotiates the RTSP session and starts capturing the audio and video streams
+
+        RTSP negotiation is blocking, so it runs on the loop's default executor.
+
+        :returns: the :class:`mebo.stream.session.RTSPSession`
+        """
+        loop = asyncio.get_running_loop()
+        if self._rtsp_session is None:
+            self._rtsp_session = await loop.run_in_executor(
+                None, media_session, self.ip, self.RTSP_PORT
+            )
+        await loop.run_in_executor(None, self._rtsp_session.start_streams)
+        return self._rtsp_session
+
+    async def visible_networks(self):
+        """Retrieves a dictionary of name to `WirelessNetwork` visible to Mebo"""
+        resp = await self._request(req="get_rt_list")
+        return parse_networks(resp.text)
+
+    async def survey(self, interval=10.0, threshold=3, scans=None):
+        """Scans for wireless networks periodically, yielding only what changed
+
+        See :meth:`mebo.robot.Mebo.survey`.
+
+        >>> async for diff in m.survey(interval=30):
+        ...     print(sorted(diff.added), sorted(diff.lost))
+        """
+        loop = asyncio.get_running_loop()
+        site = SiteSurvey(threshold)
+        next_scan = loop.time()
+        while scans is None or site.scans < scans:
+            delay = next_scan - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            next_scan = max(next_scan, loop.time()) + interval
+            resp = await self._request(req="get_rt_list")
+            yield site.update(iter_networks(resp.content))
+
+    async def add_router(self, auth_type, ssid, password, index=1):
+        """Save a wireless network to the Mebo's list of routers
+
+        Note that the parameters are passed to the robot as query params, completely in the clear.
+        """
+        await self._request(
+            req="setup_wireless_save",
+            auth=auth_type,
+            ssid=ssid,
+            key=password,
+            index=index,
+        )
+
+    async def set_scan_timer(self, value=30):
+        await self._request(req="set_scan_timer", value=value)
+
+    async def restart(self):
+        """Restarts the Mebo"""
+        await self._request(req="restart_system")
+
+    async def set_timer_state(self, value=0):
+        await self._request(req="set_timer_state", value=value)
+
+    async def get_wifi_cert(self):
+        resp = await self._request(req="get_wifi_cert")
+        return parse_value(resp.text)
+
+    async def get_boundary_position(self):
+        """Gets boundary positions for the arm, claw and wrist axes
+
+        :returns: dictionary of functions to boundary positions
+        """
+        resp = await self._request(req="get_boundary_position")
+        return parse_boundary_position(resp.text)
+
+    @property
+    def move_directions(self):
+        return self._move_directions
+
+    async def move(self, direction, speed=255, dur=1000):
+        """Move the robot in a given direction at a speed for a given duration
+
+        See :meth:`mebo.robot.Mebo.move`
+        """
+        command = self._move_directions.get(direction.lower())
+        if command is None:
+            raise MeboCommandError(
+                f"Direction must be one of the map directions: {self._move_directions.keys()}"
+            )
+        await self._request(req=command, dur=dur, value=min(speed, 255))
+
+    async def turn(self, direction):
+        """Turns a very small amount in the given direction
+
+        :param direction: one of R or L
+        """
+        direction = direction.lower()[0]
+        if direction not in {"r", "l"}:
+            raise MeboCommandError(
+                'Direction for turn must be either "right", "left", "l", or "r"'
+            )
+        await self._request(req="inch_right" if direction == "r" else "inch_left")
+
+    async def stop(self):
+        await self._request(req="fb_stop")
+
+    claw = component(
+        Claw,
+        """The claw component at the end of Mebo's arm
+
+        >>> await m.claw.open(dur=1000)
+        """,
+    )
+
+    wrist = component(
+        Wrist,
+        """The wrist component of the robot
+
+        >>> await m.wrist.rotate_right()
+        """,
+    )
+
+    arm = component(
+        Arm,
+        """The arm component of mebo
+
+        >>> await m.arm.up(dur=1000)
+        """,
+    )
+
+    speaker = component(
+        Speaker,
+        """The speaker of mebo
+
+        >>> await m.speaker.set_volume(value=6)
+        """,
+    )
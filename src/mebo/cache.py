@@ -0,0 +1,77 @@
+"""Time-limited caching of the robot's read-only queries"""
+
+import threading
+import time
+
+# API command -> seconds a result stays fresh. None means until invalidated.
+DEFAULT_TTLS = {
+    "get_version": 5.0,
+    "get_model": None,
+    "get_wifi_cert": 30.0,
+    "get_boundary_position": 5.0,
+}
+
+
+class TTLCache:
+    """Remembers query results for a configurable time
+
+    Queries without a configured lifetime are never cached.
+
+    :param ttls: query -> lifetime in seconds, overriding `DEFAULT_TTLS`
+    :param clock: function returning the current time in seconds
+    """
+
+    def __init__(self, ttls=None, clock=time.monotonic):
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._entries = {}
+        # bumped by invalidate() so results fetched before it aren't stored after it
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.stats()}>"
+
+    def get(self, query, fetch):
+        """Returns the cached result of `query`, calling `fetch()` if it is missing or stale"""
+        if query not in self.ttls:
+            return fetch()
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(query)
+            if entry is not None and (entry[0] is None or entry[0] > now):
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+        value = fetch()
+        ttl = self.ttls[query]
+        with self._lock:
+            if generation == self._generation:
+                self._entries[query] = (None if ttl is None else now + ttl, value)
+        return value
+
+    def invalidate(self, *queries):
+        """Forgets the results of `queries`, or of every query if none are given"""
+        with self._lock:
+            self._generation += 1
+            if not queries:
+                self._entries.clear()
+            for query in queries:
+                self._entries.pop(query, None)
+
+    def stats(self):
+        """Hit and miss counters, and the number of cached results"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
@@ -0,0 +1,123 @@
+"""Request lines for Mebo's API commands, serialized ahead of time
+
+Almost every command Mebo understands is a fixed ``req`` parameter, optionally
+followed by a duration, a value or a speed. Each command is encoded once per robot
+into a :class:`CommandTemplate`; sending it again only encodes those variable fields.
+
+>>> commands = CommandRegistry("192.168.1.10")
+>>> commands({"req": "move_forward", "dur": 1000, "value": 255})
+b'GET /?req=move_forward&dur=1000&value=255 HTTP/1.1\\r\\nHost: 192.168.1.10\\r\\n\\r\\n'
+"""
+
+from urllib.parse import quote_plus, urlencode
+
+# query parameters spliced into a command's template. Commands with any other
+# parameter, such as ``setup_wireless_save``, are encoded in full on every call
+VARIABLE_FIELDS = frozenset(["dur", "value", "speed"])
+
+
+def encode_value(value):
+    """Encodes one query parameter value exactly as `urllib.parse.urlencode` does"""
+    if type(value) is int:
+        return str(value)
+    return quote_plus(str(value))
+
+
+class CommandTemplate:
+    """The serialized request for one API command
+
+    :param command: the API command, e.g. 'c_open'
+    :param host_header: value of the ``Host`` header
+    """
+
+    __slots__ = ("command", "target", "line", "_head", "_tail")
+
+    def __init__(self, command, host_header):
+        self.command = command
+        # request target and complete request line without any variable field
+        self.target = f"/?{urlencode({'req': command})}"
+        self._head = f"GET {self.target}"
+        self._tail = f" HTTP/1.1\r\nHost: {host_header}\r\n\r\n"
+        self.line = f"{self._head}{self._tail}".encode("latin-1")
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.target}>"
+
+    def render(self, fields):
+        """The request line with `fields`, encoded by :meth:`CommandRegistry.fields`"""
+        if not fields:
+            return self.line
+        return f"{self._head}{fields}{self._tail}".encode("latin-1")
+
+
+class CommandRegistry:
+    """Serializes command parameters into complete HTTP/1.1 request messages
+
+    A :class:`CommandTemplate` is built the first time a command is sent, and reused
+    for every later call, splicing in only the values of `VARIABLE_FIELDS`. A
+    parameterless command such as ``fb_stop`` costs a dictionary lookup.
+
+    :param host: hostname or IP address of the robot
+    :param port: port of the robot's HTTP server
+    """
+
+    # bound on the number of distinct commands kept around
+    MAX_TEMPLATES = 256
+
+    def __init__(self, host, port=80):
+        self.host_header = host if port == 80 else f"{host}:{port}"
+        self._templates = {}
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.host_header} commands={len(self)}>"
+
+    def __len__(self):
+        return len(self._templates)
+
+    def __call__(self, params):
+        """The complete request message for `params`, as bytes"""
+        template = self.template(params)
+        if template is None:
+            return (
+                f"GET /?{urlencode(params)} HTTP/1.1\r\n"
+                f"Host: {self.host_header}\r\n\r\n"
+            ).encode("latin-1")
+        return template.render(self.fields(params))
+
+    def target(self, params):
+        """The request target (path and query) for `params`"""
+        template = self.template(params)
+        if template is None:
+            return f"/?{urlencode(params)}"
+        return template.target + self.fields(params)
+
+    def template(self, params):
+        """The template that `params` can be spliced into, or None if there is none
+
+        :param params: query parameters starting with ``req``
+        """
+        command = params.get("req")
+        if command is None:
+            return None
+        if len(params) > 1 and (
+            next(iter(params)) != "req"
+            or not VARIABLE_FIELDS.issuperset(params.keys() - {"req"})
+        ):
+            return None
+        template = self._templates.get(command)
+        if template is None:
+            template = CommandTemplate(command, self.host_header)
+            if len(self._templates) < self.MAX_TEMPLATES:
+                self._templates[command] = template
+        return template
+
+    @staticmethod
+    def fields(params):
+        """The encoded ``&name=value`` pairs following ``req`` in `params`"""
+        if len(params) == 1:
+            return ""
+        return "".join(
+            f"&{name}={encode_value(value)}"
+            for name, value in params.items()
+            if name != "req"
+        )
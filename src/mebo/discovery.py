@@ -0,0 +1,528 @@
+"""Continuous discovery of robots on the LAN
+
+A :class:`DiscoveryService` browses mDNS for as long as it runs and keeps a registry of
+the robots it has seen. One service, with one :class:`zeroconf.Zeroconf`, is shared by
+every robot in the process (see :func:`shared_service`), so a new
+:class:`mebo.robot.Mebo` for a robot already on the network resolves at once.
+
+>>> service = shared_service()
+>>> unsubscribe = service.subscribe(lambda event, robot: print(event, robot.mac))
+>>> service.wait_for(mac="aa:bb:cc:dd:ee:ff", timeout=3)
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.client import HTTPConnection, HTTPException
+from ipaddress import ip_network
+
+from .exceptions import MeboDiscoveryError
+
+logger = logging.getLogger(__name__)
+
+# all mebos use this as their mDNS domain. Typically the robot
+# will be named Camera-{mac_address}._camer._tcp.local"
+MDNS_DOMAIN = "_camera._tcp.local."
+
+ADDED = "added"
+UPDATED = "updated"
+REMOVED = "removed"
+
+RobotRecord = namedtuple("RobotRecord", ["mac", "ip", "name", "last_seen"])
+RobotRecord.__doc__ = """A robot seen on the LAN
+
+:param mac: colon-separated MAC address
+:param ip: IPv4 address, as a string
+:param name: mDNS service name
+:param last_seen: :func:`time.monotonic` time of its latest announcement
+"""
+
+
+def parse_service_properties(properties):
+    """The MAC and IP addresses a robot advertises over mDNS
+
+    :param properties: the `properties` of a :class:`zeroconf.ServiceInfo`
+    :returns: (mac, ip), with the MAC address colon-separated
+    """
+    props = {k.decode("ascii"): v.decode("ascii") for k, v in properties.items()}
+    mac = ":".join("".join(p) for p in zip(props["mac"][::2], props["mac"][1::2]))
+    return mac, props["ip"]
+
+
+def cache_path():
+    """Where discovered robots are remembered: ``$XDG_CACHE_HOME/mebo/robots.json``"""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(base, "mebo", "robots.json")
+
+
+def _get(ip, port, req, timeout):
+    """The body of a successful response to `req`, or None"""
+    connection = HTTPConnection(ip, port, timeout=timeout)
+    try:
+        connection.request("GET", f"/?req={req}")
+        response = connection.getresponse()
+        body = response.read().decode("ascii", "replace")
+    except (OSError, HTTPException):
+        return None
+    finally:
+        connection.close()
+    if response.status != 200 or not body.startswith(req):
+        return None
+    return body
+
+
+def probe(ip, port=80, timeout=0.3):
+    """Checks with a single request whether a robot answers at `ip`
+
+    :returns: True if `get_version` succeeded within `timeout` seconds
+    """
+    return _get(ip, port, "get_version", timeout) is not None
+
+
+def identify(ip, port=80, timeout=0.3):
+    """Checks that a Mebo answers at `ip`, and not just any HTTP server
+
+    :returns: True if `get_version` succeeds and `get_model` reports model 001
+    """
+    if not probe(ip, port, timeout):
+        return False
+    model = _get(ip, port, "get_model", timeout)
+    return model is not None and model.partition(":")[2].strip() == "001"
+
+
+def neighbor_mac(ip):
+    """The MAC address the system's neighbour (ARP) table holds for `ip`, or None
+
+    Only Linux's table, ``/proc/net/arp``, is read. Elsewhere this is always None.
+    """
+    try:
+        with open("/proc/net/arp") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) > 3 and fields[0] == ip:
+                    mac = fields[3].lower()
+                    # an incomplete entry: the address didn't answer ARP
+                    return None if mac == "00:00:00:00:00:00" else mac
+    except OSError:
+        pass
+    return None
+
+
+def sweep(network, port=80, timeout=0.3, max_workers=128):
+    """Finds robots by probing every address of a network, for LANs without multicast
+
+    Addresses are probed concurrently, by at most `max_workers` requests at a time, so a
+    /24 takes about ``254 / max_workers * timeout`` seconds when hosts don't answer.
+
+    :param network: CIDR range, e.g. '192.168.1.0/24'
+    :param timeout: seconds each probe may take
+    :returns: an iterator over the IP addresses of robots, as they answer
+
+    >>> next(sweep("192.168.1.0/24"))
+    '192.168.1.10'
+    """
+    network = ip_network(network, strict=False)
+    # before Python 3.8, a /32 has no hosts() other than its address
+    hosts = [str(host) for host in network.hosts()] or [str(network.network_address)]
+    pool = ThreadPoolExecutor(
+        max_workers=min(max_workers, len(hosts)), thread_name_prefix="mebo-sweep"
+    )
+    futures = {pool.submit(identify, ip, port, timeout): ip for ip in hosts}
+    try:
+        for future in as_completed(futures):
+            if future.result():
+                logger.debug("Mebo answered at %s", futures[future])
+                yield futures[future]
+    finally:
+        # the caller may stop at the first robot; don't wait for the other probes
+        for future in futures:
+            future.cancel()
+        pool.shutdown(wait=False)
+
+
+class DiscoveryCache:
+    """Robots discovered by earlier runs, remembered on disk
+
+    Entries are only hints: the robot may have moved or be switched off, so an address
+    from the cache should be checked, e.g. with :func:`probe`, before it is trusted.
+    Errors reading or writing the file are logged and otherwise ignored.
+
+    :param path: the JSON file to use. default: :func:`cache_path`
+    """
+
+    # most robots probed by :meth:`find`, all at once
+    MAX_PROBES = 8
+
+    def __init__(self, path=None):
+        self._path = path
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} path={self.path}>"
+
+    @property
+    def path(self):
+        return self._path or cache_path()
+
+    def load(self):
+        """The remembered robots, most recently seen first
+
+        :returns: a list of :class:`RobotRecord`, whose `last_seen` is a \
+            :func:`time.time` timestamp
+        """
+        records = []
+        for mac, entry in self._read().items():
+            try:
+                record = RobotRecord(
+                    mac, entry["ip"], entry["name"], float(entry["seen"])
+                )
+            except (KeyError, TypeError, ValueError):
+                record = None
+            if record is None or not all(isinstance(v, str) for v in record[:3]):
+                logger.debug("Ignoring malformed discovery cache entry for %s", mac)
+                continue
+            records.append(record)
+        return sorted(records, key=lambda record: record.last_seen, reverse=True)
+
+    def find(self, port=80, mac=None, timeout=0.3):
+        """The most recently seen robot that still answers at its remembered address
+
+        Up to `MAX_PROBES` robots are probed at once, so this takes at most about
+        `timeout` seconds. Robots that don't answer, or whose address now belongs to
+        another MAC (see :func:`neighbor_mac`), are forgotten.
+
+        :param mac: MAC address of the wanted robot. default: any
+        :param timeout: seconds each probe may take
+        :returns: a :class:`RobotRecord`, or None if no remembered robot answers
+        """
+        candidates = [
+            robot for robot in self.load() if mac is None or robot.mac == mac
+        ][: self.MAX_PROBES]
+        if not candidates:
+            return None
+        pool = ThreadPoolExecutor(
+            max_workers=len(candidates), thread_name_prefix="mebo-cache"
+        )
+        futures = [pool.submit(_still_at, robot, port, timeout) for robot in candidates]
+        gone = []
+        try:
+            for robot, future in zip(candidates, futures):
+                if future.result():
+                    return robot
+                gone.append(robot.mac)
+            return None
+        finally:
+            # the robots not checked yet are older; don't wait for them
+            pool.shutdown(wait=False)
+            if gone:
+                self.forget(*gone)
+
+    def remember(self, record):
+        """Saves a robot's address"""
+        with self._lock:
+            entries = self._read()
+            entries[record.mac] = {
+                "ip": record.ip,
+                "name": record.name,
+                "seen": time.time(),
+            }
+            self._write(entries)
+
+    def forget(self, *macs):
+        """Drops the robots with these MAC addresses"""
+        with self._lock:
+            entries = self._read()
+            forgotten = [mac for mac in macs if entries.pop(mac, None) is not None]
+            if forgotten:
+                self._write(entries)
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.debug("Ignoring discovery cache %s: %s", self.path, e)
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def _write(self, entries):
+        path = self.path
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # written aside and renamed, so readers never see a partial file
+            temporary = f"{path}.{os.getpid()}.tmp"
+            with open(temporary, "w") as f:
+                json.dump(entries, f, indent=2, sort_keys=True)
+            os.replace(temporary, path)
+        except OSError as e:
+            logger.debug("Unable to save discovery cache %s: %s", path, e)
+
+
+def _still_at(robot, port, timeout):
+    """True if `robot` answers at its remembered address, and the address is its own"""
+    if not probe(robot.ip, port, timeout):
+        logger.debug("Mebo(mac:%s) no longer answers at %s", robot.mac, robot.ip)
+        return False
+    mac = neighbor_mac(robot.ip)
+    if mac is not None and mac != robot.mac.lower():
+        logger.debug("%s belongs to %s now, not Mebo(mac:%s)", robot.ip, mac, robot.mac)
+        return False
+    return True
+
+
+class DiscoveryService:
+    """Browses mDNS in the background and keeps a registry of robots
+
+    Subscribers are called as ``callback(event, robot)`` from zeroconf's thread, where
+    `event` is one of `ADDED`, `UPDATED` or `REMOVED` and `robot` is a
+    :class:`RobotRecord`.
+
+    :param zeroconf: the :class:`zeroconf.Zeroconf` to browse with. default: a new \
+        IPv4-only instance, closed along with the service
+    """
+
+    def __init__(self, zeroconf=None):
+        self.started = None
+        self._zeroconf = zeroconf
+        self._owns_zeroconf = zeroconf is None
+        self._browser = None
+        self._robots = {}
+        self._listeners = []
+        self._lock = threading.Condition()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} robots={sorted(self._robots)}>"
+
+    def __len__(self):
+        return len(self._robots)
+
+    @property
+    def running(self):
+        return self._browser is not None
+
+    @property
+    def uptime(self):
+        """Seconds since the service started browsing, or 0 if it isn't running"""
+        return time.monotonic() - self.started if self.running else 0.0
+
+    def start(self):
+        """Starts browsing for robots. Does nothing if already browsing."""
+        with self._lock:
+            if self.running:
+                return self
+            # zeroconf is slow to import; only load it once discovery is needed
+            from zeroconf import IPVersion, ServiceBrowser, Zeroconf
+
+            if self._zeroconf is None:
+                self._zeroconf = Zeroconf(ip_version=IPVersion.V4Only)
+            logger.debug("Starting search for Mebo...")
+            self.started = time.monotonic()
+            self._browser = ServiceBrowser(
+                self._zeroconf, MDNS_DOMAIN, handlers=[self._on_service]
+            )
+        return self
+
+    def close(self):
+        """Stops browsing. The registry keeps the robots already seen."""
+        with self._lock:
+            browser, self._browser = self._browser, None
+        if browser is not None:
+            browser.cancel()
+        if self._owns_zeroconf and self._zeroconf is not None:
+            self._zeroconf.close()
+            self._zeroconf = None
+
+    def robots(self):
+        """Every robot in the registry, as :class:`RobotRecord`"""
+        with self._lock:
+            return list(self._robots.values())
+
+    def get(self, mac=None, name=None):
+        """The first robot in the registry matching `mac` and `name`, or None"""
+        with self._lock:
+            return self._match(mac, name)
+
+    def wait_for(self, mac=None, name=None, timeout=3):
+        """Waits until a robot matching `mac` and `name` is in the registry
+
+        :param mac: MAC address of the wanted robot. default: any
+        :param name: mDNS name of the wanted robot. default: any
+        :returns: its :class:`RobotRecord`, or None if none appeared within `timeout`
+        """
+        with self._lock:
+            self._lock.wait_for(lambda: self._match(mac, name), timeout)
+            return self._match(mac, name)
+
+    def wait_until(self, predicate, timeout):
+        """Waits until `predicate()` is true, re-evaluating it whenever the registry
+        changes
+
+        :returns: the last result of `predicate()`
+        """
+        with self._lock:
+            return self._lock.wait_for(predicate, max(timeout, 0))
+
+    def subscribe(self, callback):
+        """Registers `callback` for registry events
+
+        :returns: a function that unregisters it
+        """
+        with self._lock:
+            self._listeners.append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._listeners:
+                    self._listeners.remove(callback)
+
+        return unsubscribe
+
+    def update(self, mac, ip, name):
+        """Records a robot's announcement, as if it had come from mDNS"""
+        with self._lock:
+            previous = self._robots.get(mac)
+            record = RobotRecord(mac, ip, name, time.monotonic())
+            self._robots[mac] = record
+            self._lock.notify_all()
+        if previous is None:
+            self._emit(ADDED, record)
+        elif previous[:3] != record[:3]:
+            self._emit(UPDATED, record)
+
+    def remove(self, name):
+        """Forgets the robot advertised under mDNS name `name`"""
+        with self._lock:
+            record = self._match(None, name)
+            if record is None:
+                return
+            del self._robots[record.mac]
+            self._lock.notify_all()
+        self._emit(REMOVED, record)
+
+    def _match(self, mac, name):
+        for record in self._robots.values():
+            if (mac is None or record.mac == mac) and (
+                name is None or record.name == name
+            ):
+                return record
+        return None
+
+    def _emit(self, event, record):
+        logger.debug("%s: Mebo(mac:%s) at %s", event, record.mac, record.ip)
+        for callback in list(self._listeners):
+            try:
+                callback(event, record)
+            except Exception:
+                logger.exception("Error in discovery listener %s", callback)
+
+    def _on_service(self, zeroconf, service_type, name, state_change):
+        from zeroconf import ServiceStateChange
+
+        if not name.endswith(MDNS_DOMAIN):
+            logger.debug("Ignoring service %s", name)
+            return
+        if state_change is ServiceStateChange.Removed:
+            self.remove(name)
+            return
+        info = zeroconf.get_service_info(service_type, name)
+        if info is None:
+            return
+        try:
+            mac, ip = parse_service_properties(info.properties)
+        except (KeyError, UnicodeDecodeError):
+            logger.debug("Ignoring %s: it doesn't look like a Mebo", name)
+            return
+        self.update(mac, ip, name)
+
+
+async def async_discover(mac=None, name=None, timeout=3, zeroconf=None):
+    """Finds a robot with zeroconf's asyncio API
+
+    Returns as soon as a robot matching `mac` and `name` resolves, so it can run
+    alongside other startup work:
+
+    >>> robot, _ = await asyncio.gather(async_discover(mac="aa:bb:cc:dd:ee:ff"), setup())
+
+    :param mac: MAC address of the wanted robot. default: any
+    :param name: mDNS name of the wanted robot. default: any
+    :param timeout: seconds to wait for it
+    :param zeroconf: the :class:`zeroconf.asyncio.AsyncZeroconf` to browse with. \
+        default: a new IPv4-only instance, closed before returning
+    :returns: the robot's :class:`RobotRecord`
+    :raises: :class:`mebo.exceptions.MeboDiscoveryError` if it isn't found in time
+    """
+    import asyncio
+
+    from zeroconf import IPVersion, ServiceStateChange
+    from zeroconf.asyncio import AsyncServiceBrowser, AsyncServiceInfo, AsyncZeroconf
+
+    loop = asyncio.get_running_loop()
+    found = loop.create_future()
+    resolving = set()
+    # zeroconf passes the service name to handlers as `name`
+    wanted_name = name
+    owned = zeroconf is None
+    if owned:
+        zeroconf = AsyncZeroconf(ip_version=IPVersion.V4Only)
+
+    async def resolve(service_type, service_name):
+        info = AsyncServiceInfo(service_type, service_name)
+        if not await info.async_request(zeroconf.zeroconf, timeout * 1000):
+            return
+        try:
+            robot_mac, ip = parse_service_properties(info.properties)
+        except (KeyError, UnicodeDecodeError):
+            logger.debug("Ignoring %s: it doesn't look like a Mebo", service_name)
+            return
+        if mac is not None and robot_mac != mac:
+            return
+        if not found.done():
+            found.set_result(RobotRecord(robot_mac, ip, service_name, time.monotonic()))
+
+    def on_service(zeroconf, service_type, name, state_change):
+        if state_change is ServiceStateChange.Removed or not name.endswith(MDNS_DOMAIN):
+            return
+        if wanted_name is not None and name != wanted_name:
+            return
+        task = asyncio.ensure_future(resolve(service_type, name))
+        resolving.add(task)
+        task.add_done_callback(resolving.discard)
+
+    browser = AsyncServiceBrowser(zeroconf.zeroconf, MDNS_DOMAIN, handlers=[on_service])
+    try:
+        return await asyncio.wait_for(found, timeout)
+    except asyncio.TimeoutError:
+        raise MeboDiscoveryError("Unable to locate Mebo on the network.")
+    finally:
+        await browser.async_cancel()
+        for task in resolving:
+            task.cancel()
+        if owned:
+            await zeroconf.async_close()
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_service():
+    """The process-wide :class:`DiscoveryService`, started on first use"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = DiscoveryService()
+        return _shared.start()
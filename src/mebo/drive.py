@@ -0,0 +1,160 @@
+"""Continuous driving from high-frequency input such as a joystick"""
+
+import logging
+import threading
+import time
+
+from .exceptions import MeboCommandError, MeboRequestError
+
+logger = logging.getLogger(__name__)
+
+
+class DriveController:
+    """Keeps the robot moving toward the latest requested setpoint
+
+    :meth:`set` may be called at any rate; it only records the setpoint. A background
+    thread sends the most recent one every `tick` seconds, so setpoints that arrive
+    between ticks replace each other instead of queueing up. Each move lasts a little
+    longer than a tick, so the wheels keep turning smoothly between ticks. When no
+    setpoint arrives for `idle_timeout` seconds, or on :meth:`release`, the robot is
+    stopped with ``fb_stop``.
+
+    :param mebo: the :class:`mebo.robot.Mebo` to drive
+    :param tick: seconds between commands sent to the robot
+    :param idle_timeout: seconds without input after which the robot is stopped
+    :param overlap: duration of each move, as a multiple of `tick`
+
+    >>> with m.continuous_drive() as drive:
+    ...     while joystick.active:
+    ...         drive.set(joystick.direction, joystick.speed)
+    """
+
+    def __init__(self, mebo, tick=0.1, idle_timeout=0.3, overlap=1.5):
+        self.tick = tick
+        self.idle_timeout = idle_timeout
+        self.overlap = overlap
+
+        # number of moves sent, setpoints replaced before being sent, stops sent and
+        # commands that failed
+        self.sent = 0
+        self.coalesced = 0
+        self.stops = 0
+        self.errors = 0
+
+        self._mebo = mebo
+        self._lock = threading.Lock()
+        self._setpoint = None
+        self._updated = 0.0
+        self._fresh = False
+        self._moving = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return (
+            f"<{self.__class__.__name__} setpoint={self.setpoint} sent={self.sent} "
+            f"coalesced={self.coalesced} stops={self.stops}>"
+        )
+
+    @property
+    def setpoint(self):
+        """The (direction, speed) the robot is being driven toward, or None"""
+        return self._setpoint
+
+    def set(self, direction, speed=255):
+        """Records a new setpoint; the latest one is sent on the next tick
+
+        :param direction: one of the eight directions of :meth:`mebo.robot.Mebo.move`, \
+            or None to stop
+        :param speed: a value in the range [0, 255]
+        """
+        if direction is None:
+            self.release()
+            return
+        direction = direction.lower()
+        if direction not in self._mebo.move_directions:
+            raise MeboCommandError(
+                "Direction must be one of the map directions: "
+                f"{self._mebo.move_directions.keys()}"
+            )
+        with self._lock:
+            if self._fresh:
+                self.coalesced += 1
+            self._setpoint = (direction, speed)
+            self._updated = time.monotonic()
+            self._fresh = True
+
+    def release(self):
+        """Clears the setpoint; the robot is stopped on the next tick"""
+        with self._lock:
+            self._setpoint = None
+            self._fresh = False
+
+    def start(self):
+        """Starts sending setpoints from a daemon thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            name=f"mebo-drive-{self._mebo.ip}", target=self._run, daemon=True
+        )
+        self._thread.start()
+
+    def close(self):
+        """Stops the background thread, then the robot if it is moving"""
+        self.release()
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._moving:
+            self._send_stop()
+
+    def step(self):
+        """Sends whatever the current setpoint calls for. Called once per tick."""
+        with self._lock:
+            if (
+                self._setpoint is not None
+                and time.monotonic() - self._updated > self.idle_timeout
+            ):
+                logger.debug("No drive input for %ss; stopping", self.idle_timeout)
+                self._setpoint = None
+            setpoint = self._setpoint
+            self._fresh = False
+        if setpoint is not None:
+            direction, speed = setpoint
+            try:
+                self._mebo.move(
+                    direction, speed=speed, dur=int(self.tick * self.overlap * 1000)
+                )
+                self.sent += 1
+                self._moving = True
+            except MeboRequestError as e:
+                self.errors += 1
+                logger.debug("Drive command failed: %s", e)
+        elif self._moving:
+            self._send_stop()
+
+    def _send_stop(self):
+        try:
+            self._mebo.stop()
+            self.stops += 1
+            self._moving = False
+        except MeboRequestError as e:
+            self.errors += 1
+            logger.debug("Stop command failed: %s", e)
+
+    def _run(self):
+        deadline = time.monotonic()
+        while not self._stop.is_set():
+            self.step()
+            # keep a fixed cadence; if a request overran its tick, go again right away
+            deadline = max(deadline + self.tick, time.monotonic())
+            self._stop.wait(deadline - time.monotonic())
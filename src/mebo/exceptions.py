@@ -9,10 +9,18 @@ class MeboCommandError(MeboError):
     """Exception raised when a command is incorrect"""
 
 
+class MeboDeadlineError(MeboCommandError):
+    """Exception raised when a command expires before it can be sent"""
+
+
 class MeboRequestError(MeboError):
     """Exception raised when a request is not accepted by Mebo command server"""
 
 
+class MeboCircuitOpenError(MeboRequestError):
+    """Exception raised when a request isn't sent because Mebo keeps failing to answer"""
+
+
 class MeboConnectionError(MeboError):
     """Exception raised when connection to mebo fails"""
 
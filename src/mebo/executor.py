@@ -0,0 +1,285 @@
+"""Non-blocking, prioritized execution of robot commands"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .exceptions import MeboDeadlineError
+
+logger = logging.getLogger(__name__)
+
+# priority classes; lower values run first
+STOP = 0
+MOTION = 1
+QUERY = 2
+PRIORITIES = {STOP: "stop", MOTION: "motion", QUERY: "query"}
+
+_running = threading.local()
+
+
+def current_deadline():
+    """The deadline of the command running on this thread, or None
+
+    Lets a command that has to wait for something else, such as a slot to send its
+    request, give up at the same deadline it had while queued.
+    """
+    return getattr(_running, "deadline", None)
+
+
+class WaitStats:
+    """How long the commands of one priority class waited before being sent"""
+
+    def __init__(self):
+        self.count = 0
+        self.cancelled = 0
+        self.expired = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait):
+        self.count += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "cancelled": self.cancelled,
+            "expired": self.expired,
+            "mean_wait": self.total_wait / self.count if self.count else 0.0,
+            "max_wait": self.max_wait,
+        }
+
+
+class _Command:
+    __slots__ = (
+        "future",
+        "fn",
+        "args",
+        "kwargs",
+        "priority",
+        "seq",
+        "submitted",
+        "deadline",
+    )
+
+    def __init__(self, fn, args, kwargs, priority, seq, deadline=None):
+        self.future = Future()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.seq = seq
+        self.submitted = time.monotonic()
+        self.deadline = deadline
+
+
+class CommandExecutor:
+    """Runs robot commands on a bounded pool of worker threads, by priority
+
+    Every command belongs to a lane, typically named after the component it moves.
+    Commands in the same lane run one at a time, in the order they were submitted,
+    while commands in different lanes run concurrently. When more lanes have work than
+    there are free workers, the lane whose next command is most urgent goes first, so
+    `MOTION` commands overtake `QUERY` commands.
+
+    `STOP` commands don't queue at all. Submitting one cancels the `MOTION` commands
+    still waiting in its lane, and it is sent right away from a worker reserved for
+    stops, so a stop never waits for other requests to finish.
+
+    Commands may carry a deadline. One still waiting when its deadline passes is
+    dropped rather than sent late, and its future fails with
+    :class:`mebo.exceptions.MeboDeadlineError`. Stops are always sent.
+
+    :param max_workers: maximum number of motion and query commands in flight at once
+    :param name: prefix for the names of the worker threads
+    """
+
+    def __init__(self, max_workers=4, name="mebo"):
+        self.max_workers = max_workers
+        self.name = name
+        self._lanes = {}
+        # lanes that are waiting in `_ready` or running a command
+        self._busy = set()
+        self._ready = []
+        self._seq = itertools.count()
+        self._lock = threading.Condition()
+        self._workers = []
+        self._idle = 0
+        self._shutdown = False
+        self._stops = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f"{name}-stop"
+        )
+        self._stats = {priority: WaitStats() for priority in PRIORITIES}
+
+    def __repr__(self):
+        return (
+            f"<{self.__class__.__name__} max_workers={self.max_workers} "
+            f"pending={self.pending()}>"
+        )
+
+    def submit(self, lane, fn, *args, priority=MOTION, deadline=None, **kwargs):
+        """Schedules `fn(*args, **kwargs)` to run after earlier commands in `lane`
+
+        :param priority: one of `STOP`, `MOTION` or `QUERY`
+        :param deadline: :func:`time.monotonic` time after which the command is \
+            dropped instead of run
+        :returns: a :class:`concurrent.futures.Future` for the result of the call
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"priority must be one of {list(PRIORITIES)}")
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new commands after shutdown")
+            command = _Command(
+                fn, args, kwargs, priority, next(self._seq), deadline=deadline
+            )
+            if priority == STOP:
+                self._cancel(lane, MOTION)
+                self._stops.submit(self._run, command)
+                return command.future
+            self._lanes.setdefault(lane, deque()).append(command)
+            if lane not in self._busy:
+                self._busy.add(lane)
+                heapq.heappush(self._ready, (priority, command.seq, lane))
+                self._wake()
+        return command.future
+
+    def cancel(self, lane, priority=MOTION):
+        """Cancels the commands of one priority class still waiting in `lane`
+
+        :returns: the number of commands cancelled
+        """
+        with self._lock:
+            return self._cancel(lane, priority)
+
+    def pending(self, lane=None):
+        """Number of commands waiting to run, in one lane or all of them"""
+        with self._lock:
+            if lane is not None:
+                return len(self._lanes.get(lane, ()))
+            return sum(len(q) for q in self._lanes.values())
+
+    def stats(self):
+        """Commands run, cancelled and expired per priority class, and their waits
+
+        Waits are in seconds, from submission until the command started.
+        """
+        with self._lock:
+            return {
+                name: self._stats[priority].as_dict()
+                for priority, name in PRIORITIES.items()
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {priority: WaitStats() for priority in PRIORITIES}
+
+    def shutdown(self, wait=True):
+        """Stops accepting commands
+
+        :param wait: if True, blocks until queued commands have run. Otherwise, \
+            commands that haven't started are cancelled.
+        """
+        with self._lock:
+            self._shutdown = True
+            if not wait:
+                for lane in self._lanes:
+                    for priority in PRIORITIES:
+                        self._cancel(lane, priority)
+            self._lock.notify_all()
+        self._stops.shutdown(wait=wait)
+        if wait:
+            for worker in self._workers:
+                if worker is not threading.current_thread():
+                    worker.join()
+
+    def _cancel(self, lane, priority):
+        queue = self._lanes.get(lane)
+        if not queue:
+            return 0
+        remaining = deque()
+        for command in queue:
+            if command.priority == priority and command.future.cancel():
+                self._stats[priority].cancelled += 1
+            else:
+                remaining.append(command)
+        self._lanes[lane] = remaining
+        return len(queue) - len(remaining)
+
+    def _wake(self):
+        if self._idle == 0 and len(self._workers) < self.max_workers:
+            worker = threading.Thread(
+                name=f"{self.name}-{len(self._workers)}",
+                target=self._work,
+                daemon=True,
+            )
+            self._workers.append(worker)
+            worker.start()
+        else:
+            self._lock.notify()
+
+    def _run(self, command):
+        if not command.future.set_running_or_notify_cancel():
+            return
+        now = time.monotonic()
+        expired = (
+            command.deadline is not None
+            and command.priority != STOP
+            and now > command.deadline
+        )
+        with self._lock:
+            if expired:
+                self._stats[command.priority].expired += 1
+            else:
+                self._stats[command.priority].record(now - command.submitted)
+        if expired:
+            logger.debug("Dropping %s; it expired while queued", command.fn)
+            command.future.set_exception(
+                MeboDeadlineError(
+                    f"Command expired {now - command.deadline:.3f}s before it was sent"
+                )
+            )
+            return
+        _running.deadline = command.deadline if command.priority != STOP else None
+        try:
+            result = command.fn(*command.args, **command.kwargs)
+        except MeboDeadlineError as e:
+            # it expired after all, waiting inside the command
+            with self._lock:
+                self._stats[command.priority].expired += 1
+            command.future.set_exception(e)
+        except BaseException as e:
+            command.future.set_exception(e)
+        else:
+            command.future.set_result(result)
+        finally:
+            _running.deadline = None
+
+    def _work(self):
+        while True:
+            with self._lock:
+                self._idle += 1
+                self._lock.wait_for(lambda: self._ready or self._shutdown)
+                self._idle -= 1
+                if not self._ready:
+                    return
+                _, _, lane = heapq.heappop(self._ready)
+                queue = self._lanes[lane]
+                # the lane may have been emptied by cancel()
+                command = queue.popleft() if queue else None
+            if command is not None:
+                self._run(command)
+            with self._lock:
+                queue = self._lanes[lane]
+                if queue:
+                    # back into the heap, behind more urgent and older work
+                    head = queue[0]
+                    heapq.heappush(self._ready, (head.priority, head.seq, lane))
+                    self._lock.notify()
+                else:
+                    self._busy.discard(lane)
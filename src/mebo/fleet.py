@@ -0,0 +1,191 @@
+"""Controlling many robots at once
+
+>>> with MeboFleet.discover() as fleet:
+...     results = fleet.broadcast("move", "n", dur=500)
+...     fleet.scatter("arm.up", {mac: {"dur": 250 * i} for i, mac in enumerate(fleet)})
+"""
+
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from .discovery import shared_service
+from .exceptions import MeboDiscoveryError, MeboError
+from .robot import Mebo
+
+logger = logging.getLogger(__name__)
+
+FleetResult = namedtuple("FleetResult", ["mac", "value", "error", "elapsed"])
+FleetResult.__doc__ = """The outcome of a command on one robot of a fleet
+
+:param mac: MAC address of the robot
+:param value: what the command returned, or None if it failed
+:param error: the :class:`mebo.exceptions.MeboError` the command raised, or None
+:param elapsed: seconds the command took
+"""
+
+
+def discover_robots(timeout=3, expected=None):
+    """Finds every robot advertising itself over mDNS
+
+    Uses the shared :class:`mebo.discovery.DiscoveryService`. If it has been browsing
+    for `timeout` seconds already, its registry is returned without waiting.
+
+    :param timeout: seconds to listen for robots
+    :param expected: stop listening as soon as this many robots have been found
+    :returns: dictionary of MAC address -> IP address
+    """
+    service = shared_service()
+    service.wait_until(
+        lambda: expected is not None and len(service) >= expected,
+        timeout - service.uptime,
+    )
+    return {robot.mac: robot.ip for robot in service.robots()}
+
+
+class MeboFleet:
+    """A group of robots, one :class:`mebo.robot.Mebo` per MAC address
+
+    Commands sent to the fleet run on every robot at the same time from a shared
+    thread pool, so a fleet-wide command takes about one round trip however many
+    robots there are.
+
+    :param robots: dictionary of MAC address -> :class:`mebo.robot.Mebo`
+    :param max_workers: size of the shared thread pool
+    """
+
+    MAX_WORKERS = 32
+
+    def __init__(self, robots=None, max_workers=None):
+        self.max_workers = max_workers or self.MAX_WORKERS
+        self._robots = dict(robots or {})
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def discover(cls, timeout=3, expected=None, **kwargs):
+        """Builds a fleet from the robots found on the LAN
+
+        :param timeout: seconds to listen for robots
+        :param expected: stop listening as soon as this many robots have been found
+        :param kwargs: passed on to each :class:`mebo.robot.Mebo`
+        :raises: :class:`mebo.exceptions.MeboDiscoveryError` if no robot is found
+        """
+        fleet = cls()
+        fleet.refresh(timeout, expected, **kwargs)
+        if not fleet:
+            raise MeboDiscoveryError("Unable to locate any Mebo on the network.")
+        return fleet
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} robots={sorted(self._robots)}>"
+
+    def __len__(self):
+        return len(self._robots)
+
+    def __iter__(self):
+        return iter(list(self._robots))
+
+    def __contains__(self, mac):
+        return mac in self._robots
+
+    def __getitem__(self, mac):
+        return self._robots[mac]
+
+    def add(self, mac, mebo):
+        """Adds a robot, replacing any other with the same MAC address"""
+        with self._lock:
+            previous = self._robots.get(mac)
+            self._robots[mac] = mebo
+        if previous is not None and previous is not mebo:
+            previous.close()
+
+    def remove(self, mac):
+        """Removes a robot from the fleet and closes it"""
+        with self._lock:
+            mebo = self._robots.pop(mac)
+        mebo.close()
+
+    def refresh(self, timeout=3, expected=None, **kwargs):
+        """Adds robots found on the LAN, and follows known ones to new addresses
+
+        :returns: the MAC addresses of robots that weren't in the fleet before
+        """
+        added = []
+        for mac, ip in discover_robots(timeout, expected).items():
+            mebo = self._robots.get(mac)
+            if mebo is None:
+                mebo = Mebo(ip=ip, autoconnect=False, mac=mac, **kwargs)
+                self.add(mac, mebo)
+                added.append(mac)
+            elif str(mebo.ip) != ip:
+                mebo.ip = ip
+        return added
+
+    def broadcast(self, command, *args, **kwargs):
+        """Runs the same command on every robot at once
+
+        :param command: name of a :class:`mebo.robot.Mebo` method or component \
+            action, such as 'move' or 'arm.up', or a function taking a Mebo
+        :returns: dictionary of MAC address -> :class:`FleetResult`
+        """
+        return self.scatter(command, {mac: (args, kwargs) for mac in self})
+
+    def scatter(self, command, arguments):
+        """Runs a command on several robots at once, with arguments for each
+
+        :param command: as for :meth:`broadcast`
+        :param arguments: dictionary of MAC address -> keyword arguments, or -> \
+            (positional arguments, keyword arguments)
+        :returns: dictionary of MAC address -> :class:`FleetResult`
+        """
+        futures = {}
+        for mac, call in arguments.items():
+            args, kwargs = call if isinstance(call, tuple) else ((), call)
+            futures[mac] = self.pool.submit(
+                self._run, mac, self._robots[mac], command, args, kwargs
+            )
+        return {mac: future.result() for mac, future in futures.items()}
+
+    @property
+    def pool(self):
+        """The thread pool shared by commands to all robots"""
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="mebo-fleet"
+                )
+            return self._pool
+
+    def close(self):
+        """Closes every robot and the shared thread pool"""
+        with self._lock:
+            robots, self._robots = self._robots, {}
+            pool, self._pool = self._pool, None
+        for mebo in robots.values():
+            mebo.close()
+        if pool is not None:
+            pool.shutdown()
+
+    def _run(self, mac, mebo, command, args, kwargs):
+        if callable(command):
+            fn, args = command, (mebo, *args)
+        else:
+            fn = mebo
+            for name in command.split("."):
+                fn = getattr(fn, name)
+        start = time.monotonic()
+        try:
+            value, error = fn(*args, **kwargs), None
+        except MeboError as e:
+            logger.debug("%s failed on %s: %s", command, mac, e)
+            value, error = None, e
+        return FleetResult(mac, value, error, time.monotonic() - start)
@@ -0,0 +1,126 @@
+"""Background liveness checks for a robot"""
+
+import logging
+import threading
+import time
+
+from .stats import smooth_rtt
+
+logger = logging.getLogger(__name__)
+
+
+class Heartbeat:
+    """Probes a robot from a background thread and remembers whether it answered
+
+    While the robot answers, the interval between probes grows from `min_interval`
+    towards `max_interval`. Any change of state, or an unanswered probe, drops it back
+    to `min_interval` so that recovery is noticed quickly. The interval never falls
+    below `RTT_FACTOR` times the measured round trip time, to spare slow robots.
+
+    :param probe: callable sending a cheap request to the robot; raises on failure
+    :param min_interval: shortest time between probes, in seconds
+    :param max_interval: longest time between probes, in seconds
+    :param on_connect: called with no arguments when the robot starts answering
+    :param on_disconnect: called with no arguments when the robot stops answering
+    :param name: name of the background thread
+    """
+
+    RTT_FACTOR = 10
+    BACKOFF = 1.5
+
+    def __init__(
+        self,
+        probe,
+        min_interval=0.5,
+        max_interval=5.0,
+        on_connect=None,
+        on_disconnect=None,
+        name="mebo-heartbeat",
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.on_connect = on_connect
+        self.on_disconnect = on_disconnect
+        self.name = name
+
+        # None until the first probe completes
+        self.connected = None
+        self.rtt = None
+        self.last_seen = None
+        self.probes = 0
+        self.failures = 0
+
+        self._probe = probe
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __repr__(self):
+        return (
+            f"<{self.__class__.__name__} connected={self.connected} "
+            f"rtt={self.rtt} interval={self.interval:.2f}>"
+        )
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Starts probing in a daemon thread. The first probe is sent immediately."""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(name=self.name, target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stops probing, waiting up to `timeout` seconds for an in-flight probe"""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    def beat(self):
+        """Sends one probe and updates the liveness state
+
+        :returns: True if the robot answered
+        """
+        start = time.monotonic()
+        try:
+            self._probe()
+        except Exception as e:
+            logger.debug("%s: probe failed: %s", self.name, e)
+            alive = False
+        else:
+            alive = True
+        elapsed = time.monotonic() - start
+        self.probes += 1
+        if alive:
+            self.last_seen = time.monotonic()
+            self.rtt = smooth_rtt(self.rtt, elapsed)
+        else:
+            self.failures += 1
+        self._transition(alive)
+        return alive
+
+    def _transition(self, alive):
+        changed = alive != self.connected
+        self.connected = alive
+        if alive and not changed:
+            self.interval = min(self.interval * self.BACKOFF, self.max_interval)
+        else:
+            self.interval = self.min_interval
+        if self.rtt is not None:
+            self.interval = max(self.interval, self.rtt * self.RTT_FACTOR)
+
+        callback = self.on_connect if alive else self.on_disconnect
+        if changed and callback is not None:
+            try:
+                callback()
+            except Exception:
+                logger.exception("%s: error in liveness callback", self.name)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.beat()
+            self._stop.wait(self.interval)
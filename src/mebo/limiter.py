@@ -0,0 +1,118 @@
+"""Adaptive limits on the number of requests in flight to a robot"""
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ConcurrencyLimiter:
+    """Limits concurrent requests, adapting the limit to how the robot copes
+
+    The limit grows additively, by about one request per round trip, while requests
+    succeed promptly. It is cut multiplicatively when a request fails, or when latency
+    rises past `tolerance` times the baseline: the fastest round trip seen recently,
+    which approximates the robot's unloaded latency. This keeps the robot close to the
+    most concurrency it can serve without queueing inside its HTTP server.
+
+    :param initial: starting limit
+    :param min_limit: the limit never falls below this
+    :param max_limit: the limit never rises above this
+    :param backoff: factor applied to the limit on failure or congestion
+    :param tolerance: latency, as a multiple of the baseline, that counts as congestion
+    """
+
+    # how quickly the baseline drifts up toward current latency, so that a lasting
+    # change of network is eventually accepted as the new normal
+    BASELINE_DRIFT = 0.01
+    # latency within this many seconds of the baseline is jitter, never congestion
+    JITTER = 0.005
+
+    def __init__(self, initial=2, min_limit=1, max_limit=8, backoff=0.5, tolerance=2.0):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.limit = float(initial)
+        self.in_flight = 0
+        self.queued = 0
+        self.baseline = None
+        self.latency = None
+        # times the limit was cut
+        self.drops = 0
+        self._lock = threading.Condition()
+
+    def __repr__(self):
+        return (
+            f"<{self.__class__.__name__} limit={int(self.limit)} "
+            f"in_flight={self.in_flight} queued={self.queued}>"
+        )
+
+    def acquire(self, block=True, timeout=None):
+        """Takes a slot for one request
+
+        :param block: if False, take a slot even when the limit has been reached. \
+            Used for stops, which must never wait.
+        :param timeout: seconds to wait for a slot. default: as long as it takes
+        :returns: True, or False if no slot became free within `timeout`
+        """
+        with self._lock:
+            if block and self.in_flight >= int(self.limit):
+                self.queued += 1
+                try:
+                    free = self._lock.wait_for(
+                        lambda: self.in_flight < int(self.limit), timeout
+                    )
+                finally:
+                    self.queued -= 1
+                if not free:
+                    return False
+            self.in_flight += 1
+            return True
+
+    def release(self, latency=None, ok=True):
+        """Gives back a slot and adjusts the limit
+
+        :param latency: round trip time of the request, in seconds. None if the \
+            request wasn't sent after all, which leaves the limit as it is
+        :param ok: whether the request succeeded
+        """
+        with self._lock:
+            self.in_flight -= 1
+            if latency is None:
+                self._lock.notify_all()
+                return
+            if ok:
+                self.latency = latency
+                if self.baseline is None or latency < self.baseline:
+                    self.baseline = latency
+                else:
+                    self.baseline += self.BASELINE_DRIFT * (latency - self.baseline)
+            congested = ok and latency > max(
+                self.tolerance * self.baseline, self.baseline + self.JITTER
+            )
+            if not ok or congested:
+                limit = max(self.min_limit, self.limit * self.backoff)
+                if int(limit) < int(self.limit):
+                    self.drops += 1
+                    logger.debug(
+                        "Limit cut to %d (%s)",
+                        limit,
+                        "congested" if ok else "failed",
+                    )
+                self.limit = limit
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._lock.notify_all()
+
+    def stats(self):
+        """The current limit, requests in flight and waiting, and latencies in seconds"""
+        with self._lock:
+            return {
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "latency": self.latency,
+                "baseline": self.baseline,
+                "drops": self.drops,
+            }
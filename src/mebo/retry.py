@@ -0,0 +1,134 @@
+"""Retries and fail-fast protection for requests to a flaky robot"""
+
+import logging
+import random
+import threading
+import time
+
+from .exceptions import MeboCircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+# queries that change nothing on the robot, so sending them twice is harmless
+IDEMPOTENT = frozenset(
+    [
+        "get_version",
+        "get_model",
+        "get_boundary_position",
+        "get_rt_list",
+        "get_wifi_cert",
+    ]
+)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter
+
+    The n-th retry waits a random time between zero and ``base * 2 ** n`` seconds,
+    capped at `cap`, so that clients retrying at once spread out instead of hitting
+    the robot together.
+
+    :param attempts: total number of attempts, including the first
+    :param base: upper bound of the first delay, in seconds
+    :param cap: largest possible delay, in seconds
+    """
+
+    def __init__(self, attempts=3, base=0.05, cap=1.0):
+        self.attempts = attempts
+        self.base = base
+        self.cap = cap
+
+    def __repr__(self):
+        return (
+            f"<{self.__class__.__name__} attempts={self.attempts} "
+            f"base={self.base} cap={self.cap}>"
+        )
+
+    def delays(self):
+        """Yields the delay before each retry"""
+        for n in range(self.attempts - 1):
+            yield random.uniform(0, min(self.cap, self.base * 2**n))
+
+
+class CircuitBreaker:
+    """Stops sending requests to a robot that keeps failing to answer
+
+    After `threshold` consecutive failures the circuit opens, and :meth:`check` fails
+    fast with :class:`mebo.exceptions.MeboCircuitOpenError` instead of letting each
+    request wait out its timeout. After `reset_timeout` seconds the circuit is half
+    open: one request is let through as a trial, and its outcome closes or reopens
+    the circuit.
+
+    :param threshold: consecutive failures that open the circuit
+    :param reset_timeout: seconds the circuit stays open before a trial request
+    :param clock: function returning the current time in seconds
+    """
+
+    def __init__(self, threshold=5, reset_timeout=5.0, clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        # requests refused while the circuit was open
+        self.rejected = 0
+        self._clock = clock
+        self._opened = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return (
+            f"<{self.__class__.__name__} state={self.state} failures={self.failures}>"
+        )
+
+    @property
+    def state(self):
+        """One of 'closed', 'open' or 'half_open'"""
+        if self._opened is None:
+            return CLOSED
+        if self._clock() - self._opened < self.reset_timeout:
+            return OPEN
+        return HALF_OPEN
+
+    def check(self):
+        """Raises if a request shouldn't be sent now
+
+        :raises: :class:`mebo.exceptions.MeboCircuitOpenError` while the circuit is \
+            open, or half open with a trial already in flight
+        """
+        with self._lock:
+            state = self.state
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and not self._trial:
+                self._trial = True
+                return
+            self.rejected += 1
+        raise MeboCircuitOpenError(
+            f"Not sending: the last {self.failures} requests to Mebo failed"
+        )
+
+    def record_success(self):
+        with self._lock:
+            if self._opened is not None:
+                logger.debug("Circuit closed")
+            self.failures = 0
+            self._opened = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or (
+                self._opened is None and self.failures >= self.threshold
+            ):
+                logger.debug("Circuit opened after %d failures", self.failures)
+                self._opened = self._clock()
+            self._trial = False
+
+    def reset(self):
+        """Closes the circuit"""
+        self.record_success()
@@ -1,38 +1,49 @@
 """Classes and methods for working with the physical Mebo robot"""
 
 import logging
-import os
-import sys
+import threading
 import time
 from abc import ABC
 from collections import namedtuple
 from functools import partial
+from http.client import HTTPException
 from ipaddress import AddressValueError, IPv4Address
 
-from xml.etree.ElementTree import fromstring as xmlfromstring
-
-from requests import Session
-from requests.exceptions import ConnectionError, HTTPError
-
-from zeroconf import ServiceBrowser, Zeroconf, IPVersion
-
 from .exceptions import (
+    MeboCircuitOpenError,
     MeboCommandError,
+    MeboDeadlineError,
     MeboDiscoveryError,
     MeboRequestError,
     MeboConnectionError,
     MeboConfigurationError,
 )
 
-from mebo.stream.session import (
-    RTSPSession,
+from .cache import TTLCache
+from .discovery import (
+    MDNS_DOMAIN,
+    DiscoveryCache,
+    shared_service,
+    sweep,
+)
+from .drive import DriveController
+from .executor import MOTION, QUERY, STOP, CommandExecutor, current_deadline
+from .heartbeat import Heartbeat
+from .limiter import ConcurrencyLimiter
+from .retry import IDEMPOTENT, CircuitBreaker, RetryPolicy
+from .stats import RequestStats
+from .survey import SiteSurvey
+from .transport import TRANSPORTS
+from .video import (
+    PRESETS,
+    SETTINGS,
+    SPEED_TIERS,
+    VideoProfile,
+    setting_commands,
+    setting_params,
 )
 
-
-# TODO: set up better logging
-LOGLEVEL = os.environ.get("LOGLEVEL", "INFO").upper()
-logging.getLogger(__name__)
-logging.basicConfig(stream=sys.stdout, level=LOGLEVEL)
+logger = logging.getLogger(__name__)
 
 Broadcast = namedtuple("Broadcast", ["ip", "port", "data"])
 WirelessNetwork = namedtuple(
@@ -47,7 +58,97 @@ SOUTH = "s"
 SOUTH_WEST = "sw"
 WEST = "w"
 NORTH_WEST = "nw"
+# marks a value the robot hasn't reported or acknowledged
+_UNKNOWN = object()
+
 DIRECTIONS = [NORTH, NORTH_EAST, EAST, SOUTH_EAST, SOUTH, SOUTH_WEST, WEST, NORTH_WEST]
+MOVE_COMMANDS = [
+    "move_forward",
+    "move_forward_right",
+    "move_right",
+    "move_backward_right",
+    "move_backward",
+    "move_backward_left",
+    "move_left",
+    "move_forward_left",
+]
+
+# commands that set a value on the robot. Mebo remembers what it last set and
+# doesn't resend a value the robot already has
+SETTERS = frozenset(
+    ["set_spk_volume", "set_scan_timer", "set_timer_state", *SETTINGS.values()]
+)
+
+# component name -> action name -> the API command the action sends
+COMPONENT_ACTIONS = {
+    "claw": {"open": "c_open", "close": "c_close", "stop": "c_stop"},
+    "wrist": {
+        "rotate_right": "w_right",
+        "inch_right": "inch_w_right",
+        "rotate_left": "w_left",
+        "inch_left": "inch_w_left",
+        "rotate_stop": "w_stop",
+        "up": "h_up",
+        "down": "h_down",
+        "lift_stop": "h_stop",
+    },
+    "arm": {"up": "s_up", "down": "s_down", "stop": "s_stop"},
+    "speaker": {"set_volume": "set_spk_volume", "play_sound": "audio_out0"},
+}
+
+# stop command -> the executor lane whose pending motion it cancels
+STOP_COMMANDS = {
+    "fb_stop": "drive",
+    "c_stop": "claw",
+    "w_stop": "wrist",
+    "h_stop": "wrist",
+    "s_stop": "arm",
+}
+
+# motion command -> the lane of the stops that must reach the robot after it
+MOTION_LANES = {
+    command: lane
+    for lane, actions in COMPONENT_ACTIONS.items()
+    for command in actions.values()
+    if lane in STOP_COMMANDS.values() and command not in STOP_COMMANDS
+}
+MOTION_LANES.update(dict.fromkeys([*MOVE_COMMANDS, "inch_left", "inch_right"], "drive"))
+
+ACTION_DOCS = {
+    ("arm", "up"): """Move the arm up
+
+        :param dur: The duration of the arm movement
+        :type dur: int
+        """,
+    ("arm", "down"): """Move the arm down
+
+        :param dur: The duration of the arm movement
+        :type dur: int
+        """,
+    ("arm", "stop"): """Stop the arm""",
+    ("speaker", "set_volume"): """Set the volume of the speaker
+
+        The value passed in to set the volume must be in the range [0, 100].
+        Nothing is sent if the speaker is already at that volume, unless `force` is True.
+        """,
+    # TODO: how do you change what noise is played?
+    ("speaker", "play_sound"): """Play one of the stored sounds
+
+        through the speaker.
+        """,
+}
+
+
+class Component(ABC):
+    """Abstract base class for all robot components"""
+
+    __slots__ = ("actions",)
+
+    def __init__(self, actions):
+        self.actions = actions
+
+    def __repr__(self):
+        return "<{} actions={}>".format(self.__class__, self.actions)
 
 
 class ComponentFactory:
@@ -67,14 +168,170 @@ class ComponentFactory:
         return cls(actions=actions.keys())
 
 
-class Component(ABC):
-    """Abstract base class for all robot components"""
+class RobotComponent(Component):
+    """A component whose actions send API commands through a robot
 
-    def __init__(self, actions):
-        self.actions = actions
+    Each subclass names an entry of `COMPONENT_ACTIONS` and declares one slot per
+    action. The table of commands and docstrings is worked out once, when the class is
+    defined; binding it to a robot only creates one `partial` per action.
 
-    def __repr__(self):
-        return "<{} actions={}>".format(self.__class__, self.actions)
+    :param request: callable accepting the API command as the `req` keyword, \
+        along with any additional query parameters
+    :param submit: optional callable used to give each action a non-blocking \
+        ``submit`` variant. Called as ``submit(action, *args, component=name, **kwargs)``
+    """
+
+    __slots__ = ()
+    name = None
+    # action name -> (API command, docstring or None)
+    dispatch = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.dispatch = {
+            action: (command, ACTION_DOCS.get((cls.name, action)))
+            for action, command in COMPONENT_ACTIONS[cls.name].items()
+        }
+
+    def __init__(self, request, submit=None):
+        super().__init__(tuple(self.dispatch))
+        for action, (command, doc) in self.dispatch.items():
+            fn = partial(request, req=command)
+            if doc is not None:
+                fn.__doc__ = doc
+            if submit is not None:
+                fn.submit = partial(submit, fn, component=self.name)
+            setattr(self, action, fn)
+
+
+class Claw(RobotComponent):
+    """Mebo CLAW Component"""
+
+    __slots__ = tuple(COMPONENT_ACTIONS["claw"])
+    name = "claw"
+
+
+class Wrist(RobotComponent):
+    """Mebo WRIST Component"""
+
+    __slots__ = tuple(COMPONENT_ACTIONS["wrist"])
+    name = "wrist"
+
+
+class Arm(RobotComponent):
+    """Mebo ARM Component"""
+
+    __slots__ = tuple(COMPONENT_ACTIONS["arm"])
+    name = "arm"
+
+
+class Speaker(RobotComponent):
+    """Mebo SPEAKER Component"""
+
+    __slots__ = tuple(COMPONENT_ACTIONS["speaker"])
+    name = "speaker"
+
+
+class component:
+    """Attribute of a robot holding one of its components
+
+    The component is built on first access and stored in the robot's ``__dict__``
+    under the same name. That shadows this descriptor, so every later access is a plain
+    attribute lookup, and robots that never use a component never build it.
+
+    :param cls: the :class:`RobotComponent` subclass
+    :param doc: docstring of the attribute
+    """
+
+    def __init__(self, cls, doc=None):
+        self.cls = cls
+        self.__doc__ = doc
+
+    def __set_name__(self, owner, name):
+        self.attr = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        built = self.cls(instance._request, getattr(instance, "submit", None))
+        return instance.__dict__.setdefault(self.attr, built)
+
+
+def command_priority(fn):
+    """The executor priority of a command: `STOP`, `MOTION` or `QUERY`
+
+    :param fn: a Mebo method such as `m.stop`, or a component action such as `m.arm.up`
+    """
+    keywords = getattr(fn, "keywords", None) or {}
+    name = keywords.get("req") or getattr(fn, "__name__", "")
+    if name == "stop" or name in STOP_COMMANDS:
+        return STOP
+    if name.startswith("get_") or name == "visible_networks":
+        return QUERY
+    return MOTION
+
+
+def parse_value(text):
+    """Parses the value out of a ``command:value`` response body"""
+    _, value = text.split(":")
+    return value.strip()
+
+
+def parse_boundary_position(text):
+    """Parses a ``get_boundary_position`` response body into a dictionary"""
+    _, key_value_string = [s.strip() for s in text.split(":")]
+    return dict(
+        (k, int(v))
+        for k, v in [ks.strip().split("=") for ks in key_value_string.split("&")]
+    )
+
+
+def iter_networks(data, chunk_size=4096):
+    """Yields each `WirelessNetwork` of a ``get_rt_list`` response body as it is parsed
+
+    Each network's elements are discarded once it has been yielded, so memory use
+    doesn't grow with the number of networks.
+
+    :param data: the response body as `str` or `bytes`, or an iterable of such chunks
+    :param chunk_size: size of the pieces a body given whole is fed to the parser in
+    """
+    # imported here, like the stream stack below, to keep `import mebo` light
+    from xml.etree.ElementTree import XMLPullParser
+
+    if isinstance(data, (str, bytes)):
+        body = data
+        chunks = (body[i : i + chunk_size] for i in range(0, len(body), chunk_size))
+    else:
+        chunks = data
+    parser = XMLPullParser(events=("start", "end"))
+    root = None
+    for chunk in chunks:
+        parser.feed(chunk)
+        for event, element in parser.read_events():
+            if root is None:
+                root = element
+            elif event == "end" and element.tag == "w":
+                yield WirelessNetwork(*(i.text.strip('"') for i in element))
+                root.clear()
+    parser.close()
+
+
+def parse_networks(text):
+    """Parses a ``get_rt_list`` response body into a dictionary of `WirelessNetwork`"""
+    return {wlan.ssid: wlan for wlan in iter_networks(text)}
+
+
+def media_session(ip, port):
+    """Opens an RTSP session for the audio and video streams of the robot at `ip`"""
+    from .stream.session import RTSPSession
+
+    return RTSPSession(
+        f"rtsp://{ip}/streamhd/",
+        port=port,
+        username="stream",
+        realm="realm",
+        user_agent="python-mebo",
+    )
 
 
 class Mebo:
@@ -82,8 +339,25 @@ class Mebo:
 
     # port used to establish media (RTSP) sessions
     RTSP_PORT = 6667
-
-    def __init__(self, ip=None, autoconnect=True):
+    # port serving the HTTP control API
+    HTTP_PORT = 80
+    # maximum number of submitted commands in flight at once
+    MAX_WORKERS = 4
+    # ceiling for the adaptive limit on requests in flight to the robot
+    MAX_CONCURRENCY = 8
+    # robots found by earlier runs, tried before scanning the LAN. None disables it
+    DISCOVERY_CACHE = DiscoveryCache()
+
+    def __init__(
+        self,
+        ip=None,
+        autoconnect=True,
+        port=None,
+        transport="http",
+        cache_ttls=None,
+        network=None,
+        mac=None,
+    ):
         """Initializes a Mebo robot object and establishes an http connection to the robot
 
         If `autoconnect` is True (default), then we will autodiscover the robot using mDNS.
@@ -94,39 +368,76 @@ class Mebo:
         :type ip: str
         :param autoconnect: if True, will autodiscover and connect at object creation time
         :type autoconnect: bool
+        :param port: port of the HTTP control API. default: 80
+        :type port: int
+        :param transport: how commands are sent to the robot. One of 'http' (default), \
+            'raw' (a lighter, socket-level client) or 'requests'. See :mod:`mebo.transport`
+        :type transport: str
+        :param cache_ttls: seconds the results of read-only queries are cached, by query. \
+            Overrides :data:`mebo.cache.DEFAULT_TTLS`
+        :type cache_ttls: dict
+        :param network: CIDR range, e.g. '192.168.1.0/24', probed address by address \
+            if mDNS doesn't find the robot. For networks that filter multicast
+        :type network: str
+        :param mac: MAC address of the robot. With `autoconnect`, only the robot with \
+            this address is discovered
+        :type mac: str
 
         >>> m = Mebo()
         >>> assert m.is_connected
         """
-        # TODO: I don't think the HTTP server on Mebo supports long lived connections
-        # so we're not really getting anything from this. Maybe just use `request.get` instead?
-        self._session = Session()
+        if transport not in TRANSPORTS:
+            raise MeboConfigurationError(
+                f"transport must be one of {list(TRANSPORTS)}, not {transport}"
+            )
+        self._transport_class = TRANSPORTS[transport]
+        # created on first use, which is when keep-alive support is detected
+        self._transport = None
+        self._executor = None
+        # guards the creation of the transport and executor, used from many threads
+        self._lock = threading.Lock()
+        self._heartbeat = None
+        self._cache = TTLCache(cache_ttls)
+        self._limiter = ConcurrencyLimiter(max_limit=self.MAX_CONCURRENCY)
+        # lane -> params of the last stop sent in it
+        self._last_stops = {}
+        self._retry = RetryPolicy()
+        self._breaker = CircuitBreaker()
+        self._stats = RequestStats()
+        self._port = port or self.HTTP_PORT
         self._ip = None
-        self._mac = None
-        # all mebos use this as their mDNS domain. Typically the robot
-        # will be named Camera-{mac_address}._camer._tcp.local"
-        self._mdns_domain = "_camera._tcp.local."
+        self._mac = mac
+        self._mdns_domain = MDNS_DOMAIN
         self._mdns_name = None
 
         self._move_directions = None
+        # mirror of the values the robot has acknowledged for each setter
+        self._state = {}
 
         if autoconnect:
-            self._discover_via_mdns()
+            self._discover(mac=mac, network=network)
         else:
             self.ip = ip
 
-        self._arm = None
-        self._wrist = None
-        self._claw = None
-        self._speaker = None
-
         self._rtsp_session = None
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self._session.close()
+        self.close()
+
+    def close(self):
+        """Waits for submitted commands to finish and closes any open connections to the robot"""
+        self.stop_heartbeat()
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+        with self._lock:
+            transport = self._transport
+        if transport is not None:
+            transport.close()
 
     @property
     def ip(self) -> IPv4Address:
@@ -145,9 +456,21 @@ class Mebo:
     def ip(self, value):
         try:
             addr = IPv4Address(value)
-            self._ip = addr
         except AddressValueError:
             raise MeboConfigurationError(f"{value} is not a valid IPv4Address")
+        if addr != self._ip:
+            self._invalidate_state()
+            with self._lock:
+                transport, self._transport = self._transport, None
+                self._ip = addr
+            if transport is not None:
+                # connections to the old address are useless now
+                transport.close()
+
+    @property
+    def mac(self):
+        """Mebo's MAC address, if it was discovered through mDNS or given. None otherwise"""
+        return self._mac
 
     @property
     def mdns_name(self):
@@ -167,7 +490,28 @@ class Mebo:
     @property
     def endpoint(self):
         """HTTP Endpoint serving the Mebo control API"""
-        return f"http://{self.ip}"
+        if self._port == self.HTTP_PORT:
+            return f"http://{self.ip}"
+        return f"http://{self.ip}:{self._port}"
+
+    @property
+    def transport(self):
+        """The transport carrying commands to the robot
+
+        Its ``stats`` count connections opened versus reused.
+        """
+        transport = self._transport
+        if transport is None:
+            with self._lock:
+                if self._transport is None:
+                    self._transport = self._transport_class(
+                        str(self.ip),
+                        port=self._port,
+                        # a dropped connection may mean the robot rebooted
+                        on_reconnect=self._invalidate_state,
+                    )
+                transport = self._transport
+        return transport
 
     @property
     def is_connected(self):
@@ -175,94 +519,184 @@ class Mebo:
         True if the self.ip is a valid IPv4Address and it's possible to grab the version via HTTP.
         False otherwise, including in the case of an HTTP or connection Error
 
+        If a heartbeat is running (see :meth:`start_heartbeat`), answers immediately from
+        the result of its latest probe.
+
         :raises: :class:`mebo.exceptions.MeboDiscoveryError` when a mDNS discovery fails
         :raises: :class:`mebo.exceptions.MeboConnectionError` when a TCP ConnectionError or HTTPError occurs
         """
-        logging.debug(f"Connecting to Mebo at {self.ip}")
+        if self._heartbeat is not None and self._heartbeat.connected is not None:
+            return self._heartbeat.connected
+        logger.debug(f"Connecting to Mebo at {self.ip}")
         try:
             return self.ip and self.version is not None
-        except (ConnectionError, HTTPError, MeboConfigurationError) as e:
+        except (OSError, HTTPException, MeboConfigurationError) as e:
             raise MeboConnectionError(f"Error connecting to Mebo: {e}")
 
+    @property
+    def heartbeat(self):
+        """The running :class:`mebo.heartbeat.Heartbeat`, or None"""
+        return self._heartbeat
+
+    def start_heartbeat(
+        self, min_interval=0.5, max_interval=5.0, on_connect=None, on_disconnect=None
+    ):
+        """Starts checking in the background whether the robot is reachable
+
+        Once the first probe completes, :attr:`is_connected` answers without touching the
+        network.
+
+        :param min_interval: shortest time between probes, in seconds
+        :param max_interval: longest time between probes, in seconds
+        :param on_connect: called with no arguments when the robot becomes reachable
+        :param on_disconnect: called with no arguments when the robot becomes unreachable
+        :returns: the :class:`mebo.heartbeat.Heartbeat`
+
+        >>> m = Mebo()
+        >>> m.start_heartbeat(on_disconnect=lambda: print("lost Mebo"))
+        >>> m.heartbeat.rtt
+        """
+        self.stop_heartbeat()
+        self._heartbeat = Heartbeat(
+            partial(self._request, req="get_version", retry=False),
+            min_interval=min_interval,
+            max_interval=max_interval,
+            on_connect=on_connect,
+            on_disconnect=on_disconnect,
+            name=f"mebo-heartbeat-{self._ip}",
+        )
+        self._heartbeat.start()
+        return self._heartbeat
+
+    def stop_heartbeat(self):
+        """Stops the background heartbeat, if one is running"""
+        if self._heartbeat is not None:
+            self._heartbeat.stop()
+            self._heartbeat = None
+
     @property
     def media(self):
         """an rtsp session representing the media streams (audio and video) for the robot"""
         if self._rtsp_session is None:
-            url = f"rtsp://{self.ip}/streamhd/"
-            self._rtsp_session = RTSPSession(
-                url,
-                port=self.RTSP_PORT,
-                username="stream",
-                realm="realm",
-                user_agent="python-mebo",
-            )
+            self._rtsp_session = media_session(self.ip, self.RTSP_PORT)
         return self._rtsp_session
 
     def _setup_video_stream(self):
         self._request(req="feedback_channel_init")
-        self._request(req="set_video_gop", value=40)
         self._request(req="set_date", value=time.time())
-        self._request(req="set_video_gop", value=40, speed=1)
-        self._request(req="set_video_gop", value=40, speed=2)
-        self._request(req="set_video_bitrate", value=600)
-        self._request(req="set_video_bitrate", value=600, speed=1)
-        self._request(req="set_video_bitrate", value=600, speed=2)
-        self._request(req="set_resolution", value="720p")
-        self._request(req="set_resolution", value="720p", speed=1)
-        self._request(req="set_resolution", value="720p", speed=2)
-        self._request(req="set_video_qp", value=42)
-        self._request(req="set_video_qp", value=42, speed=1)
-        self._request(req="set_video_qp", value=42, speed=2)
-        self._request(req="set_video_framerate", value=20)
-        self._request(req="set_video_framerate", value=20, speed=1)
-        self._request(req="set_video_framerate", value=20, speed=2)
+        self.apply_profile("default")
+
+    @property
+    def video_profiles(self):
+        """The :class:`mebo.video.VideoProfile` known to be active on each speed tier"""
+        profiles = {}
+        for tier in SPEED_TIERS:
+            values = [
+                self._state.get(self._state_key(setting_params(req, tier)), _UNKNOWN)
+                for req in SETTINGS.values()
+            ]
+            if _UNKNOWN not in values:
+                profiles[tier] = VideoProfile(*values)
+        return profiles
+
+    def apply_profile(self, profile, tiers=SPEED_TIERS, force=False):
+        """Applies video encoder settings, sending only those that changed
+
+        The speed tiers are independent, so their settings are sent concurrently.
+
+        :param profile: a :class:`mebo.video.VideoProfile`, the name of one of \
+            `mebo.video.PRESETS`, or a dictionary of speed tier to either
+        :param tiers: speed tiers to apply a single profile to. default: all of them
+        :param force: if True, send every setting, even if it appears unchanged
+
+        >>> m = Mebo()
+        >>> m.apply_profile("low_latency")
+        >>> m.apply_profile(VideoProfile(40, 800, "720p", 38, 20), tiers=[0])
+        """
+        if not isinstance(profile, dict):
+            profile = {tier: profile for tier in tiers}
+        pending = []
+        for tier, new in profile.items():
+            if tier not in SPEED_TIERS:
+                raise MeboConfigurationError(
+                    f"Speed tier must be one of {SPEED_TIERS}, not {tier}"
+                )
+            if isinstance(new, str):
+                try:
+                    new = PRESETS[new]
+                except KeyError:
+                    raise MeboConfigurationError(
+                        f"Video preset must be one of {list(PRESETS)}, not {new}"
+                    )
+            commands = [
+                params
+                for params in setting_commands(new, tier)
+                if force or not self._is_current(params)
+            ]
+            if commands:
+                pending.append(
+                    self.submit(
+                        self._apply_settings, commands, component=f"video{tier}"
+                    )
+                )
+        for future in pending:
+            future.result()
+
+    def _apply_settings(self, commands):
+        for params in commands:
+            self._request(force=True, **params)
 
     def _get_stream(self, address, timeout=10):
         pass
 
-    def _add_service(self, zeroconf, service_type, state_change, name):
-        # TODO: this is a problem with multiple robots on the network because
-        # it kills the connection
-        info = zeroconf.get_service_info(service_type, name)
-        logging.debug(
-            "(%s): %s found at %s", state_change, name, info.parsed_addresses()
-        )
-        if name.endswith(self._mdns_domain):
-            service_props = {
-                k.decode("ascii"): v.decode("ascii") for k, v in info.properties.items()
-            }
-            self._mac = ":".join(
-                "".join(p)
-                for p in zip(service_props["mac"][::2], service_props["mac"][1::2])
-            )
-            self.ip = service_props["ip"]
-            self.mdns_name = name
-        else:
-            logging.debug(f"Igoring service {name}")
+    def _discover(self, timeout=3, mac=None, network=None):
+        """Finds Mebo on your LAN
 
-    def _discover_via_mdns(self, timeout=3, tick=0.1):
-        """
-        Runs the discovery scan to find Mebo on your LAN
+        The robots in :attr:`DISCOVERY_CACHE` are tried first, with one quick request
+        each, all at once (see :meth:`mebo.discovery.DiscoveryCache.find`). Only if none
+        answers is the LAN scanned with mDNS, and then, if given, `network` swept with
+        :func:`mebo.discovery.sweep`.
 
-        :returns: The IP address of the Mebo found on the LAN
-        :raises: `MeboDiscoveryError` if discovery times out or the API probe produces a 40X or 50x status code
+        :param mac: MAC address of the wanted robot. default: any
+        :param network: CIDR range to sweep if mDNS finds nothing. Sweeps can't tell \
+            robots apart by MAC, so they are skipped when `mac` is given
+        :raises: `MeboDiscoveryError` if no robot is found
         """
+        cache = self.DISCOVERY_CACHE
+        if cache is not None:
+            robot = cache.find(self._port, mac=mac)
+            if robot is not None:
+                logger.debug("Mebo(mac:%s) is still at %s", robot.mac, robot.ip)
+                self._mac = robot.mac
+                self.ip = robot.ip
+                self.mdns_name = robot.name
+                return
         try:
-            # Only care about IPV4
-            zeroconf = Zeroconf(ip_version=IPVersion.V4Only)
-            start = time.time()
-            logging.debug("Starting search for Mebo...")
-            with ServiceBrowser(
-                zeroconf, self._mdns_domain, handlers=[self._add_service]
-            ):
-                while self._ip is None and time.time() - start < timeout:
-                    logging.debug("Still Looking for Mebo...")
-                    time.sleep(tick)
-            assert self._ip is not None
-            logging.debug(
-                "Mebo(mac:%s) is at (%s)->(%s)", self._mac, self._mdns_name, self._ip
-            )
-        except AssertionError:
+            robot = self._discover_via_mdns(timeout, mac)
+        except MeboDiscoveryError:
+            if network is None or mac is not None:
+                raise
+            logger.debug("mDNS found no Mebo; sweeping %s", network)
+            ip = next(sweep(network, self._port), None)
+            if ip is None:
+                raise MeboDiscoveryError(f"Unable to locate Mebo in {network}")
+            self.ip = ip
+            return
+        if cache is not None:
+            cache.remember(robot)
+
+    def _discover_via_mdns(self, timeout=3, mac=None):
+        """
+        Finds Mebo on your LAN through the shared :class:`mebo.discovery.DiscoveryService`
+
+        Robots the service has already seen resolve immediately.
+
+        :param mac: MAC address of the wanted robot. default: the first one found
+        :returns: the :class:`mebo.discovery.RobotRecord` of the robot found
+        :raises: `MeboDiscoveryError` if no robot is found within `timeout` seconds
+        """
+        robot = shared_service().wait_for(mac=mac, timeout=timeout)
+        if robot is None:
             raise MeboDiscoveryError(
                 (
                     "Unable to locate Mebo on the network.\n"
@@ -270,23 +704,270 @@ class Mebo:
                     "\tIt may be necessary to power cycle the Mebo."
                 )
             )
-        finally:
-            if zeroconf.started:
-                zeroconf.close()
+        self._mac = robot.mac
+        self.ip = robot.ip
+        self.mdns_name = robot.name
+        logger.debug(
+            "Mebo(mac:%s) is at (%s)->(%s)", self._mac, self._mdns_name, self._ip
+        )
+        return robot
+
+    @property
+    def executor(self):
+        """The :class:`mebo.executor.CommandExecutor` running submitted commands"""
+        executor = self._executor
+        if executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = CommandExecutor(
+                        max_workers=self.MAX_WORKERS, name=f"mebo-{self._ip}"
+                    )
+                executor = self._executor
+        return executor
+
+    def submit(
+        self,
+        fn,
+        *args,
+        component="drive",
+        priority=None,
+        max_age=None,
+        deadline=None,
+        **kwargs,
+    ):
+        """Runs a command without blocking the caller
+
+        Commands submitted for the same component run one after the other, in order.
+        Commands for different components are in flight at the same time. Stops jump
+        the queue and cancel the motion still pending for their component, and queries
+        wait until no motion is pending.
+
+        A command that is still queued when it becomes too old to be useful is dropped
+        instead of sent, and its future raises :class:`mebo.exceptions.MeboDeadlineError`.
+        Dropped commands are counted in ``m.executor.stats()``.
+
+        :param fn: the command to run, e.g. `m.move`
+        :param component: name of the component the command moves. default: 'drive'
+        :param priority: one of the priorities in :mod:`mebo.executor`. \
+            default: derived from `fn` by :func:`command_priority`
+        :param max_age: seconds after submission beyond which the command is dropped
+        :param deadline: :func:`time.monotonic` time beyond which the command is dropped
+        :returns: a :class:`concurrent.futures.Future` for the command's result
+
+        >>> m = Mebo()
+        >>> drive = m.submit(m.move, "n", dur=1000)
+        >>> arm = m.arm.up.submit(dur=1000)
+        >>> drive.result(), arm.result()
+        >>> m.submit(m.move, "n", dur=200, max_age=0.25)
+        """
+        if priority is None:
+            priority = command_priority(fn)
+        if max_age is not None:
+            expires = time.monotonic() + max_age
+            deadline = expires if deadline is None else min(deadline, expires)
+        return self.executor.submit(
+            component, fn, *args, priority=priority, deadline=deadline, **kwargs
+        )
 
-    def _request(self, **params):
+    def _request(self, *, force=False, retry=True, **params):
         """private function to submit HTTP requests to Mebo's API
 
+        Setter commands (see `SETTERS`) are skipped if the robot already has the value.
+        Requests wait for a slot from :attr:`limiter`, except stops. Queries in
+        `mebo.retry.IDEMPOTENT` that fail are retried with jittered backoff, and no
+        requests but stops are sent while :attr:`circuit_breaker` is open. A stop sent
+        while motion in its lane is in flight is repeated once that motion completes.
+
+        :param force: if True, send setter commands even if they appear redundant
+        :param retry: if False, idempotent queries aren't retried
         :param params: arguments to pass as query params to the Mebo API
 
-        :returns: The `requests.HTTPResponse`
+        :returns: The :class:`mebo.transport.Response`, or None if the command was skipped
         """
+        lane = STOP_COMMANDS.get(params.get("req"))
+        if lane is not None:
+            # a new object each time, so motion in flight can tell it has been stopped
+            self._last_stops[lane] = dict(params)
+            if self._executor is not None:
+                # motion queued before a stop must not run after it
+                self._executor.cancel(lane, MOTION)
+        key = None
+        if params.get("req") in SETTERS and "value" in params:
+            key = self._state_key(params)
+            if not force and self._is_current(params):
+                logger.debug("Skipping %s; the robot already has it", params)
+                return None
+            # until the robot acknowledges it, the value is unknown
+            self._state.pop(key, None)
+        if retry and params.get("req") in IDEMPOTENT:
+            delays = self._retry.delays()
+        else:
+            delays = iter(())
+        moving = MOTION_LANES.get(params.get("req"))
+        stopped = self._last_stops.get(moving)
         try:
-            response = self._session.get(self.endpoint, params=params)
+            while True:
+                try:
+                    response = self._send(params, stop=lane is not None)
+                    break
+                except MeboCircuitOpenError:
+                    raise
+                except MeboRequestError as e:
+                    delay = next(delays, None)
+                    if delay is None:
+                        raise
+                    logger.debug("Retrying %s in %.3fs: %s", params["req"], delay, e)
+                    time.sleep(delay)
+        finally:
+            if moving is not None:
+                self._restop(moving, stopped)
+        if key is not None:
+            self._state[key] = params["value"]
+        return response
+
+    def _restop(self, lane, stopped):
+        """Sends the last stop of `lane` again if it was sent after `stopped`
+
+        A stop goes out while the lane's motion may still be in flight on another
+        connection, so the robot can receive the two in either order. Once the motion's
+        request has completed, sending the stop again makes sure it comes last.
+        """
+        stop = self._last_stops.get(lane)
+        if stop is None or stop is stopped:
+            return
+        logger.debug("Repeating %s after motion that was in flight", stop["req"])
+        try:
+            self._send(stop, stop=True)
+        except MeboRequestError as e:
+            logger.warning("Unable to repeat %s: %s", stop["req"], e)
+
+    def _send(self, params, stop=False):
+        deadline = None if stop else current_deadline()
+        timeout = None if deadline is None else max(0, deadline - time.monotonic())
+        if not self._limiter.acquire(block=not stop, timeout=timeout):
+            raise MeboDeadlineError(
+                f"Command expired waiting for a free slot to send {params.get('req')}"
+            )
+        # a stop is worth trying even when the robot looks unreachable
+        if not stop:
+            try:
+                self._breaker.check()
+            except MeboCircuitOpenError:
+                self._limiter.release()
+                raise
+        self._stats.before(params)
+        start = time.monotonic()
+        answered = ok = False
+        response = error = None
+        try:
+            response = self.transport.request(params)
+            answered = True
             response.raise_for_status()
-            return response
-        except (ConnectionError, HTTPError) as e:
-            raise MeboRequestError(f"Request to Mebo failed: {e}")
+            ok = True
+        except (OSError, HTTPException) as e:
+            if isinstance(e, OSError):
+                # the robot may have rebooted; nothing we know about it can be trusted
+                self._invalidate_state()
+            error = MeboRequestError(f"Request to Mebo failed: {e}")
+            raise error
+        finally:
+            latency = time.monotonic() - start
+            self._limiter.release(latency, ok)
+            self._stats.record(
+                params.get("req"),
+                latency,
+                ok,
+                len(response.content) if response is not None else 0,
+            )
+            self._stats.after(params, latency, error)
+            # any answer, even an error status, shows the robot is reachable
+            if answered:
+                self._breaker.record_success()
+            else:
+                self._breaker.record_failure()
+        return response
+
+    def stats(self, *commands):
+        """Request counts, errors, response bytes and latency percentiles by command
+
+        Every request sent to the robot is counted, including retries. Latencies are in
+        seconds.
+
+        :param commands: API commands to report, e.g. 'move_forward'. default: all
+
+        >>> m = Mebo()
+        >>> m.stats("get_version")["get_version"]["p95"]
+        """
+        return self._stats.snapshot(*commands)
+
+    def reset_stats(self):
+        """Clears the statistics reported by :meth:`stats`"""
+        self._stats.reset()
+
+    def add_request_hooks(self, before=None, after=None):
+        """Registers functions called around every request, e.g. for tracing
+
+        :param before: called as ``before(params)`` just before a request is sent
+        :param after: called as ``after(params, latency, error)`` once it completes. \
+            `error` is the :class:`mebo.exceptions.MeboRequestError`, or None
+        :returns: a function that unregisters the hooks
+
+        >>> m = Mebo()
+        >>> remove = m.add_request_hooks(after=lambda params, latency, error: print(params))
+        """
+        return self._stats.add_hooks(before, after)
+
+    @property
+    def circuit_breaker(self):
+        """The :class:`mebo.retry.CircuitBreaker` that fails requests fast while the
+        robot is unreachable
+
+        >>> m = Mebo()
+        >>> m.circuit_breaker.state
+        """
+        return self._breaker
+
+    @property
+    def limiter(self):
+        """The :class:`mebo.limiter.ConcurrencyLimiter` bounding requests in flight
+
+        >>> m = Mebo()
+        >>> m.limiter.stats()["limit"], m.limiter.stats()["queued"]
+        """
+        return self._limiter
+
+    def _query(self, req, parse):
+        return self._cache.get(req, lambda: parse(self._request(req=req).text))
+
+    @property
+    def cache(self):
+        """The :class:`mebo.cache.TTLCache` of read-only query results
+
+        >>> m = Mebo()
+        >>> m.cache.ttls["get_version"] = 30
+        >>> m.cache.stats()
+        """
+        return self._cache
+
+    def refresh(self, *queries):
+        """Forgets cached query results, so the next access goes to the robot
+
+        :param queries: API commands to forget, e.g. 'get_version'. default: all of them
+        """
+        self._cache.invalidate(*queries)
+
+    def _state_key(self, params):
+        return (params["req"],) + tuple(
+            sorted((k, str(v)) for k, v in params.items() if k not in ("req", "value"))
+        )
+
+    def _is_current(self, params):
+        known = self._state.get(self._state_key(params), _UNKNOWN)
+        return known is not _UNKNOWN and str(known) == str(params["value"])
+
+    def _invalidate_state(self):
+        self._state.clear()
+        self._cache.invalidate()
 
     def visible_networks(self):
         """
@@ -298,12 +979,35 @@ class Mebo:
         >>> print(m.visible_networks())
         """
         resp = self._request(req="get_rt_list")
-        et = xmlfromstring(f"{resp.text}")
-        visible = {}
-        for nw in et.findall("w"):
-            wlan = WirelessNetwork(*(i.text.strip('"') for i in nw))
-            visible[wlan.ssid] = wlan
-        return visible
+        return parse_networks(resp.text)
+
+    def survey(self, interval=10.0, threshold=3, scans=None):
+        """Scans for wireless networks periodically, yielding only what changed
+
+        The first scan reports every visible network as added. Each later one reports
+        networks that appeared or disappeared, and those whose settings changed or whose
+        signal strength moved by at least `threshold`. Scan results are parsed as they
+        are read, straight into the comparison with the previous scan.
+
+        :param interval: seconds between the start of one scan and the next
+        :param threshold: smallest change of signal strength worth reporting
+        :param scans: number of scans to make. default: scan until the generator is closed
+        :returns: generator of :class:`mebo.survey.SurveyDiff`
+
+        >>> m = Mebo()
+        >>> for diff in m.survey(interval=30):
+        ...     print(sorted(diff.added), sorted(diff.lost))
+        """
+        site = SiteSurvey(threshold)
+        next_scan = time.monotonic()
+        while scans is None or site.scans < scans:
+            delay = next_scan - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            # a late scan pushes back the ones after it, rather than bunching them up
+            next_scan = max(next_scan, time.monotonic()) + interval
+            resp = self._request(req="get_rt_list")
+            yield site.update(iter_networks(resp.content))
 
     def add_router(self, auth_type, ssid, password, index=1):
         """
@@ -320,20 +1024,24 @@ class Mebo:
             index=index,
         )
 
-    def set_scan_timer(self, value=30):
-        self._request(req="set_scan_timer", value=value)
+    def set_scan_timer(self, value=30, force=False):
+        self._request(req="set_scan_timer", value=value, force=force)
 
     def restart(self):
-        """Restarts the Mebo"""
-        self._request(req="restart_system")
+        """Restarts the Mebo
 
-    def set_timer_state(self, value=0):
-        self._request(req="set_timer_state", value=value)
+        Settings and query results remembered from before the restart are forgotten.
+        """
+        try:
+            self._request(req="restart_system")
+        finally:
+            self._invalidate_state()
+
+    def set_timer_state(self, value=0, force=False):
+        self._request(req="set_timer_state", value=value, force=force)
 
     def get_wifi_cert(self):
-        resp = self._request(req="get_wifi_cert")
-        _, cert_type = resp.text.split(":")
-        return cert_type.strip()
+        return self._query("get_wifi_cert", parse_value)
 
     def get_boundary_position(self):
         """Gets boundary positions for 4 axes:
@@ -348,12 +1056,7 @@ class Mebo:
         >>> m = Mebo()
         >>> m.get_boundary_position()
         """
-        resp = self._request(req="get_boundary_position")
-        _, key_value_string = [s.strip() for s in resp.text.split(":")]
-        return dict(
-            (k, int(v))
-            for k, v in [ks.strip().split("=") for ks in key_value_string.split("&")]
-        )
+        return self._query("get_boundary_position", parse_boundary_position)
 
     @property
     def version(self):
@@ -363,46 +1066,28 @@ class Mebo:
         >>> m.version == '03.02.37'
         """
         try:
-            resp = self._request(req="get_version")
-            _, version = resp.text.split(":")
-            return version.strip()
+            return self._query("get_version", parse_value)
         except MeboRequestError as e:
-            logging.debug(f"Error requesting model: {e}")
+            logger.debug(f"Error requesting model: {e}")
             return None
 
     @property
     def model(self):
-        """returns the robot model. For this version, always 
+        """returns the robot model. For this version, always
         expected to be `001`
         >>> m = Mebo()
         >>> m.model == '001'
         """
         try:
-            resp = self._request(req="get_model")
-            _, model = resp.text.split(":")
-            return model.strip()
+            return self._query("get_model", parse_value)
         except MeboRequestError as e:
-            logging.debug(f"Error requesting model: {e}")
+            logger.debug(f"Error requesting model: {e}")
             return None
 
     @property
     def move_directions(self):
         if self._move_directions is None:
-            self._move_directions = dict(
-                zip(
-                    DIRECTIONS,
-                    [
-                        "move_forward",
-                        "move_forward_right",
-                        "move_right",
-                        "move_backward_right",
-                        "move_backward",
-                        "move_backward_left",
-                        "move_left",
-                        "move_forward_left",
-                    ],
-                )
-            )
+            self._move_directions = dict(zip(DIRECTIONS, MOVE_COMMANDS))
         return self._move_directions
 
     def move(self, direction, speed=255, dur=1000):
@@ -440,27 +1125,55 @@ class Mebo:
     def stop(self):
         self._request(req="fb_stop")
 
-    @property
-    def claw(self):
+    def continuous_drive(self, tick=0.1, idle_timeout=0.3):
+        """Starts driving continuously toward a setpoint that can be updated at any rate
+
+        Suited to joysticks and other high-frequency input: only the latest setpoint is
+        sent, once per `tick`, and the robot stops when input goes idle.
+
+        :param tick: seconds between commands sent to the robot. default: 0.1
+        :param idle_timeout: seconds without input after which the robot stops. default: 0.3
+        :returns: a started :class:`mebo.drive.DriveController`
+
+        >>> m = Mebo()
+        >>> with m.continuous_drive() as drive:
+        ...     drive.set("n", speed=200)
+        """
+        controller = DriveController(self, tick=tick, idle_timeout=idle_timeout)
+        controller.start()
+        return controller
+
+    def run_script(self, script, correct_latency=True):
+        """Runs a timed motion script, blocking until it completes
+
+        :param script: a :class:`mebo.script.MotionScript`, or its text form
+        :param correct_latency: send each command early by half the round trip time, \
+            so it reaches the robot on time. default: True
+        :returns: a list of :class:`mebo.script.StepReport` with per-step timing error
+
+        >>> m = Mebo()
+        >>> m.run_script("0.0 move n dur=500\n0.0 arm.up dur=500\n0.6 claw.open")
+        """
+        from .script import MotionScript, ScriptRunner
+
+        if isinstance(script, str):
+            script = MotionScript.parse(script)
+        rtt = self._heartbeat.rtt if self._heartbeat is not None else None
+        return ScriptRunner(self, script, correct_latency, rtt=rtt).run()
+
+    claw = component(
+        Claw,
         """The claw component at the end of Mebo's arm
 
         >>> m = Mebo()
         >>> m.claw.open(dur=1000, **params)
         >>> m.claw.close(dur=400, **params)
         >>> m.claw.stop(**params)
-        """
-        if self._claw is None:
-            claw = ComponentFactory.build(
-                "Claw",
-                open=partial(self._request, req="c_open"),
-                close=partial(self._request, req="c_close"),
-                stop=partial(self._request, req="c_stop"),
-            )
-            self._claw = claw
-        return self._claw
+        """,
+    )
 
-    @property
-    def wrist(self):
+    wrist = component(
+        Wrist,
         """The wrist component of the robot
 
         The wrist component has the following actions:
@@ -476,73 +1189,26 @@ class Mebo:
         >>> m.wrist.up()
         >>> m.wrist.down()
         >>> m.wrist.lift_stop()
-        """
-        if self._wrist is None:
-            wrist = ComponentFactory.build(
-                "Wrist",
-                rotate_right=partial(self._request, req="w_right"),
-                inch_right=partial(self._request, req="inch_w_right"),
-                rotate_left=partial(self._request, req="w_left"),
-                inch_left=partial(self._request, req="inch_w_left"),
-                rotate_stop=partial(self._request, req="w_stop"),
-                up=partial(self._request, req="h_up"),
-                down=partial(self._request, req="h_down"),
-                lift_stop=partial(self._request, req="h_stop"),
-            )
-            self._wrist = wrist
-        return self._wrist
+        """,
+    )
 
-    @property
-    def arm(self):
+    arm = component(
+        Arm,
         """The arm component of mebo
 
         >>> m = Mebo()
         >>> m.arm.up(dur=1000, **params)
         >>> m.arm.down(dur=1000, **params)
         >>> m.arm.stop(**params)
-        """
-        up = partial(self._request, req="s_up")
-        up.__doc__ = """Move the arm up
+        """,
+    )
 
-        :param dur: The duration of the arm movement
-        :type dur: int
-        """
-        down = partial(self._request, req="s_down")
-        down.__doc__ = """Move the arm down
-
-        :param dur: The duration of the arm movement
-        :type dur: int
-        """
-        stop = partial(self._request, req="s_stop")
-        stop.__doc__ = """Stop the arm"""
-
-        if self._arm is None:
-            arm = ComponentFactory.build("Arm", up=up, down=down, stop=stop)
-            self._arm = arm
-        return self._arm
-
-    @property
-    def speaker(self):
+    speaker = component(
+        Speaker,
         """
         >>> m = Mebo()
         >>> m.speaker.set_volume(value=6)
         >>> m.speaker.get_volume()
         >>> m.speaker.play_sound(**params)
-        """
-        set_volume = partial(self._request, req="set_spk_volume")
-        set_volume.__doc__ = """Set the volume of the speaker
-
-        The value passed in to set the volume must be in the range [0, 100]
-        """
-        play_sound = partial(self._request, req="audio_out0")
-        # TODO: how do you change what noise is played?
-        play_sound.__doc__ = """Play one of the stored sounds
-
-        through the speaker. 
-        """
-        if self._speaker is None:
-            speaker = ComponentFactory.build(
-                "Speaker", set_volume=set_volume, play_sound=play_sound
-            )
-            self._speaker = speaker
-        return self._speaker
+        """,
+    )
@@ -0,0 +1,272 @@
+"""Timed motion scripts
+
+A script lists commands along with when, in seconds from the start, each should reach
+the robot. One command per line::
+
+    # at  command          arguments
+    0.0   move n           speed=200 dur=1000
+    0.0   arm.up           dur=800
+    1.0   wrist.rotate_left
+    1.2   claw.open
+    2.0   stop
+
+Commands are ``move``, ``turn``, ``stop``, or a component action such as ``arm.up``.
+Scripts are validated when they are built, before anything is sent.
+
+>>> m = Mebo()
+>>> script = MotionScript.parse(open("wave.txt").read())
+>>> for report in m.run_script(script):
+...     print(report.step.command, f"{report.error * 1000:+.1f}ms")
+"""
+
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from .exceptions import MeboCommandError
+from .executor import MOTION
+from .robot import COMPONENT_ACTIONS, DIRECTIONS
+from .stats import smooth_rtt
+
+logger = logging.getLogger(__name__)
+
+# command -> keyword arguments it accepts, in the order positional arguments fill them
+DRIVE_ARGUMENTS = {
+    "move": ("direction", "speed", "dur"),
+    "turn": ("direction",),
+    "stop": (),
+}
+ACTION_ARGUMENTS = ("dur", "value")
+TURN_DIRECTIONS = {"l", "r", "left", "right"}
+
+Step = namedtuple("Step", ["at", "command", "kwargs"])
+Step.__doc__ = """One command of a :class:`MotionScript`
+
+:param at: seconds from the start of the script at which the command should reach \
+    the robot
+:param command: 'move', 'turn', 'stop', or a component action such as 'arm.up'
+:param kwargs: dictionary of arguments to the command
+"""
+
+StepReport = namedtuple("StepReport", ["step", "sent", "latency", "error"])
+StepReport.__doc__ = """How one step of a script went
+
+:param step: the :class:`Step`
+:param sent: seconds from the start of the script at which the request was sent
+:param latency: round trip time of the request, in seconds
+:param error: estimated arrival at the robot, `sent` plus half of `latency`, \
+    minus `step.at`, in seconds. Positive values mean late.
+
+`sent`, `latency` and `error` are None for a step that was cancelled before it was sent.
+"""
+
+
+def _parse_value(text):
+    try:
+        return int(text)
+    except ValueError:
+        return text
+
+
+def validate_step(step):
+    """Checks a step's command and arguments
+
+    :raises: :class:`mebo.exceptions.MeboCommandError` if the step can't be run
+    """
+    if step.at < 0:
+        raise MeboCommandError(f"{step.command}: start time must not be negative")
+    if step.command in DRIVE_ARGUMENTS:
+        allowed = DRIVE_ARGUMENTS[step.command]
+    else:
+        component, _, action = step.command.partition(".")
+        if action not in COMPONENT_ACTIONS.get(component, {}):
+            raise MeboCommandError(f"Unknown command: {step.command}")
+        allowed = ACTION_ARGUMENTS
+    unknown = set(step.kwargs) - set(allowed)
+    if unknown:
+        raise MeboCommandError(
+            f"{step.command}: unexpected arguments {sorted(unknown)}"
+        )
+
+    direction = step.kwargs.get("direction")
+    if step.command == "move" and direction not in DIRECTIONS:
+        raise MeboCommandError(f"move: direction must be one of {DIRECTIONS}")
+    if step.command == "turn" and direction not in TURN_DIRECTIONS:
+        raise MeboCommandError(f"turn: direction must be one of {TURN_DIRECTIONS}")
+    speed = step.kwargs.get("speed", 0)
+    if not isinstance(speed, int) or not 0 <= speed <= 255:
+        raise MeboCommandError(f"{step.command}: speed must be in the range [0, 255]")
+    dur = step.kwargs.get("dur", 0)
+    if not isinstance(dur, int) or dur < 0:
+        raise MeboCommandError(f"{step.command}: dur must be a number of milliseconds")
+
+
+class MotionScript:
+    """A validated sequence of timed commands
+
+    :param steps: iterable of :class:`Step` or (at, command, kwargs) tuples
+    :raises: :class:`mebo.exceptions.MeboCommandError` if any step is invalid
+    """
+
+    def __init__(self, steps):
+        steps = [
+            Step(float(at), command, dict(kwargs)) for at, command, kwargs in steps
+        ]
+        for step in steps:
+            validate_step(step)
+        # stable, so steps scheduled for the same time are sent in the order given
+        self.steps = sorted(steps, key=lambda step: step.at)
+
+    @classmethod
+    def parse(cls, text):
+        """Builds a script from its text form; see :mod:`mebo.script`"""
+        steps = []
+        for number, line in enumerate(text.splitlines(), start=1):
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            try:
+                at, command, *arguments = line.split()
+                at = float(at)
+            except ValueError:
+                raise MeboCommandError(f"line {number}: expected '<at> <command> ...'")
+            positional = [a for a in arguments if "=" not in a]
+            kwargs = dict(
+                (key, _parse_value(value))
+                for key, value in (a.split("=", 1) for a in arguments if "=" in a)
+            )
+            names = DRIVE_ARGUMENTS.get(command, ACTION_ARGUMENTS)
+            if len(positional) > len(names):
+                raise MeboCommandError(f"line {number}: too many arguments")
+            for name, value in zip(names, positional):
+                kwargs[name] = _parse_value(value)
+            try:
+                step = Step(at, command, kwargs)
+                validate_step(step)
+            except MeboCommandError as e:
+                raise MeboCommandError(f"line {number}: {e}")
+            steps.append(step)
+        return cls(steps)
+
+    def __iter__(self):
+        return iter(self.steps)
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} steps={len(self)} duration={self.duration}>"
+
+    @property
+    def duration(self):
+        """Start time of the last step, in seconds"""
+        return self.steps[-1].at if self.steps else 0.0
+
+
+class ScriptRunner:
+    """Sends the steps of a :class:`MotionScript` on time
+
+    Steps are scheduled against :func:`time.monotonic` from the start of :meth:`run`,
+    never from the end of the previous step, so delays don't accumulate. Each step is
+    submitted to the robot's executor on its component's lane: steps for different
+    components overlap, and steps for the same component run in order. When
+    `correct_latency` is set, each request is sent early by half the measured round
+    trip time, so that it reaches the robot when scheduled.
+
+    :param mebo: the :class:`mebo.robot.Mebo` to run the script on
+    :param script: a :class:`MotionScript`
+    :param correct_latency: send requests early to make up for network latency
+    :param rtt: initial round trip estimate, in seconds, until one has been measured
+    """
+
+    # waits shorter than this are spun rather than slept, for precision
+    SPIN = 0.002
+
+    def __init__(self, mebo, script, correct_latency=True, rtt=None):
+        self.script = script
+        self.correct_latency = correct_latency
+        self.rtt = rtt
+        self.reports = []
+        self._mebo = mebo
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+
+    def run(self):
+        """Runs the script, blocking until every step has completed
+
+        :returns: a list of :class:`StepReport`, in script order. Steps cancelled by \
+            a stop sent before them are reported with None timings.
+        :raises: the error of the first step that failed, once every step has been sent
+        """
+        self._cancelled.clear()
+        start = time.monotonic()
+        futures = []
+        for step in self.script:
+            self._sleep_until(start + step.at - self._lead())
+            if self._cancelled.is_set():
+                break
+            fn, lane = self._resolve(step.command)
+            futures.append(
+                self._mebo.submit(
+                    self._send,
+                    step,
+                    fn,
+                    start,
+                    component=lane,
+                    # the script orders its steps itself, stops included
+                    priority=MOTION,
+                )
+            )
+        self.reports = [
+            StepReport(step, None, None, None)
+            if future.cancelled()
+            else future.result()
+            for step, future in zip(self.script, futures)
+        ]
+        return self.reports
+
+    def cancel(self):
+        """Stops a running script from sending any more steps"""
+        self._cancelled.set()
+
+    def summary(self):
+        """Mean and worst absolute timing error of the last run, in seconds"""
+        errors = [
+            abs(report.error) for report in self.reports if report.error is not None
+        ]
+        return {
+            "steps": len(errors),
+            "mean_error": sum(errors) / len(errors) if errors else 0.0,
+            "max_error": max(errors, default=0.0),
+        }
+
+    def _lead(self):
+        if not self.correct_latency or self.rtt is None:
+            return 0.0
+        return self.rtt / 2
+
+    def _resolve(self, command):
+        if command in DRIVE_ARGUMENTS:
+            return getattr(self._mebo, command), "drive"
+        component, action = command.split(".")
+        return getattr(getattr(self._mebo, component), action), component
+
+    def _sleep_until(self, target):
+        while not self._cancelled.is_set():
+            remaining = target - time.monotonic()
+            if remaining <= 0:
+                return
+            if remaining > self.SPIN:
+                self._cancelled.wait(remaining - self.SPIN)
+
+    def _send(self, step, fn, start):
+        sent = time.monotonic()
+        fn(**step.kwargs)
+        latency = time.monotonic() - sent
+        with self._lock:
+            self.rtt = smooth_rtt(self.rtt, latency)
+        # the request reaches the robot about half way through its round trip
+        error = sent - start + latency / 2 - step.at
+        logger.debug("%s sent %+.4fs from schedule", step.command, error)
+        return StepReport(step, sent - start, latency, error)
@@ -0,0 +1,307 @@
+"""A local stand-in for Mebo's HTTP command server
+
+The simulator answers the same ``?req=`` API as the robot, so :class:`mebo.robot.Mebo`
+can be tested and benchmarked without hardware. Latency, jitter, failures and the
+number of requests served at once are configurable. Random choices come from a seeded
+generator, so a run can be repeated exactly.
+
+>>> with MeboSimulator(latency=0.02, jitter=0.005) as robot:
+...     m = Mebo(ip="127.0.0.1", port=robot.port, autoconnect=False)
+...     m.arm.up(dur=500)
+...     print(robot.received[-1])
+{'req': 's_up', 'dur': '500'}
+
+It can also be run on its own, for clients in other processes::
+
+    python -m mebo.simulator --port 8080 --latency 0.02 --jitter 0.005
+"""
+
+import logging
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qsl, urlsplit
+
+logger = logging.getLogger(__name__)
+
+NETWORKS = [
+    ("home", "a0:63:91:00:00:01", "WPA2PSK", "90", "-48", "-92", "6"),
+    ("workshop", "a0:63:91:00:00:02", "WPA2PSK", "55", "-71", "-90", "11"),
+]
+
+# command -> response body. Every other command is answered with ``<command>:ok``
+RESPONSES = {
+    "get_version": "get_version:03.02.37",
+    "get_model": "get_model:001",
+    "get_boundary_position": "get_boundary_position:s_up=10&s_down=200&c_open=5",
+    "get_rt_list": "<rt_list>{}</rt_list>".format(
+        "".join(
+            '<w><s>"{}"</s><m>"{}"</m><a>"{}"</a><q>"{}"</q><si>"{}"</si>'
+            '<nl>"{}"</nl><c>"{}"</c></w>'.format(*network)
+            for network in NETWORKS
+        )
+    ),
+}
+
+# transports probe the robot with this command to detect keep-alive support. Injected
+# errors spare it, so that only the commands under test fail
+PROBE_COMMAND = "get_version"
+
+
+class SimulatorHandler(BaseHTTPRequestHandler):
+    """Answers one request on behalf of a :class:`MeboSimulator`"""
+
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        params = dict(parse_qsl(urlsplit(self.path).query))
+        status, body = self.server.answer(params)
+        if status is None:
+            # dropped: hang up without answering, like a robot losing Wi-Fi
+            self.close_connection = True
+            return
+        body = body.encode("ascii")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("%s %s", self.address_string(), format % args)
+
+
+class MeboSimulator(ThreadingMixIn, HTTPServer):
+    """Serves Mebo's command API from a background thread
+
+    :param host: address to listen on
+    :param port: port to listen on. default: any free port, see :attr:`port`
+    :param latency: seconds each request takes to answer
+    :param jitter: the latency varies uniformly by up to this many seconds either way
+    :param error_rate: fraction of commands answered with 503 Service Unavailable
+    :param drop_rate: fraction of commands whose connection is closed without an answer
+    :param max_concurrency: requests served at once; others wait their turn. \
+        default: no limit
+    :param keep_alive: if False, answer with HTTP/1.0 and close every connection
+    :param idle_timeout: seconds a connection may sit idle before the simulator \
+        closes it. default: no limit
+    :param seed: seed of the random generator behind jitter and injected errors
+    """
+
+    daemon_threads = True
+    # how often the serving thread checks whether it should stop, in seconds
+    POLL_INTERVAL = 0.05
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        latency=0.0,
+        jitter=0.0,
+        error_rate=0.0,
+        drop_rate=0.0,
+        max_concurrency=None,
+        keep_alive=True,
+        idle_timeout=None,
+        seed=0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.max_concurrency = max_concurrency
+        self.keep_alive = keep_alive
+        self.idle_timeout = idle_timeout
+        # command -> response body, overriding `RESPONSES`
+        self.responses = {}
+        # query parameters of every request, in the order they arrived
+        self.received = []
+        # number of upcoming commands to answer with 503 Service Unavailable
+        self.fail_next = 0
+        # requests being served right now, and the most there have been at once
+        self.in_flight = 0
+        self.peak = 0
+        self.errors = 0
+        self.dropped = 0
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._slots = (
+            threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+        )
+        self._thread = None
+        # sockets of the connections being served
+        self._connections = set()
+        handler = type(
+            "Handler",
+            (SimulatorHandler,),
+            {
+                "protocol_version": "HTTP/1.1" if keep_alive else "HTTP/1.0",
+                "timeout": idle_timeout,
+            },
+        )
+        super().__init__((host, port), handler)
+
+    def __repr__(self):
+        return (
+            f"<{self.__class__.__name__} {self.host}:{self.port} "
+            f"requests={len(self.received)} errors={self.errors} dropped={self.dropped}>"
+        )
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def host(self):
+        return self.server_address[0]
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        """Starts serving in a background thread. Returns the simulator."""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                name=f"mebo-simulator-{self.port}",
+                target=self.serve_forever,
+                kwargs={"poll_interval": self.POLL_INTERVAL},
+                daemon=True,
+            )
+            self._thread.start()
+        return self
+
+    def close(self):
+        """Stops serving and closes every connection, like a robot switched off"""
+        if self._thread is not None:
+            self.shutdown()
+            self._thread = None
+        self.server_close()
+        with self._lock:
+            connections, self._connections = self._connections, set()
+        for sock in connections:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def process_request(self, request, client_address):
+        with self._lock:
+            self._connections.add(request)
+        super().process_request(request, client_address)
+
+    def shutdown_request(self, request):
+        with self._lock:
+            self._connections.discard(request)
+        super().shutdown_request(request)
+
+    def reset(self):
+        """Forgets the requests received so far"""
+        with self._lock:
+            self.received.clear()
+            self.peak = self.in_flight
+            self.errors = 0
+            self.dropped = 0
+
+    def stats(self):
+        """Requests received, errors and drops injected, and peak concurrency"""
+        with self._lock:
+            return {
+                "requests": len(self.received),
+                "errors": self.errors,
+                "dropped": self.dropped,
+                "peak": self.peak,
+            }
+
+    def answer(self, params):
+        """Serves one command
+
+        :param params: the query parameters of the request
+        :returns: a tuple of (status, body), or (None, None) to drop the connection
+        """
+        req = params.get("req", "")
+        with self._lock:
+            self.received.append(params)
+            delay = self.latency
+            if self.jitter:
+                delay += self._random.uniform(-self.jitter, self.jitter)
+            status = 200
+            if req != PROBE_COMMAND:
+                roll = self._random.random()
+                if self.fail_next:
+                    self.fail_next -= 1
+                    status = 503
+                elif roll < self.drop_rate:
+                    status = None
+                elif roll < self.drop_rate + self.error_rate:
+                    status = 503
+            if status is None:
+                self.dropped += 1
+            elif status != 200:
+                self.errors += 1
+        if self._slots is not None:
+            self._slots.acquire()
+        try:
+            with self._lock:
+                self.in_flight += 1
+                self.peak = max(self.peak, self.in_flight)
+            if delay > 0:
+                time.sleep(delay)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            if self._slots is not None:
+                self._slots.release()
+        if status is None:
+            return None, None
+        body = self.responses.get(req) or RESPONSES.get(req, f"{req}:ok")
+        return status, body
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Serve Mebo's command API locally, for tests and benchmarks"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--max-concurrency", type=int)
+    parser.add_argument("--close", action="store_true", help="serve HTTP/1.0")
+    parser.add_argument("--idle-timeout", type=float)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    simulator = MeboSimulator(
+        args.host,
+        args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        drop_rate=args.drop_rate,
+        max_concurrency=args.max_concurrency,
+        keep_alive=not args.close,
+        idle_timeout=args.idle_timeout,
+        seed=args.seed,
+    )
+    print(f"Simulating Mebo at http://{simulator.host}:{simulator.port}/")
+    try:
+        simulator.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""Latency histograms and tracing hooks for requests to the robot"""
+
+import logging
+import math
+import threading
+
+logger = logging.getLogger(__name__)
+
+# weight of the newest sample in a smoothed round trip time
+RTT_SMOOTHING = 0.25
+
+
+def smooth_rtt(rtt, sample, weight=RTT_SMOOTHING):
+    """Adds a sample to an exponentially weighted moving average of round trip times
+
+    :param rtt: the smoothed round trip time so far, or None before the first sample
+    :param sample: the newest round trip time, in seconds
+    :returns: the new smoothed round trip time
+    """
+    if rtt is None:
+        return sample
+    return rtt + weight * (sample - rtt)
+
+
+class LatencyHistogram:
+    """Counts latencies in logarithmically sized buckets
+
+    Bucket boundaries grow by `GROWTH`, so percentiles are accurate to within about
+    19% at any scale while memory stays fixed no matter how many samples are recorded.
+    """
+
+    # upper bound of the first bucket, in seconds
+    MIN_LATENCY = 1e-4
+    GROWTH = 2**0.25
+    # the last bucket holds everything above about 100 seconds
+    BUCKETS = 81
+
+    def __init__(self):
+        self.buckets = [0] * self.BUCKETS
+        self.count = 0
+        self.errors = 0
+        self.bytes = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def __repr__(self):
+        return (
+            f"<{self.__class__.__name__} count={self.count} p50={self.percentile(50)}>"
+        )
+
+    def record(self, latency, ok=True, nbytes=0):
+        """Adds one request
+
+        :param latency: round trip time, in seconds
+        :param ok: whether the request succeeded
+        :param nbytes: size of the response body
+        """
+        if latency <= self.MIN_LATENCY:
+            index = 0
+        else:
+            index = math.ceil(math.log(latency / self.MIN_LATENCY, self.GROWTH))
+        self.buckets[min(index, self.BUCKETS - 1)] += 1
+        self.count += 1
+        self.errors += not ok
+        self.bytes += nbytes
+        self.total += latency
+        self.min = latency if self.min is None else min(self.min, latency)
+        self.max = latency if self.max is None else max(self.max, latency)
+
+    def percentile(self, p):
+        """Upper bound of the latency below which `p` percent of requests fell"""
+        if not self.count:
+            return None
+        rank = math.ceil(p / 100 * self.count)
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank and index < self.BUCKETS - 1:
+                bound = self.MIN_LATENCY * self.GROWTH**index
+                return min(max(bound, self.min), self.max)
+        return self.max
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "bytes": self.bytes,
+            "mean": self.total / self.count if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+class RequestStats:
+    """Latency histograms by API command, and hooks called around every request
+
+    Hooks are for tracing: `before(params)` is called just before a request is sent,
+    and `after(params, latency, error)` once it has completed, with `error` None on
+    success. Exceptions raised by hooks are logged and otherwise ignored.
+    """
+
+    def __init__(self):
+        self._histograms = {}
+        self._hooks = []
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} commands={sorted(self._histograms)}>"
+
+    def record(self, command, latency, ok=True, nbytes=0):
+        with self._lock:
+            histogram = self._histograms.get(command)
+            if histogram is None:
+                histogram = self._histograms[command] = LatencyHistogram()
+            histogram.record(latency, ok, nbytes)
+
+    def snapshot(self, *commands):
+        """Counts, errors, bytes and latency percentiles, in seconds, by command
+
+        :param commands: API commands to include. default: all of them
+        """
+        with self._lock:
+            return {
+                command: histogram.as_dict()
+                for command, histogram in sorted(self._histograms.items())
+                if not commands or command in commands
+            }
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def add_hooks(self, before=None, after=None):
+        """Registers tracing hooks
+
+        :returns: a function that unregisters them
+        """
+        hooks = (before, after)
+        with self._lock:
+            self._hooks.append(hooks)
+
+        def remove():
+            with self._lock:
+                if hooks in self._hooks:
+                    self._hooks.remove(hooks)
+
+        return remove
+
+    def before(self, params):
+        for before, _ in list(self._hooks):
+            if before is not None:
+                self._call(before, params)
+
+    def after(self, params, latency, error=None):
+        for _, after in list(self._hooks):
+            if after is not None:
+                self._call(after, params, latency, error)
+
+    def _call(self, hook, *args):
+        try:
+            hook(*args)
+        except Exception:
+            logger.exception("Error in request hook %s", hook)
@@ -0,0 +1,121 @@
+"""Wi-Fi site surveys: what changed between scans of the networks a robot sees
+
+>>> m = Mebo()
+>>> for diff in m.survey(interval=10):
+...     for ssid, network in diff.added.items():
+...         print("new", ssid, network.si)
+...     for change in diff.changed.values():
+...         print(change.ssid, change.delta)
+"""
+
+import logging
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+SurveyDiff = namedtuple("SurveyDiff", ["added", "lost", "changed"])
+SurveyDiff.__doc__ = """The changes between two scans
+
+:param added: dictionary of SSID -> `WirelessNetwork` for networks not seen before
+:param lost: dictionary of SSID -> the last `WirelessNetwork` seen, for networks gone
+:param changed: dictionary of SSID -> :class:`NetworkChange`
+"""
+
+NetworkChange = namedtuple("NetworkChange", ["ssid", "previous", "current", "delta"])
+NetworkChange.__doc__ = """A network seen in both scans whose signal or settings changed
+
+:param previous: the `WirelessNetwork` of the earlier scan
+:param current: the `WirelessNetwork` of the latest scan
+:param delta: change of signal strength (``si``), or None if it isn't a number
+"""
+
+# fields that identify how a network is set up, rather than how well it is received
+SETTINGS_FIELDS = ("mac", "auth", "channel")
+
+
+def signal(network):
+    """Signal strength of a `WirelessNetwork` as a number, or None"""
+    try:
+        return int(network.si)
+    except (TypeError, ValueError):
+        return None
+
+
+class SiteSurvey:
+    """The networks a robot saw in its latest scan, and how each scan changed them
+
+    :param threshold: smallest change of signal strength worth reporting. Smaller \
+        changes are treated as noise, and don't move the reference they are measured \
+        against, so a slow drift is still reported once it adds up.
+    """
+
+    def __init__(self, threshold=3):
+        self.threshold = threshold
+        # SSID -> the `WirelessNetwork` changes are measured against
+        self.networks = {}
+        self.scans = 0
+
+    def __repr__(self):
+        return (
+            f"<{self.__class__.__name__} networks={len(self.networks)} "
+            f"scans={self.scans}>"
+        )
+
+    def __len__(self):
+        return len(self.networks)
+
+    def update(self, networks):
+        """Takes in a scan and reports what changed since the last one
+
+        :param networks: iterable of `WirelessNetwork`, such as \
+            :func:`mebo.robot.iter_networks`
+        :returns: :class:`SurveyDiff`
+        """
+        previous = self.networks
+        current = {}
+        added = {}
+        changed = {}
+        for network in networks:
+            ssid = network.ssid
+            before = previous.get(ssid)
+            if before is None:
+                added[ssid] = network
+            elif before != network:
+                change = self._compare(before, network)
+                if change is None:
+                    # below the threshold: keep measuring against the older reading
+                    network = before
+                else:
+                    changed[ssid] = change
+            else:
+                network = before
+            current[ssid] = network
+        lost = {
+            ssid: network for ssid, network in previous.items() if ssid not in current
+        }
+        self.networks = current
+        self.scans += 1
+        if added or lost or changed:
+            logger.debug(
+                "Survey: %d new, %d lost, %d changed",
+                len(added),
+                len(lost),
+                len(changed),
+            )
+        return SurveyDiff(added, lost, changed)
+
+    def _compare(self, before, after):
+        before_signal, after_signal = signal(before), signal(after)
+        delta = None
+        if before_signal is not None and after_signal is not None:
+            delta = after_signal - before_signal
+        settings_changed = any(
+            getattr(before, field) != getattr(after, field) for field in SETTINGS_FIELDS
+        )
+        if delta is None:
+            moved = before.si != after.si
+        else:
+            moved = abs(delta) >= self.threshold
+        if moved or settings_changed:
+            return NetworkChange(before.ssid, before, after, delta)
+        return None
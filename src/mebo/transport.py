@@ -0,0 +1,432 @@
+"""Transports that deliver commands to Mebo's HTTP control API"""
+
+import logging
+import queue
+import socket
+import threading
+from http.client import HTTPConnection, HTTPException
+
+from .commands import CommandRegistry
+
+logger = logging.getLogger(__name__)
+
+# a cheap, side-effect free command used to probe the robot's HTTP server
+PROBE_PARAMS = {"req": "get_version"}
+
+
+class TransportStats:
+    """Counters describing how a transport uses its connections
+
+    * ``connects``: TCP connections opened to the robot
+    * ``reuses``: requests sent on a connection that already served a request
+    * ``requests``: requests sent, including probes
+    """
+
+    FIELDS = ("connects", "reuses", "requests")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def reset(self):
+        with self._lock:
+            for name in self.FIELDS:
+                setattr(self, name, 0)
+
+    def as_dict(self):
+        with self._lock:
+            return {name: getattr(self, name) for name in self.FIELDS}
+
+    def __repr__(self):
+        counters = " ".join(f"{k}={v}" for k, v in self.as_dict().items())
+        return f"<TransportStats {counters}>"
+
+
+class Response:
+    """A minimal HTTP response
+
+    Mirrors the parts of :class:`requests.Response` used for Mebo's tiny ``key:value`` bodies
+    """
+
+    def __init__(self, status_code, reason, content, encoding="utf-8"):
+        self.status_code = status_code
+        self.reason = reason
+        self.content = content
+        self.encoding = encoding
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors="replace")
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise HTTPException(f"{self.status_code} {self.reason}")
+
+    def __repr__(self):
+        return f"<Response [{self.status_code}]>"
+
+
+# errors raised when the robot hung up on a connection before reading a request
+DROPPED_ERRORS = (BrokenPipeError, ConnectionResetError)
+
+
+class PooledConnection:
+    """Bookkeeping shared by the connections each transport keeps"""
+
+    # requests carried so far
+    served = 0
+    # True if the connection sat idle in the pool, where the robot may have dropped it
+    pooled = False
+
+    @property
+    def stale(self):
+        """True if the robot may have closed the connection while it was idle
+
+        A request that fails on a stale connection never reached the robot, and can
+        be sent again on a fresh one.
+        """
+        return bool(self.served or self.pooled)
+
+    def closed_early(self):
+        """The error for a connection that closed before a response arrived"""
+        if self.stale:
+            return ConnectionResetError("Connection closed by robot")
+        return HTTPException("Connection closed before a response was received")
+
+
+class _Connection(PooledConnection, HTTPConnection):
+    """An `HTTPConnection` that remembers how it has been used"""
+
+
+class HTTPTransport:
+    """Sends commands to the robot over HTTP/1.1, reusing TCP connections when possible
+
+    Whether the robot's HTTP server honours keep-alive is detected on first use by
+    sending two probe requests over the same connection. If it does, commands are
+    spread over a pool of pre-warmed persistent connections. If it doesn't, a fresh
+    connection is opened in the background after each command so the next one finds
+    a socket that has already completed its TCP handshake.
+
+    :param host: hostname or IP address of the robot
+    :param port: port of the robot's HTTP server
+    :param timeout: socket timeout, in seconds, for connecting and reading responses
+    :param pool_size: number of idle, connected sockets to keep ready
+    :param on_reconnect: called without arguments when the robot turns out to have \
+        dropped a pooled connection, as it does when it reboots
+    """
+
+    def __init__(self, host, port=80, timeout=10.0, pool_size=2, on_reconnect=None):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.on_reconnect = on_reconnect
+        self.stats = TransportStats()
+
+        # None until the first connection tells us otherwise
+        self.keep_alive = None
+
+        self._commands = CommandRegistry(host, port)
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._filling = threading.Lock()
+        self._closed = False
+
+    def __repr__(self):
+        return (
+            f"<{self.__class__.__name__} {self.host}:{self.port} "
+            f"keep_alive={self.keep_alive} {self.stats.as_dict()}>"
+        )
+
+    def connect(self):
+        """Detects keep-alive support and warms the connection pool. Idempotent."""
+        with self._lock:
+            if self.keep_alive is not None:
+                return
+            self._closed = False
+            conn = self._open()
+            try:
+                probe = self._prepare(PROBE_PARAMS)
+                _, will_close = self._send(conn, probe)
+                if not will_close:
+                    # the server claims to keep the connection open; make sure it does
+                    _, will_close = self._send(conn, probe)
+            except (BrokenPipeError, ConnectionResetError):
+                will_close = True
+            self.keep_alive = not will_close
+            logger.debug("%s:%s keep-alive: %s", self.host, self.port, self.keep_alive)
+            if self.keep_alive:
+                self._idle.put(conn)
+            else:
+                conn.close()
+        self._fill()
+
+    def close(self):
+        """Closes all idle connections. The transport reconnects on next use."""
+        with self._lock:
+            self._closed = True
+            self.keep_alive = None
+            self._drain()
+
+    def target(self, params):
+        """The request target (path and query) for a set of command parameters"""
+        return self._commands.target(params)
+
+    def request(self, params):
+        """Sends a command to the robot
+
+        :param params: query parameters of the command, e.g. ``{"req": "fb_stop"}``
+        :returns: :class:`Response`
+        :raises: `OSError` or `http.client.HTTPException` if the exchange fails
+        """
+        if self.keep_alive is None:
+            self.connect()
+        payload = self._prepare(params)
+        conn = self._checkout()
+        try:
+            response, will_close = self._send(conn, payload)
+        except DROPPED_ERRORS:
+            conn.close()
+            if not conn.stale:
+                raise
+            # the robot dropped an idle connection; the command never reached it
+            logger.debug("%s:%s dropped a pooled connection", self.host, self.port)
+            if self.on_reconnect is not None:
+                self.on_reconnect()
+            conn = self._open()
+            response, will_close = self._send(conn, payload)
+        except BaseException:
+            conn.close()
+            raise
+        self._checkin(conn, will_close)
+        return response
+
+    def _open(self):
+        conn = _Connection(self.host, self.port, timeout=self.timeout)
+        conn.connect()
+        self.stats.incr("connects")
+        return conn
+
+    def _prepare(self, params):
+        return self.target(params)
+
+    def _send(self, conn, payload):
+        if conn.served:
+            self.stats.incr("reuses")
+        response, will_close = self._exchange(conn, payload)
+        conn.served += 1
+        self.stats.incr("requests")
+        return response, will_close
+
+    def _exchange(self, conn, target):
+        conn.request("GET", target)
+        resp = conn.getresponse()
+        content = resp.read()
+        return Response(resp.status, resp.reason, content), resp.will_close
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._open()
+
+    def _checkin(self, conn, will_close):
+        if self.keep_alive and not will_close and not self._closed:
+            if self._idle.qsize() < self.pool_size:
+                conn.pooled = True
+                self._idle.put(conn)
+                return
+        conn.close()
+        self._prefetch()
+
+    def _prefetch(self):
+        """Replenish the pool off the caller's thread"""
+        if self._closed or self._idle.qsize() >= self.pool_size:
+            return
+        threading.Thread(
+            name=f"mebo-connect-{self.host}", target=self._fill, daemon=True
+        ).start()
+
+    def _fill(self):
+        # only one thread tops up the pool at a time
+        if not self._filling.acquire(blocking=False):
+            return
+        try:
+            while not self._closed and self._idle.qsize() < self.pool_size:
+                conn = self._open()
+                conn.pooled = True
+                self._idle.put(conn)
+            if self._closed:
+                self._drain()
+        except OSError as e:
+            logger.debug("Unable to pre-connect to %s:%s: %s", self.host, self.port, e)
+        finally:
+            self._filling.release()
+
+    def _drain(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class _RawConnection(PooledConnection):
+    """A connected TCP socket with the bookkeeping the transports expect"""
+
+    def __init__(self, sock):
+        self.sock = sock
+
+    def close(self):
+        self.sock.close()
+
+
+def parse_head(head):
+    """Parses the status line and framing headers of a response
+
+    :param head: the response up to, but not including, the blank line ending the headers
+    :returns: a tuple of (status code, reason, will_close, content length or None)
+    :raises: `http.client.HTTPException` for a malformed status line
+    """
+    status_line, _, headers = head.partition(b"\r\n")
+    protocol, _, status = status_line.decode("latin-1").partition(" ")
+    status, _, reason = status.partition(" ")
+    if not status.isdigit():
+        raise HTTPException(f"Malformed status line: {status_line!r}")
+    headers = headers.lower()
+
+    if b"connection: close" in headers:
+        will_close = True
+    elif protocol == "HTTP/1.0":
+        will_close = b"connection: keep-alive" not in headers
+    else:
+        will_close = False
+
+    length = _content_length(headers)
+    if length is None:
+        # no framing information: the body runs until the robot hangs up
+        will_close = True
+    return int(status), reason, will_close, length
+
+
+class RawTransport(HTTPTransport):
+    """A lightweight alternative to :class:`HTTPTransport` for Mebo's fixed commands
+
+    Request lines come from per-command templates (see :mod:`mebo.commands`) and are
+    written directly to a plain socket. Of the response, only the status line, the
+    framing headers (``Content-Length`` and ``Connection``) and the body are parsed.
+    Connection pooling and keep-alive detection behave exactly as in :class:`HTTPTransport`.
+    """
+
+    def __init__(self, host, port=80, timeout=10.0, pool_size=2, on_reconnect=None):
+        super().__init__(
+            host,
+            port=port,
+            timeout=timeout,
+            pool_size=pool_size,
+            on_reconnect=on_reconnect,
+        )
+        self._prepare = self._commands
+
+    def _open(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.stats.incr("connects")
+        return _RawConnection(sock)
+
+    def _exchange(self, conn, line):
+        sock = conn.sock
+        sock.sendall(line)
+        data = b""
+        while b"\r\n\r\n" not in data:
+            chunk = sock.recv(4096)
+            if not chunk:
+                raise conn.closed_early()
+            data += chunk
+        head, _, body = data.partition(b"\r\n\r\n")
+        status, reason, will_close, length = parse_head(head)
+        if length is None:
+            body += _read_all(sock)
+        else:
+            while len(body) < length:
+                chunk = sock.recv(length - len(body))
+                if not chunk:
+                    raise HTTPException(
+                        "Connection closed before the body was received"
+                    )
+                body += chunk
+        return Response(status, reason, body), will_close
+
+
+class SessionTransport:
+    """Sends commands through a :class:`requests.Session`
+
+    Slower than the other transports, but useful as a reference point. requests
+    reconnects on its own, so `on_reconnect` is never called.
+    """
+
+    def __init__(self, host, port=80, timeout=10.0, pool_size=2, on_reconnect=None):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.on_reconnect = on_reconnect
+        self.stats = TransportStats()
+        self.url = f"http://{host}:{port}/"
+        # requests is slow to import, and only this transport needs it
+        from requests import Session
+
+        self._session = Session()
+
+    @property
+    def keep_alive(self):
+        # requests negotiates keep-alive itself
+        return None
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.url} {self.stats.as_dict()}>"
+
+    def connect(self):
+        pass
+
+    def close(self):
+        self._session.close()
+
+    def request(self, params):
+        response = self._session.get(self.url, params=params, timeout=self.timeout)
+        self.stats.incr("requests")
+        return response
+
+
+def _content_length(headers):
+    start = headers.find(b"content-length:")
+    if start == -1:
+        return None
+    start += len(b"content-length:")
+    end = headers.find(b"\r\n", start)
+    return int(headers[start : end if end != -1 else None])
+
+
+def _read_all(sock):
+    chunks = []
+    while True:
+        chunk = sock.recv(4096)
+        if not chunk:
+            return b"".join(chunks)
+        chunks.append(chunk)
+
+
+# transports selectable by name when creating a `Mebo`
+TRANSPORTS = {
+    "http": HTTPTransport,
+    "raw": RawTransport,
+    "requests": SessionTransport,
+}
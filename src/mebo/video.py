@@ -0,0 +1,70 @@
+"""Encoder settings for Mebo's video stream
+
+The robot encodes video at one of three speed tiers (0, 1 and 2), each with its own
+encoder settings. A :class:`VideoProfile` bundles the settings for one tier.
+
+>>> m = Mebo()
+>>> m.apply_profile("low_latency")
+>>> m.apply_profile({0: PRESETS["archival"], 1: PRESETS["default"]})
+"""
+
+from collections import namedtuple
+
+SPEED_TIERS = (0, 1, 2)
+
+VideoProfile = namedtuple(
+    "VideoProfile", ["gop", "bitrate", "resolution", "qp", "framerate"]
+)
+VideoProfile.__doc__ = """Encoder settings for one speed tier of the video stream
+
+:param gop: frames between keyframes
+:param bitrate: target bitrate, in kbps
+:param resolution: frame size, e.g. '720p'
+:param qp: quantization parameter; lower is higher quality
+:param framerate: frames per second
+"""
+
+# VideoProfile field -> API command that sets it
+SETTINGS = {
+    "gop": "set_video_gop",
+    "bitrate": "set_video_bitrate",
+    "resolution": "set_resolution",
+    "qp": "set_video_qp",
+    "framerate": "set_video_framerate",
+}
+
+PRESETS = {
+    # the settings sent when setting up the video stream
+    "default": VideoProfile(
+        gop=40, bitrate=600, resolution="720p", qp=42, framerate=20
+    ),
+    # frequent keyframes and small frames recover quickly from packet loss
+    "low_latency": VideoProfile(
+        gop=15, bitrate=400, resolution="720p", qp=46, framerate=25
+    ),
+    # fewer, better frames for recording
+    "archival": VideoProfile(
+        gop=60, bitrate=1200, resolution="720p", qp=32, framerate=20
+    ),
+}
+
+
+def setting_commands(profile, tier):
+    """The API commands that apply `profile` to a speed tier
+
+    :param profile: the desired :class:`VideoProfile`
+    :param tier: the speed tier, one of `SPEED_TIERS`
+    :returns: a list of query parameter dictionaries
+    """
+    return [
+        dict(setting_params(req, tier), value=getattr(profile, field))
+        for field, req in SETTINGS.items()
+    ]
+
+
+def setting_params(req, tier):
+    """Query parameters addressing one encoder setting of a speed tier, minus its value"""
+    # tier 0 is the robot's default and is addressed without a speed
+    if tier:
+        return {"req": req, "speed": tier}
+    return {"req": req}
@@ -1,9 +1,89 @@
-# import pytest
-#
-#
-# from mebo import Mebo
-#
-#
-# @pytest.fixture
-# def mebo_mock():
-#     return Mebo(ip="192.168.1.2", autoconnect=False)
+import socket
+
+import pytest
+
+from mebo import Mebo
+from mebo.simulator import PROBE_COMMAND, MeboSimulator
+
+
+def _serve(protocol_version):
+    return MeboSimulator(keep_alive=protocol_version == "HTTP/1.1").start()
+
+
+@pytest.fixture(params=["HTTP/1.1", "HTTP/1.0"], ids=["keep-alive", "close"])
+def robot_server(request):
+    """A local stand-in for the robot's HTTP command server"""
+    with _serve(request.param) as server:
+        yield server
+
+
+@pytest.fixture(params=[True, False], ids=["keep-alive", "close"])
+def idle_robot_server(request):
+    """A robot server that closes connections left idle for 0.1 seconds"""
+    with MeboSimulator(keep_alive=request.param, idle_timeout=0.1) as server:
+        yield server
+
+
+@pytest.fixture(autouse=True)
+def cache_home(tmp_path, monkeypatch):
+    """Keeps the discovery cache of each test apart from the user's"""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    return tmp_path / "cache"
+
+
+@pytest.fixture
+def make_robot_server():
+    """Starts as many keep-alive robot servers as a test needs"""
+    servers = []
+
+    def make():
+        servers.append(_serve("HTTP/1.1"))
+        return servers[-1]
+
+    yield make
+    for server in servers:
+        server.close()
+
+
+@pytest.fixture(params=["http", "raw"])
+def local_mebo(request, robot_server):
+    with Mebo(
+        ip="127.0.0.1",
+        port=robot_server.server_address[1],
+        autoconnect=False,
+        transport=request.param,
+    ) as m:
+        yield m
+
+
+class FakeClock:
+    """Stands in for `time.monotonic`; tests move time forward by setting `now`"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def commands():
+    """Lists the commands a robot server received, leaving out keep-alive probes"""
+
+    def commands(server):
+        return [p["req"] for p in server.received if p["req"] != PROBE_COMMAND]
+
+    return commands
+
+
+@pytest.fixture
+def unused_port():
+    """A local port with nothing listening on it"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+from mebo import AsyncMebo
+from mebo.exceptions import (
+    MeboCommandError,
+    MeboConfigurationError,
+    MeboRequestError,
+)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def port(robot_server):
+    return robot_server.server_address[1]
+
+
+def test_construction_without_valid_ip():
+    with pytest.raises(MeboConfigurationError):
+        AsyncMebo("foobarbaz")
+
+
+def test_queries(port):
+    async def main():
+        async with AsyncMebo("127.0.0.1", port=port) as m:
+            assert await m.version == "03.02.37"
+            assert await m.model == "001"
+            assert await m.is_connected
+            assert await m.get_boundary_position() == {
+                "s_up": 10,
+                "s_down": 200,
+                "c_open": 5,
+            }
+
+    run(main())
+
+
+def test_commands(robot_server, port):
+    async def main():
+        async with AsyncMebo("127.0.0.1", port=port) as m:
+            await m.move("ne", speed=300, dur=200)
+            await m.turn("left")
+            await m.arm.up(dur=500)
+            await m.claw.open()
+            await m.stop()
+            return m.transport.stats
+
+    stats = run(main())
+    assert robot_server.received == [
+        {"req": "move_forward_right", "dur": "200", "value": "255"},
+        {"req": "inch_left"},
+        {"req": "s_up", "dur": "500"},
+        {"req": "c_open"},
+        {"req": "fb_stop"},
+    ]
+    assert stats.requests == 5
+
+
+def test_bad_move_direction(port):
+    with pytest.raises(MeboCommandError):
+        run(AsyncMebo("127.0.0.1", port=port).move("SSW"))
+
+
+def test_many_robots_on_one_loop(robot_server, port):
+    async def main():
+        robots = [AsyncMebo("127.0.0.1", port=port) for _ in range(20)]
+        versions = await asyncio.gather(*(m.version for m in robots))
+        await asyncio.gather(*(m.stop() for m in robots))
+        await asyncio.gather(*(m.close() for m in robots))
+        return versions
+
+    assert run(main()) == ["03.02.37"] * 20
+    assert len(robot_server.received) == 40
+
+
+def test_unreachable_robot(unused_port):
+    async def main():
+        m = AsyncMebo("127.0.0.1", port=unused_port, timeout=1)
+        assert await m.version is None
+        with pytest.raises(MeboRequestError):
+            await m.stop()
+
+    run(main())
+
+
+def test_survey(robot_server, port):
+    robot_server.responses["get_rt_list"] = (
+        '<rt_list><w><s>"home"</s><m>"m"</m><a>"WPA2"</a><q>"70"</q>'
+        '<si>"-60"</si><nl>"-90"</nl><c>"6"</c></w></rt_list>'
+    )
+
+    async def main():
+        async with AsyncMebo("127.0.0.1", port=port) as m:
+            return [diff async for diff in m.survey(interval=0, scans=2)]
+
+    first, second = run(main())
+    assert list(first.added) == ["home"]
+    assert second == ({}, {}, {})
+
+
+def test_idle_connections_dropped_by_the_robot(idle_robot_server):
+    async def main():
+        port = idle_robot_server.port
+        async with AsyncMebo("127.0.0.1", port=port) as m:
+            await m.stop()
+            # long enough for the robot to close every pooled connection
+            await asyncio.sleep(0.3)
+            await m.stop()
+            await m.arm.up(dur=500)
+
+    run(main())
+    assert [params["req"] for params in idle_robot_server.received] == [
+        "fb_stop",
+        "fb_stop",
+        "s_up",
+    ]
@@ -0,0 +1,71 @@
+from mebo.cache import TTLCache
+
+
+def test_results_expire(clock):
+    cache = TTLCache({"get_version": 5}, clock=clock)
+    calls = []
+
+    def fetch():
+        calls.append(clock.now)
+        return "03.02.37"
+
+    assert cache.get("get_version", fetch) == "03.02.37"
+    clock.now = 4.9
+    assert cache.get("get_version", fetch) == "03.02.37"
+    clock.now = 5.0
+    cache.get("get_version", fetch)
+    assert calls == [0.0, 5.0]
+    assert cache.stats() == {"hits": 1, "misses": 2, "size": 1}
+
+
+def test_unconfigured_queries_are_not_cached(clock):
+    cache = TTLCache(clock=clock)
+    assert cache.get("get_rt_list", list) == []
+    assert cache.stats() == {"hits": 0, "misses": 0, "size": 0}
+
+
+def test_none_ttl_never_expires(clock):
+    cache = TTLCache({"get_model": None}, clock=clock)
+    cache.get("get_model", lambda: "001")
+    clock.now = 1e9
+    assert cache.get("get_model", lambda: "002") == "001"
+
+
+def test_invalidate(clock):
+    cache = TTLCache(clock=clock)
+    cache.get("get_version", lambda: "a")
+    cache.get("get_model", lambda: "b")
+    cache.invalidate("get_version")
+    assert cache.stats()["size"] == 1
+    cache.invalidate()
+    assert cache.stats()["size"] == 0
+
+
+def test_results_fetched_across_an_invalidation_are_dropped(clock):
+    cache = TTLCache(clock=clock)
+
+    def fetch():
+        cache.invalidate()
+        return "stale"
+
+    cache.get("get_version", fetch)
+    assert cache.stats()["size"] == 0
+
+
+def test_mebo_caches_queries(local_mebo, robot_server):
+    for _ in range(5):
+        assert local_mebo.is_connected
+        assert local_mebo.get_boundary_position()["s_up"] == 10
+    queries = [p["req"] for p in robot_server.received]
+    # the transport's own keep-alive probes also use get_version
+    assert queries.count("get_boundary_position") == 1
+    assert local_mebo.cache.hits == 8
+    local_mebo.refresh("get_boundary_position")
+    local_mebo.get_boundary_position()
+    assert local_mebo.cache.misses == 3
+
+
+def test_restart_invalidates_cache(local_mebo):
+    local_mebo.version
+    local_mebo.restart()
+    assert local_mebo.cache.stats()["size"] == 0
@@ -0,0 +1,55 @@
+from urllib.parse import urlencode
+
+import pytest
+
+from mebo.commands import CommandRegistry, encode_value
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"req": "fb_stop"},
+        {"req": "move_forward", "dur": 1000, "value": 255},
+        {"req": "set_spk_volume", "value": 6},
+        {"req": "set_date", "value": 1700000000.25},
+        {"req": "s_up", "dur": -1},
+        {"req": "set_spk_volume", "value": "a b&c"},
+        {"req": "setup_wireless_save", "ssid": "my wifi", "key": "p@ss", "index": 1},
+        {"dur": 1000, "req": "move_forward"},
+    ],
+)
+def test_requests_match_urlencode(params):
+    commands = CommandRegistry("127.0.0.1", port=8080)
+    assert commands.target(params) == f"/?{urlencode(params)}"
+    assert commands(params) == (
+        f"GET /?{urlencode(params)} HTTP/1.1\r\nHost: 127.0.0.1:8080\r\n\r\n"
+    ).encode("latin-1")
+
+
+def test_templates_are_built_once_per_command():
+    commands = CommandRegistry("127.0.0.1")
+    template = commands.template({"req": "move_forward", "dur": 500})
+    assert commands.template({"req": "move_forward", "value": 100}) is template
+    assert commands({"req": "c_open"}) is commands({"req": "c_open"})
+    assert len(commands) == 2
+
+
+def test_other_parameters_are_not_templated():
+    commands = CommandRegistry("127.0.0.1")
+    assert commands.template({"req": "setup_wireless_save", "ssid": "x"}) is None
+    assert commands.template({"value": 1}) is None
+    assert len(commands) == 0
+
+
+def test_templates_are_bounded():
+    commands = CommandRegistry("127.0.0.1")
+    commands.MAX_TEMPLATES = 2
+    for i in range(5):
+        assert commands({"req": f"cmd{i}"}).startswith(f"GET /?req=cmd{i} ".encode())
+    assert len(commands) == 2
+
+
+def test_encode_value():
+    assert encode_value(255) == "255"
+    assert encode_value(True) == "True"
+    assert encode_value(1e20) == "1e%2B20"
@@ -0,0 +1,291 @@
+import asyncio
+import json
+import os
+import socket
+import threading
+from types import SimpleNamespace
+
+import pytest
+from zeroconf import IPVersion, ServiceInfo, ServiceStateChange
+from zeroconf.asyncio import AsyncZeroconf
+
+from mebo import Mebo
+from mebo.discovery import (
+    ADDED,
+    MDNS_DOMAIN,
+    REMOVED,
+    UPDATED,
+    DiscoveryCache,
+    DiscoveryService,
+    RobotRecord,
+    async_discover,
+    identify,
+    parse_service_properties,
+    probe,
+    sweep,
+)
+from mebo.exceptions import MeboDiscoveryError
+
+NAME = f"Camera-aabbcc000001.{MDNS_DOMAIN}"
+PROPERTIES = {b"mac": b"aabbcc000001", b"ip": b"10.0.0.5"}
+
+
+class FakeZeroconf:
+    def __init__(self, properties):
+        self.properties = properties
+
+    def get_service_info(self, service_type, name):
+        return SimpleNamespace(properties=self.properties)
+
+
+def test_parse_service_properties():
+    assert parse_service_properties(PROPERTIES) == ("aa:bb:cc:00:00:01", "10.0.0.5")
+
+
+def test_registry_events():
+    service = DiscoveryService()
+    events = []
+    unsubscribe = service.subscribe(
+        lambda event, robot: events.append((event, robot.ip))
+    )
+    service.update("aa:bb:cc:00:00:01", "10.0.0.5", NAME)
+    # a repeated announcement refreshes last_seen without an event
+    service.update("aa:bb:cc:00:00:01", "10.0.0.5", NAME)
+    service.update("aa:bb:cc:00:00:01", "10.0.0.6", NAME)
+    assert service.get(mac="aa:bb:cc:00:00:01").ip == "10.0.0.6"
+    service.remove(NAME)
+    assert service.robots() == []
+    assert events == [(ADDED, "10.0.0.5"), (UPDATED, "10.0.0.6"), (REMOVED, "10.0.0.6")]
+    unsubscribe()
+    service.update("aa:bb:cc:00:00:01", "10.0.0.5", NAME)
+    assert len(events) == 3
+
+
+def test_wait_for_returns_when_the_robot_appears():
+    service = DiscoveryService()
+    assert service.wait_for(timeout=0.01) is None
+    timer = threading.Timer(
+        0.05, service.update, args=("aa:bb:cc:00:00:02", "10.0.0.7", NAME)
+    )
+    timer.start()
+    robot = service.wait_for(mac="aa:bb:cc:00:00:02", timeout=2)
+    assert robot.ip == "10.0.0.7"
+    assert service.wait_for(name="other", timeout=0.01) is None
+
+
+def test_zeroconf_handler():
+    service = DiscoveryService()
+    zeroconf = FakeZeroconf(PROPERTIES)
+    service._on_service(zeroconf, MDNS_DOMAIN, NAME, ServiceStateChange.Added)
+    service._on_service(
+        FakeZeroconf({b"model": b"x"}),
+        MDNS_DOMAIN,
+        f"printer.{MDNS_DOMAIN}",
+        ServiceStateChange.Added,
+    )
+    service._on_service(zeroconf, "_http._tcp.local.", "web._http._tcp.local.", None)
+    assert [robot.name for robot in service.robots()] == [NAME]
+    service._on_service(zeroconf, MDNS_DOMAIN, NAME, ServiceStateChange.Removed)
+    assert service.robots() == []
+
+
+def test_mebo_resolves_from_the_registry(monkeypatch):
+    service = DiscoveryService()
+    service.update("aa:bb:cc:00:00:01", "10.0.0.5", NAME)
+    monkeypatch.setattr("mebo.robot.shared_service", lambda: service)
+    m = Mebo()
+    assert str(m.ip) == "10.0.0.5"
+    assert m.mac == "aa:bb:cc:00:00:01"
+    assert m.mdns_name == NAME
+
+
+def test_mebo_resolves_the_robot_with_its_mac(monkeypatch):
+    service = DiscoveryService()
+    service.update("aa:bb:cc:00:00:01", "10.0.0.5", NAME)
+    service.update(
+        "aa:bb:cc:00:00:02", "10.0.0.6", f"Camera-aabbcc000002.{MDNS_DOMAIN}"
+    )
+    monkeypatch.setattr("mebo.robot.shared_service", lambda: service)
+    m = Mebo(mac="aa:bb:cc:00:00:02")
+    assert str(m.ip) == "10.0.0.6"
+    assert m.mac == "aa:bb:cc:00:00:02"
+
+
+def test_discovery_cache(cache_home):
+    cache = DiscoveryCache()
+    assert cache.load() == []
+    cache.remember(RobotRecord("aa:bb:cc:00:00:01", "10.0.0.5", NAME, None))
+    cache.remember(RobotRecord("aa:bb:cc:00:00:02", "10.0.0.6", "other", None))
+    assert cache.path.startswith(str(cache_home))
+    assert [robot.ip for robot in cache.load()] == ["10.0.0.6", "10.0.0.5"]
+    cache.forget("aa:bb:cc:00:00:02")
+    assert [robot.mac for robot in cache.load()] == ["aa:bb:cc:00:00:01"]
+
+
+def test_corrupt_discovery_cache_is_ignored(tmp_path):
+    path = tmp_path / "robots.json"
+    path.write_text("{not json")
+    cache = DiscoveryCache(str(path))
+    assert cache.load() == []
+    cache.remember(RobotRecord("aa:bb:cc:00:00:01", "10.0.0.5", NAME, None))
+    assert len(cache.load()) == 1
+
+
+@pytest.mark.parametrize(
+    "entry",
+    [
+        {"ip": "1.2.3.4"},
+        "x",
+        None,
+        {"ip": "1.2.3.4", "name": NAME, "seen": "?"},
+        {"ip": "1.2.3.4", "name": None, "seen": 1.0},
+        {"ip": 1234, "name": NAME, "seen": 1.0},
+    ],
+)
+def test_malformed_discovery_cache_entries_are_skipped(tmp_path, entry):
+    path = tmp_path / "robots.json"
+    good = {"ip": "10.0.0.5", "name": NAME, "seen": 1.0}
+    path.write_text(json.dumps({"aa:bb": entry, "aa:bb:cc:00:00:01": good}))
+    cache = DiscoveryCache(str(path))
+    assert [robot.mac for robot in cache.load()] == ["aa:bb:cc:00:00:01"]
+
+
+def test_mebo_ignores_a_malformed_discovery_cache(unused_port, monkeypatch):
+    service = DiscoveryService()
+    service.update("aa:bb:cc:00:00:01", "10.0.0.5", NAME)
+    monkeypatch.setattr("mebo.robot.shared_service", lambda: service)
+    path = Mebo.DISCOVERY_CACHE.path
+    os.makedirs(os.path.dirname(path))
+    with open(path, "w") as f:
+        json.dump({"aa:bb:cc:00:00:01": {"ip": "127.0.0.1"}}, f)
+    m = Mebo(port=unused_port)
+    assert str(m.ip) == "10.0.0.5"
+
+
+def test_cache_find_forgets_robots_that_do_not_answer(robot_server, unused_port):
+    cache = DiscoveryCache()
+    cache.remember(RobotRecord("aa:bb:cc:00:00:01", "127.0.0.1", NAME, None))
+    cache.remember(RobotRecord("aa:bb:cc:00:00:02", "127.0.0.2", NAME, None))
+    assert cache.find(robot_server.port).mac == "aa:bb:cc:00:00:01"
+    assert [robot.mac for robot in cache.load()] == ["aa:bb:cc:00:00:01"]
+    assert cache.find(unused_port) is None
+    assert cache.load() == []
+
+
+def test_cache_find_probes_robots_at_once(monkeypatch):
+    cache = DiscoveryCache()
+    for i in range(cache.MAX_PROBES + 2):
+        cache.remember(RobotRecord(f"aa:bb:cc:00:00:{i:02}", f"10.0.0.{i}", NAME, None))
+    # passes only once every probe is waiting at the same time
+    everyone = threading.Barrier(cache.MAX_PROBES, timeout=2)
+    monkeypatch.setattr("mebo.discovery.probe", lambda *args: everyone.wait() < 0)
+    assert cache.find() is None
+    # the robots beyond MAX_PROBES weren't probed, so they are kept
+    assert len(cache.load()) == 2
+
+
+def test_cache_find_checks_the_mac_address(robot_server, monkeypatch):
+    cache = DiscoveryCache()
+    cache.remember(RobotRecord("aa:bb:cc:00:00:01", "127.0.0.1", NAME, None))
+    monkeypatch.setattr("mebo.discovery.neighbor_mac", lambda ip: "aa:bb:cc:00:00:01")
+    assert cache.find(robot_server.port) is not None
+    # DHCP gave the address to another device
+    monkeypatch.setattr("mebo.discovery.neighbor_mac", lambda ip: "aa:bb:cc:00:00:09")
+    assert cache.find(robot_server.port) is None
+    assert cache.load() == []
+
+
+def test_probe(robot_server, unused_port):
+    assert probe("127.0.0.1", robot_server.server_address[1])
+    assert not probe("127.0.0.1", unused_port)
+
+
+def test_mebo_starts_from_the_discovery_cache(robot_server, monkeypatch):
+    def no_scan():
+        raise AssertionError("the LAN should not be scanned")
+
+    monkeypatch.setattr("mebo.robot.shared_service", no_scan)
+    Mebo.DISCOVERY_CACHE.remember(
+        RobotRecord("aa:bb:cc:00:00:01", "127.0.0.1", NAME, None)
+    )
+    m = Mebo(port=robot_server.server_address[1])
+    assert str(m.ip) == "127.0.0.1"
+    assert m.mac == "aa:bb:cc:00:00:01"
+
+
+def test_stale_cache_entries_fall_back_to_mdns(unused_port, monkeypatch):
+    service = DiscoveryService()
+    service.update("aa:bb:cc:00:00:01", "10.0.0.5", NAME)
+    monkeypatch.setattr("mebo.robot.shared_service", lambda: service)
+    Mebo.DISCOVERY_CACHE.remember(
+        RobotRecord("aa:bb:cc:00:00:01", "127.0.0.1", NAME, None)
+    )
+    m = Mebo(port=unused_port)
+    assert str(m.ip) == "10.0.0.5"
+    assert Mebo.DISCOVERY_CACHE.load()[0].ip == "10.0.0.5"
+
+
+def advertise(*robots):
+    """An AsyncZeroconf on loopback advertising (mac, ip) pairs as robots"""
+    zeroconf = AsyncZeroconf(interfaces=["127.0.0.1"], ip_version=IPVersion.V4Only)
+    infos = [
+        ServiceInfo(
+            MDNS_DOMAIN,
+            f"Camera-{mac.replace(':', '')}.{MDNS_DOMAIN}",
+            addresses=[socket.inet_aton("127.0.0.1")],
+            port=80,
+            properties={"mac": mac.replace(":", ""), "ip": ip},
+        )
+        for mac, ip in robots
+    ]
+    return zeroconf, infos
+
+
+def test_async_discover_returns_the_matching_robot():
+    async def main():
+        server, infos = advertise(
+            ("aa:bb:cc:00:00:01", "10.0.0.5"), ("aa:bb:cc:00:00:02", "10.0.0.6")
+        )
+        # registration probes the network for name conflicts; do it all at once
+        await asyncio.gather(
+            *[await server.async_register_service(info) for info in infos]
+        )
+        browser = AsyncZeroconf(interfaces=["127.0.0.1"], ip_version=IPVersion.V4Only)
+        try:
+            robot = await async_discover(
+                mac="aa:bb:cc:00:00:02", timeout=3, zeroconf=browser
+            )
+            with pytest.raises(MeboDiscoveryError):
+                await async_discover(name=NAME + "x", timeout=0.2, zeroconf=browser)
+        finally:
+            await browser.async_close()
+            await server.async_close()
+        return robot
+
+    robot = asyncio.run(main())
+    assert robot.ip == "10.0.0.6"
+    assert robot.name == f"Camera-aabbcc000002.{MDNS_DOMAIN}"
+
+
+def test_identify(robot_server, unused_port):
+    assert identify("127.0.0.1", robot_server.server_address[1])
+    assert not identify("127.0.0.1", unused_port)
+
+
+def test_sweep(robot_server):
+    # nothing listens on the port at the other loopback addresses
+    found = list(sweep("127.0.0.0/28", robot_server.server_address[1]))
+    assert found == ["127.0.0.1"]
+    assert list(sweep("127.0.0.1/32", robot_server.server_address[1])) == ["127.0.0.1"]
+
+
+def test_mebo_falls_back_to_a_sweep(robot_server, monkeypatch):
+    def not_found(self, timeout=3, mac=None):
+        raise MeboDiscoveryError("no multicast here")
+
+    monkeypatch.setattr(Mebo, "_discover_via_mdns", not_found)
+    port = robot_server.server_address[1]
+    m = Mebo(port=port, network="127.0.0.0/29")
+    assert str(m.ip) == "127.0.0.1"
+    with pytest.raises(MeboDiscoveryError):
+        Mebo(port=port)
@@ -0,0 +1,46 @@
+import time
+
+import pytest
+
+from mebo.drive import DriveController
+from mebo.exceptions import MeboCommandError
+
+
+def test_setpoints_are_coalesced(local_mebo, robot_server):
+    drive = DriveController(local_mebo, tick=0.05, idle_timeout=1)
+    for speed in range(100):
+        drive.set("n", speed=speed)
+    drive.step()
+    assert drive.coalesced == 99
+    assert drive.sent == 1
+    last = robot_server.received[-1]
+    assert last == {"req": "move_forward", "dur": "75", "value": "99"}
+
+
+def test_idle_input_stops_the_robot(local_mebo, robot_server, commands):
+    drive = DriveController(local_mebo, tick=0.01, idle_timeout=0.05)
+    drive.set("w", speed=100)
+    drive.step()
+    time.sleep(0.06)
+    drive.step()
+    drive.step()
+    assert commands(robot_server) == ["move_left", "fb_stop"]
+
+
+def test_continuous_drive_sends_at_a_fixed_tick(local_mebo, robot_server, commands):
+    with local_mebo.continuous_drive(tick=0.02, idle_timeout=1) as drive:
+        deadline = time.monotonic() + 0.2
+        while time.monotonic() < deadline:
+            drive.set("ne", speed=200)
+            time.sleep(0.001)
+    sent = commands(robot_server)
+    assert sent[-1] == "fb_stop"
+    # roughly one move per tick, far fewer than the setpoints
+    assert 3 <= sent.count("move_forward_right") <= 15
+    assert drive.coalesced > drive.sent
+
+
+def test_bad_direction(local_mebo):
+    drive = DriveController(local_mebo)
+    with pytest.raises(MeboCommandError):
+        drive.set("up")
@@ -0,0 +1,206 @@
+import threading
+import time
+
+import pytest
+
+from mebo.exceptions import MeboDeadlineError
+from mebo.executor import MOTION, QUERY, STOP, CommandExecutor
+from mebo.robot import Mebo, command_priority
+from mebo.simulator import MeboSimulator
+
+
+@pytest.fixture
+def executor():
+    e = CommandExecutor(max_workers=4)
+    yield e
+    e.shutdown()
+
+
+class Blocker:
+    """A command that holds its lane until released"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.gate = threading.Event()
+
+    def __call__(self):
+        self.started.set()
+        return self.gate.wait(2)
+
+    def release(self):
+        self.gate.set()
+
+
+@pytest.fixture
+def blocker():
+    b = Blocker()
+    yield b
+    b.release()
+
+
+def test_lane_runs_in_submission_order(executor):
+    ran = []
+
+    def command(i):
+        time.sleep(0.001 * (5 - i))
+        ran.append(i)
+        return i
+
+    futures = [executor.submit("arm", command, i) for i in range(5)]
+    assert [f.result(timeout=2) for f in futures] == list(range(5))
+    assert ran == list(range(5))
+
+
+def test_lanes_run_concurrently(executor):
+    barrier = threading.Barrier(3, timeout=2)
+    futures = [
+        executor.submit(lane, barrier.wait) for lane in ("arm", "wrist", "drive")
+    ]
+    # would time out with a broken barrier if the lanes ran one at a time
+    assert sorted(f.result(timeout=2) for f in futures) == [0, 1, 2]
+
+
+def test_exceptions_are_delivered_through_the_future(executor):
+    future = executor.submit("claw", lambda: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        future.result(timeout=2)
+    # the lane keeps working after a failure
+    assert executor.submit("claw", lambda: "ok").result(timeout=2) == "ok"
+
+
+def test_shutdown_waits_for_queued_commands():
+    executor = CommandExecutor(max_workers=1)
+    futures = [executor.submit("drive", time.sleep, 0.01) for _ in range(3)]
+    executor.shutdown()
+    assert all(f.done() for f in futures)
+    with pytest.raises(RuntimeError):
+        executor.submit("drive", time.sleep, 0)
+
+
+def test_mebo_submit(local_mebo, robot_server):
+    drive = local_mebo.submit(local_mebo.move, "n", dur=200)
+    arm = local_mebo.arm.up.submit(dur=500)
+    claw = [local_mebo.claw.open.submit(), local_mebo.claw.close.submit()]
+    for future in [drive, arm, *claw]:
+        future.result(timeout=2)
+    received = [params["req"] for params in robot_server.received]
+    assert {"move_forward", "s_up"} <= set(received)
+    assert received.index("c_open") < received.index("c_close")
+
+
+def test_motion_overtakes_queries(blocker):
+    executor = CommandExecutor(max_workers=1)
+    ran = []
+    executor.submit("drive", blocker)
+    executor.submit("query", ran.append, "query", priority=QUERY)
+    executor.submit("arm", ran.append, "arm", priority=MOTION)
+    blocker.release()
+    executor.shutdown()
+    assert ran == ["arm", "query"]
+
+
+def test_stop_cancels_pending_motion_and_skips_the_queue(executor, blocker):
+    running = executor.submit("arm", blocker)
+    blocker.started.wait(1)
+    queued = [executor.submit("arm", time.sleep, 0) for _ in range(3)]
+    query = executor.submit("arm", lambda: "position", priority=QUERY)
+    # finishes while the arm lane is still blocked
+    assert (
+        executor.submit("arm", lambda: "stopped", priority=STOP).result(1) == "stopped"
+    )
+    assert all(f.cancelled() for f in queued)
+    blocker.release()
+    assert running.result(timeout=2) is True
+    assert query.result(timeout=2) == "position"
+    stats = executor.stats()
+    assert stats["motion"]["cancelled"] == 3
+    assert stats["stop"]["count"] == 1
+    assert stats["stop"]["max_wait"] < 0.5
+
+
+def test_stop_latency_is_bounded_under_load(executor):
+    for lane in ("drive", "arm", "wrist", "claw", "video0"):
+        for _ in range(20):
+            executor.submit(lane, time.sleep, 0.01)
+    start = time.monotonic()
+    executor.submit("drive", time.sleep, 0, priority=STOP).result(timeout=1)
+    assert time.monotonic() - start < 0.1
+    assert executor.pending("drive") == 0
+
+
+def test_command_priority(local_mebo):
+    assert command_priority(local_mebo.stop) == STOP
+    assert command_priority(local_mebo.arm.stop) == STOP
+    assert command_priority(local_mebo.move) == MOTION
+    assert command_priority(local_mebo.claw.open) == MOTION
+    assert command_priority(local_mebo.get_boundary_position) == QUERY
+
+
+def test_synchronous_stop_cancels_submitted_motion(local_mebo, robot_server, blocker):
+    local_mebo.submit(blocker, component="arm")
+    blocker.started.wait(1)
+    queued = local_mebo.arm.up.submit(dur=1000)
+    local_mebo.arm.stop()
+    blocker.release()
+    assert queued.cancelled()
+    assert "s_up" not in [params["req"] for params in robot_server.received]
+
+
+@pytest.mark.parametrize("pause", [0, 0.01, 0.03])
+def test_stop_reaches_the_robot_after_motion_in_flight(pause):
+    with MeboSimulator(latency=0.02) as sim:
+        with Mebo(ip="127.0.0.1", port=sim.port, autoconnect=False) as m:
+            moving = m.arm.up.submit(dur=1000)
+            time.sleep(pause)
+            m.arm.stop()
+            moving.result()
+        arm = [p["req"] for p in sim.received if p["req"] in ("s_up", "s_stop")]
+    assert arm[-1] == "s_stop"
+    assert "s_up" in arm
+
+
+def test_commands_expire_waiting_for_the_limiter():
+    with MeboSimulator(latency=0.2) as sim:
+        with Mebo(ip="127.0.0.1", port=sim.port, autoconnect=False) as m:
+            m.transport.connect()
+            m.limiter.limit = m.limiter.max_limit = 1
+            slow = m.arm.up.submit(dur=1000)
+            deadline = time.monotonic() + 1
+            while not m.limiter.in_flight and time.monotonic() < deadline:
+                time.sleep(0.005)
+            move = m.submit(m.move, "n", max_age=0.05)
+            with pytest.raises(MeboDeadlineError):
+                move.result(2)
+            slow.result()
+            assert m.executor.stats()["motion"]["expired"] == 1
+            assert m.limiter.stats()["in_flight"] == 0
+        assert "move_forward" not in [p["req"] for p in sim.received]
+
+
+def test_expired_commands_are_dropped(executor, blocker):
+    executor.submit("drive", blocker)
+    blocker.started.wait(1)
+    stale = executor.submit("drive", time.sleep, 0, deadline=time.monotonic() + 0.05)
+    fresh = executor.submit("drive", lambda: "moved", deadline=time.monotonic() + 5)
+    time.sleep(0.1)
+    blocker.release()
+    with pytest.raises(MeboDeadlineError):
+        stale.result(timeout=2)
+    assert fresh.result(timeout=2) == "moved"
+    assert executor.stats()["motion"]["expired"] == 1
+
+
+def test_mebo_submit_max_age(local_mebo, robot_server, blocker):
+    local_mebo.submit(blocker)
+    blocker.started.wait(1)
+    stale = [local_mebo.submit(local_mebo.move, "n", max_age=0.05) for _ in range(3)]
+    time.sleep(0.1)
+    blocker.release()
+    for future in stale:
+        with pytest.raises(MeboDeadlineError):
+            future.result(timeout=2)
+    assert "move_forward" not in [params["req"] for params in robot_server.received]
+    # stops are never dropped
+    stop = local_mebo.submit(local_mebo.stop, deadline=time.monotonic() - 1)
+    stop.result(timeout=2)
+    assert robot_server.received[-1]["req"] == "fb_stop"
@@ -0,0 +1,56 @@
+import threading
+
+import pytest
+
+from mebo import Mebo, MeboFleet
+from mebo.exceptions import MeboRequestError
+
+MACS = ["aa:bb:cc:00:00:01", "aa:bb:cc:00:00:02"]
+
+
+@pytest.fixture
+def servers(make_robot_server):
+    return {mac: make_robot_server() for mac in MACS}
+
+
+@pytest.fixture
+def fleet(servers):
+    robots = {
+        mac: Mebo(ip="127.0.0.1", port=server.server_address[1], autoconnect=False)
+        for mac, server in servers.items()
+    }
+    with MeboFleet(robots) as fleet:
+        yield fleet
+
+
+def test_broadcast(fleet, servers, commands):
+    results = fleet.broadcast("arm.up", dur=100)
+    assert set(results) == set(MACS)
+    for mac, result in results.items():
+        assert result.mac == mac
+        assert result.error is None
+        assert result.elapsed > 0
+        assert commands(servers[mac]) == ["s_up"]
+
+
+def test_broadcast_runs_concurrently(fleet):
+    barrier = threading.Barrier(len(MACS), timeout=2)
+    results = fleet.broadcast(lambda mebo: barrier.wait())
+    assert sorted(result.value for result in results.values()) == [0, 1]
+
+
+def test_scatter(fleet, servers, commands):
+    fleet.scatter("move", {MACS[0]: (("n",), {}), MACS[1]: {"direction": "s"}})
+    assert commands(servers[MACS[0]]) == ["move_forward"]
+    assert commands(servers[MACS[1]]) == ["move_backward"]
+
+
+def test_failures_are_reported_per_robot(fleet, unused_port):
+    fleet.add(
+        "aa:bb:cc:00:00:03", Mebo(ip="127.0.0.1", port=unused_port, autoconnect=False)
+    )
+    results = fleet.broadcast("stop")
+    assert isinstance(results["aa:bb:cc:00:00:03"].error, MeboRequestError)
+    assert all(results[mac].error is None for mac in MACS)
+    fleet.remove("aa:bb:cc:00:00:03")
+    assert len(fleet) == 2
@@ -0,0 +1,72 @@
+import threading
+
+from mebo import Mebo
+from mebo.heartbeat import Heartbeat
+
+
+class Probe:
+    def __init__(self):
+        self.alive = True
+
+    def __call__(self):
+        if not self.alive:
+            raise ConnectionError("no route to Mebo")
+
+
+def test_state_transitions_fire_callbacks():
+    events = []
+    probe = Probe()
+    hb = Heartbeat(
+        probe,
+        on_connect=lambda: events.append("connect"),
+        on_disconnect=lambda: events.append("disconnect"),
+    )
+    assert hb.connected is None
+    assert hb.beat()
+    assert hb.beat()
+    probe.alive = False
+    assert not hb.beat()
+    assert not hb.beat()
+    probe.alive = True
+    hb.beat()
+    assert events == ["connect", "disconnect", "connect"]
+    assert (hb.probes, hb.failures) == (5, 2)
+    assert hb.rtt is not None
+
+
+def test_interval_backs_off_while_healthy_and_resets_on_failure():
+    probe = Probe()
+    hb = Heartbeat(probe, min_interval=1, max_interval=3)
+    hb.beat()
+    assert hb.interval == 1
+    for _ in range(5):
+        hb.beat()
+    assert hb.interval == 3
+    probe.alive = False
+    hb.beat()
+    assert hb.interval == 1
+
+
+def test_callback_errors_do_not_stop_the_heartbeat():
+    hb = Heartbeat(Probe(), on_connect=lambda: 1 / 0)
+    assert hb.beat()
+
+
+def test_mebo_heartbeat(local_mebo):
+    connected = threading.Event()
+    hb = local_mebo.start_heartbeat(min_interval=0.01, on_connect=connected.set)
+    assert connected.wait(2)
+    assert hb.running
+    assert local_mebo.is_connected
+    local_mebo.stop_heartbeat()
+    assert not hb.running
+    assert local_mebo.heartbeat is None
+
+
+def test_is_connected_answers_from_heartbeat(unused_port):
+    m = Mebo(ip="127.0.0.1", port=unused_port, autoconnect=False)
+    disconnected = threading.Event()
+    m.start_heartbeat(on_disconnect=disconnected.set)
+    assert disconnected.wait(2)
+    assert m.is_connected is False
+    m.close()
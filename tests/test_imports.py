@@ -0,0 +1,50 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+# modules that `import mebo` must not load; each is imported on first use
+DEFERRED = [
+    "asyncio",
+    "mebo.aio",
+    "mebo.stream",
+    "requests",
+    "xml.etree",
+    "zeroconf",
+]
+
+
+def run(code):
+    result = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    )
+    return json.loads(result.stdout)
+
+
+def test_import_is_lightweight():
+    loaded = run("import json, sys, mebo; print(json.dumps(sorted(sys.modules)))")
+    assert [module for module in DEFERRED if module in loaded] == []
+
+
+def test_import_does_not_configure_logging():
+    handlers = run(
+        "import json, logging, mebo; print(json.dumps(len(logging.root.handlers)))"
+    )
+    assert handlers == 0
+
+
+@pytest.mark.parametrize(
+    "code, module",
+    [
+        ("mebo.AsyncMebo", "mebo.aio"),
+        ("mebo.robot.parse_networks('<r></r>')", "xml.etree.ElementTree"),
+        ("mebo.transport.SessionTransport('127.0.0.1')", "requests"),
+    ],
+)
+def test_deferred_modules_load_on_first_use(code, module):
+    loaded = run(
+        f"import json, sys, mebo, mebo.transport; {code}; "
+        "print(json.dumps(sorted(sys.modules)))"
+    )
+    assert module in loaded
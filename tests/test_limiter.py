@@ -0,0 +1,85 @@
+import threading
+
+import pytest
+
+from mebo.exceptions import MeboRequestError
+from mebo.limiter import ConcurrencyLimiter
+from mebo.robot import Mebo
+
+
+def run(limiter, latency, ok=True, times=1):
+    for _ in range(times):
+        limiter.acquire()
+        limiter.release(latency, ok)
+
+
+def test_limit_grows_while_requests_are_fast():
+    limiter = ConcurrencyLimiter(initial=2, max_limit=8)
+    run(limiter, 0.01, times=20)
+    assert 4 <= limiter.stats()["limit"] <= 8
+    run(limiter, 0.01, times=200)
+    assert limiter.stats()["limit"] == 8
+
+
+@pytest.mark.parametrize("latency, ok", [(0.01, False), (0.1, True)])
+def test_limit_is_cut_on_failure_or_congestion(latency, ok):
+    limiter = ConcurrencyLimiter(initial=4)
+    run(limiter, 0.01)
+    run(limiter, latency, ok)
+    stats = limiter.stats()
+    assert stats["limit"] == 2
+    assert stats["drops"] == 1
+    run(limiter, 0.01, ok=False, times=5)
+    assert limiter.stats()["limit"] == 1
+
+
+def test_acquire_waits_for_a_slot():
+    limiter = ConcurrencyLimiter(initial=1)
+    limiter.acquire()
+    acquired = threading.Event()
+
+    def waiter():
+        limiter.acquire()
+        acquired.set()
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    assert not acquired.wait(0.05)
+    assert limiter.stats()["queued"] == 1
+    # stops don't wait
+    limiter.acquire(block=False)
+    assert limiter.stats()["in_flight"] == 2
+    limiter.release(0.01)
+    limiter.release(0.01)
+    assert acquired.wait(1)
+    thread.join()
+    assert limiter.stats()["queued"] == 0
+
+
+def test_acquire_gives_up_after_timeout():
+    limiter = ConcurrencyLimiter(initial=1)
+    limiter.acquire()
+    assert limiter.acquire(timeout=0.01) is False
+    stats = limiter.stats()
+    assert stats["in_flight"] == 1
+    assert stats["queued"] == 0
+    limiter.release()
+    assert limiter.stats()["limit"] == 1
+    assert limiter.acquire(timeout=0.01) is True
+
+
+def test_mebo_requests_go_through_the_limiter(local_mebo):
+    for _ in range(5):
+        local_mebo.stop()
+    stats = local_mebo.limiter.stats()
+    assert stats["in_flight"] == 0
+    assert stats["latency"] is not None
+
+
+def test_failed_requests_cut_the_limit(unused_port):
+    m = Mebo(ip="127.0.0.1", port=unused_port, autoconnect=False)
+    m.limiter.limit = 4
+    with pytest.raises(MeboRequestError):
+        m.stop()
+    assert m.limiter.stats()["limit"] == 2
+    assert m.limiter.stats()["in_flight"] == 0
@@ -1,9 +1,13 @@
+import time
+
 import pytest
 
-from mebo.robot import ComponentFactory, Mebo
+from mebo.robot import Arm, ComponentFactory, Mebo
+from mebo.simulator import MeboSimulator
 from mebo.exceptions import (
     MeboConfigurationError,
     MeboCommandError,
+    MeboRequestError,
 )
 
 
@@ -80,3 +84,119 @@ def test_arm(loopback_mebo):
 
 def test_speaker(loopback_mebo):
     assert list(loopback_mebo.speaker.actions) == ["set_volume", "play_sound"]
+
+
+def test_components_are_built_once_per_robot(loopback_mebo):
+    arm = loopback_mebo.arm
+    assert type(arm) is Arm
+    assert loopback_mebo.__dict__["arm"] is arm
+    assert loopback_mebo.arm is arm
+    assert "claw" not in loopback_mebo.__dict__
+    assert not hasattr(arm, "__dict__")
+    assert arm.up.keywords == {"req": "s_up"}
+    assert arm.up.__doc__.startswith("Move the arm up")
+
+
+def test_mac_can_be_given(loopback_mebo):
+    assert loopback_mebo.mac is None
+    m = Mebo(ip="127.0.0.1", autoconnect=False, mac="aa:bb:cc:00:00:01")
+    assert m.mac == "aa:bb:cc:00:00:01"
+
+
+def test_components_are_bound_to_their_robot(loopback_mebo):
+    other = Mebo(ip="127.0.0.2", autoconnect=False)
+    assert type(other.arm) is type(loopback_mebo.arm)
+    assert other.arm.up.func == other._request
+    assert loopback_mebo.arm.up.func == loopback_mebo._request
+
+
+def setters(server):
+    return [p["req"] for p in server.received if p["req"].startswith("set_")]
+
+
+def test_redundant_setters_are_skipped(local_mebo, robot_server):
+    local_mebo.speaker.set_volume(value=6)
+    local_mebo.speaker.set_volume(value=6)
+    local_mebo.set_scan_timer(30)
+    local_mebo.set_scan_timer(30)
+    local_mebo.set_timer_state(0)
+    local_mebo.set_timer_state(1)
+    assert setters(robot_server) == [
+        "set_spk_volume",
+        "set_scan_timer",
+        "set_timer_state",
+        "set_timer_state",
+    ]
+
+
+def test_forced_setters_are_sent(local_mebo, robot_server):
+    local_mebo.speaker.set_volume(value=6)
+    local_mebo.speaker.set_volume(value=6, force=True)
+    local_mebo.set_scan_timer(30)
+    local_mebo.set_scan_timer(30, force=True)
+    assert len(setters(robot_server)) == 4
+
+
+def test_restart_forgets_settings(local_mebo, robot_server):
+    local_mebo.apply_profile("default", tiers=[0])
+    local_mebo.set_scan_timer(30)
+    assert local_mebo.video_profiles
+    local_mebo.restart()
+    assert local_mebo.video_profiles == {}
+    local_mebo.set_scan_timer(30)
+    assert setters(robot_server).count("set_scan_timer") == 2
+
+
+def test_connection_errors_forget_settings(local_mebo, robot_server):
+    local_mebo.set_scan_timer(30)
+    robot_server.shutdown()
+    robot_server.server_close()
+    local_mebo.transport.close()
+    with pytest.raises(MeboRequestError):
+        local_mebo.stop()
+    assert local_mebo._state == {}
+
+
+def test_settings_are_sent_again_after_the_robot_restarts(local_mebo, robot_server):
+    local_mebo.set_scan_timer(30)
+    local_mebo.speaker.set_volume(value=6)
+    transport = local_mebo.transport
+    deadline = time.monotonic() + 2
+    while transport._idle.qsize() < transport.pool_size:
+        # the pool is topped up in the background
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    robot_server.close()
+    restarted = MeboSimulator(
+        port=robot_server.port, keep_alive=robot_server.keep_alive
+    )
+    with restarted:
+        # any request finds the connections the robot dropped when it restarted
+        local_mebo.stop()
+        local_mebo.set_scan_timer(30)
+        local_mebo.speaker.set_volume(value=6)
+    assert setters(restarted) == ["set_scan_timer", "set_spk_volume"]
+
+
+def test_component_actions_take_keyword_arguments_only(local_mebo, robot_server):
+    with pytest.raises(TypeError):
+        local_mebo.arm.up(500)
+    with pytest.raises(TypeError):
+        local_mebo.speaker.set_volume(6)
+    assert [p["req"] for p in robot_server.received if p["req"] != "get_version"] == []
+
+
+def test_concurrent_commands_create_one_transport(robot_server):
+    m = Mebo(ip="127.0.0.1", port=robot_server.server_address[1], autoconnect=False)
+    built = []
+    transport_class = m._transport_class
+
+    def slow_transport(*args, **kwargs):
+        time.sleep(0.05)
+        built.append(transport_class(*args, **kwargs))
+        return built[-1]
+
+    m._transport_class = slow_transport
+    with m:
+        m.apply_profile("default")
+    assert len(built) == 1
@@ -0,0 +1,73 @@
+import pytest
+
+from mebo.exceptions import MeboCircuitOpenError, MeboRequestError
+from mebo.retry import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, RetryPolicy
+from mebo.robot import Mebo
+
+
+def test_retry_delays_are_jittered_and_capped():
+    policy = RetryPolicy(attempts=6, base=0.1, cap=0.5)
+    delays = list(policy.delays())
+    assert len(delays) == 5
+    for n, delay in enumerate(delays):
+        assert 0 <= delay <= min(0.5, 0.1 * 2**n)
+    assert len({tuple(policy.delays()) for _ in range(5)}) > 1
+
+
+def test_circuit_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(threshold=3, reset_timeout=5, clock=clock)
+    for _ in range(2):
+        breaker.record_failure()
+    breaker.record_success()
+    for _ in range(3):
+        breaker.check()
+        breaker.record_failure()
+    assert breaker.state == OPEN
+    with pytest.raises(MeboCircuitOpenError):
+        breaker.check()
+    assert breaker.rejected == 1
+
+
+def test_half_open_circuit_lets_one_trial_through(clock):
+    breaker = CircuitBreaker(threshold=1, reset_timeout=5, clock=clock)
+    breaker.record_failure()
+    clock.now = 5
+    assert breaker.state == HALF_OPEN
+    breaker.check()
+    with pytest.raises(MeboCircuitOpenError):
+        breaker.check()
+    # a failed trial reopens the circuit for another reset_timeout
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    clock.now = 10
+    breaker.check()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+def test_idempotent_queries_are_retried(local_mebo, robot_server, commands):
+    robot_server.fail_next = 2
+    assert local_mebo.get_boundary_position()["s_up"] == 10
+    local_mebo.stop()
+    assert commands(robot_server) == ["get_boundary_position"] * 3 + ["fb_stop"]
+
+
+def test_commands_are_not_retried(local_mebo, robot_server):
+    robot_server.fail_next = 1
+    with pytest.raises(MeboRequestError):
+        local_mebo.arm.up()
+    assert [p["req"] for p in robot_server.received].count("s_up") == 1
+
+
+def test_open_circuit_fails_fast(unused_port):
+    m = Mebo(ip="127.0.0.1", port=unused_port, autoconnect=False)
+    m.circuit_breaker.threshold = 2
+    with pytest.raises(MeboRequestError):
+        m.get_boundary_position()
+    assert m.circuit_breaker.state == OPEN
+    with pytest.raises(MeboCircuitOpenError):
+        m.arm.up()
+    # stops are still attempted
+    with pytest.raises(MeboRequestError) as e:
+        m.stop()
+    assert not isinstance(e.value, MeboCircuitOpenError)
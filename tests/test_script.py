@@ -0,0 +1,117 @@
+import pytest
+
+from mebo import Mebo
+from mebo.exceptions import MeboCommandError
+from mebo.script import MotionScript, ScriptRunner, Step
+from mebo.simulator import MeboSimulator
+
+SCRIPT = """
+# wave hello
+0.0  move n speed=200 dur=300
+0.0  arm.up dur=200
+0.1  wrist.rotate_left
+0.15 claw.open
+0.2  stop
+"""
+
+
+def test_parse():
+    script = MotionScript.parse(SCRIPT)
+    assert len(script) == 5
+    assert script.duration == 0.2
+    assert script.steps[0] == Step(
+        0.0, "move", {"direction": "n", "speed": 200, "dur": 300}
+    )
+    assert script.steps[2] == Step(0.1, "wrist.rotate_left", {})
+
+
+def test_steps_are_sorted_by_time():
+    script = MotionScript([(0.5, "stop", {}), (0.0, "turn", {"direction": "l"})])
+    assert [step.command for step in script] == ["turn", "stop"]
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        "0 move north",
+        "0 move n speed=300",
+        "0 move n dur=fast",
+        "0 turn up",
+        "0 arm.wave",
+        "0 legs.up",
+        "0 stop now",
+        "0 claw.open force=1",
+        "-1 stop",
+        "soon stop",
+    ],
+)
+def test_invalid_scripts_are_rejected(line):
+    with pytest.raises(MeboCommandError):
+        MotionScript.parse(line)
+
+
+def test_run_script(local_mebo, robot_server):
+    reports = local_mebo.run_script(SCRIPT)
+    assert [report.step.command for report in reports] == [
+        "move",
+        "arm.up",
+        "wrist.rotate_left",
+        "claw.open",
+        "stop",
+    ]
+    received = [p["req"] for p in robot_server.received if p["req"] != "get_version"]
+    assert set(received) == {"move_forward", "s_up", "w_left", "c_open", "fb_stop"}
+    assert received.index("w_left") < received.index("fb_stop")
+    duration = MotionScript.parse(SCRIPT).duration
+    for report in reports:
+        assert report.latency >= 0
+        # steps are timed from the start of the script, so their errors don't add up
+        assert abs(report.error) < duration
+
+
+def test_runner_measures_latency(local_mebo):
+    runner = ScriptRunner(local_mebo, MotionScript.parse("0 stop\n0.05 stop"))
+    runner.run()
+    assert runner.rtt is not None
+    summary = runner.summary()
+    assert summary["steps"] == 2
+    assert summary["max_error"] >= summary["mean_error"]
+
+
+@pytest.fixture
+def slow_mebo():
+    with MeboSimulator(latency=0.05) as sim:
+        with Mebo(ip="127.0.0.1", port=sim.port, autoconnect=False) as m:
+            yield m
+
+
+def test_stop_steps_run_in_script_order(slow_mebo):
+    script = MotionScript.parse(
+        """
+        0.0   arm.up    dur=100
+        0.0   arm.down  dur=100
+        0.01  arm.stop
+        """
+    )
+    reports = slow_mebo.run_script(script)
+    assert [report.step.command for report in reports] == [
+        "arm.up",
+        "arm.down",
+        "arm.stop",
+    ]
+    assert all(report.sent is not None for report in reports)
+
+
+def test_steps_cancelled_by_a_stop_are_reported(slow_mebo):
+    script = MotionScript.parse(
+        """
+        0.0   move n  dur=100
+        0.0   stop
+        0.0   move s  dur=100
+        """
+    )
+    reports = slow_mebo.run_script(script)
+    assert reports[-1].step.command == "move"
+    assert reports[-1].sent is None
+    assert reports[-1].error is None
+    assert reports[1].sent is not None
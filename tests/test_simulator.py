@@ -0,0 +1,92 @@
+import threading
+import time
+
+import pytest
+
+from mebo import Mebo
+from mebo.exceptions import MeboRequestError
+from mebo.simulator import NETWORKS, MeboSimulator
+
+
+@pytest.fixture
+def simulator():
+    def make(**kwargs):
+        sim = MeboSimulator(**kwargs).start()
+        sims.append(sim)
+        return sim
+
+    sims = []
+    yield make
+    for sim in sims:
+        sim.close()
+
+
+def robot(sim, **kwargs):
+    return Mebo(ip="127.0.0.1", port=sim.port, autoconnect=False, **kwargs)
+
+
+def test_queries_and_commands(simulator):
+    sim = simulator()
+    with robot(sim) as m:
+        assert m.version == "03.02.37"
+        assert sorted(m.visible_networks()) == sorted(n[0] for n in NETWORKS)
+        m.move("n", speed=100, dur=500)
+        m.claw.open()
+    assert sim.received[-2:] == [
+        {"req": "move_forward", "dur": "500", "value": "100"},
+        {"req": "c_open"},
+    ]
+
+
+def test_latency(simulator):
+    sim = simulator(latency=0.05, jitter=0.01)
+    with robot(sim) as m:
+        m.transport.connect()
+        start = time.monotonic()
+        m.stop()
+        assert 0.04 <= time.monotonic() - start < 1
+
+
+def test_injected_errors_are_reproducible(simulator):
+    outcomes = []
+    for _ in range(2):
+        sim = simulator(error_rate=0.3, seed=7)
+        with robot(sim) as m:
+            m._breaker.threshold = 1000
+            outcome = []
+            for _ in range(20):
+                try:
+                    m.arm.up()
+                    outcome.append(True)
+                except MeboRequestError:
+                    outcome.append(False)
+            outcomes.append(outcome)
+        assert sim.stats()["errors"] == outcome.count(False)
+    assert outcomes[0] == outcomes[1]
+    assert 0 < outcomes[0].count(False) < 20
+
+
+def test_dropped_requests(simulator):
+    sim = simulator(drop_rate=1.0)
+    with robot(sim) as m:
+        assert m.version == "03.02.37"
+        with pytest.raises(MeboRequestError):
+            m.stop()
+    # a pooled connection that was hung up on is retried once on a fresh one
+    assert sim.dropped == [p["req"] for p in sim.received].count("fb_stop") >= 1
+
+
+def test_concurrency_limit(simulator):
+    sim = simulator(latency=0.05, max_concurrency=2)
+    with robot(sim, transport="raw") as m:
+        m._limiter.max_limit = 8
+        m._limiter.limit = 8
+        threads = [threading.Thread(target=m.arm.up) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert sim.peak == 2
+    assert sim.stats()["requests"] >= 6
+    sim.reset()
+    assert sim.stats() == {"requests": 0, "errors": 0, "dropped": 0, "peak": 0}
@@ -0,0 +1,77 @@
+import pytest
+
+from mebo.exceptions import MeboRequestError
+from mebo.stats import LatencyHistogram, RequestStats, smooth_rtt
+
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for ms in range(1, 101):
+        histogram.record(ms / 1000, nbytes=10)
+    histogram.record(0.5, ok=False)
+    stats = histogram.as_dict()
+    assert stats["count"] == 101
+    assert stats["errors"] == 1
+    assert stats["bytes"] == 1000
+    assert stats["min"] == 0.001
+    assert stats["max"] == 0.5
+    # buckets are about 19% wide
+    assert 0.050 <= stats["p50"] <= 0.050 * 1.2
+    assert 0.095 <= stats["p95"] <= 0.095 * 1.2
+    assert stats["p99"] <= 0.5
+
+
+def test_histogram_extremes():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(50) is None
+    histogram.record(0)
+    histogram.record(1000)
+    assert histogram.percentile(50) == LatencyHistogram.MIN_LATENCY
+    assert histogram.percentile(100) == 1000
+
+
+def test_hooks_are_called_and_removable():
+    stats = RequestStats()
+    calls = []
+    remove = stats.add_hooks(
+        before=lambda params: calls.append(("before", params)),
+        after=lambda params, latency, error: calls.append(("after", error)),
+    )
+    stats.add_hooks(after=lambda *args: 1 / 0)
+    stats.before({"req": "fb_stop"})
+    stats.after({"req": "fb_stop"}, 0.01)
+    assert calls == [("before", {"req": "fb_stop"}), ("after", None)]
+    remove()
+    stats.before({"req": "fb_stop"})
+    assert len(calls) == 2
+
+
+def test_mebo_stats(local_mebo, robot_server):
+    traced = []
+    local_mebo.add_request_hooks(
+        after=lambda params, latency, error: traced.append((params["req"], error))
+    )
+    for _ in range(3):
+        local_mebo.move("n")
+    local_mebo.arm.up()
+    robot_server.fail_next = 1
+    with pytest.raises(MeboRequestError):
+        local_mebo.claw.open()
+
+    stats = local_mebo.stats("move_forward", "s_up", "c_open")
+    assert set(stats) == {"move_forward", "s_up", "c_open"}
+    assert stats["move_forward"]["count"] == 3
+    assert stats["move_forward"]["bytes"] == 3 * len("move_forward:ok")
+    assert 0 < stats["move_forward"]["p50"] <= stats["move_forward"]["p99"]
+    assert stats["c_open"]["errors"] == 1
+    assert ("s_up", None) in traced
+    assert isinstance(traced[-1][1], MeboRequestError)
+
+    local_mebo.reset_stats()
+    assert local_mebo.stats() == {}
+
+
+def test_smooth_rtt():
+    assert smooth_rtt(None, 0.1) == 0.1
+    assert smooth_rtt(0.1, 0.5) == pytest.approx(0.2)
+    assert smooth_rtt(0.1, 0.5, weight=1) == 0.5
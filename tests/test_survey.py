@@ -0,0 +1,83 @@
+import pytest
+
+from mebo.robot import WirelessNetwork, iter_networks, parse_networks
+from mebo.survey import SiteSurvey
+
+
+def network(ssid, si=-60, channel="6", q="70"):
+    return WirelessNetwork(ssid, f"mac-{ssid}", "WPA2", q, str(si), "-90", channel)
+
+
+def rt_list(*networks):
+    entries = "".join(
+        "<w>" + "".join(f'<f>"{value}"</f>' for value in n) + "</w>" for n in networks
+    )
+    return f"<rt_list>{entries}</rt_list>"
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_iter_networks(chunk_size):
+    networks = [network("home"), network("cafe", si=-80)]
+    body = rt_list(*networks)
+    assert list(iter_networks(body, chunk_size=chunk_size)) == networks
+    assert list(iter_networks(body.encode("ascii"), chunk_size)) == networks
+
+
+def test_iter_networks_from_chunks():
+    body = rt_list(network("home"), network("cafe"))
+    chunks = [body[:30], body[30:31], body[31:]]
+    assert [n.ssid for n in iter_networks(iter(chunks))] == ["home", "cafe"]
+
+
+def test_parse_networks():
+    assert parse_networks(rt_list(network("home"))) == {"home": network("home")}
+    assert parse_networks("<rt_list></rt_list>") == {}
+
+
+def test_survey_reports_changes():
+    survey = SiteSurvey(threshold=3)
+    first = survey.update([network("home"), network("cafe")])
+    assert sorted(first.added) == ["cafe", "home"]
+    assert not first.lost and not first.changed
+
+    second = survey.update(
+        [network("home", si=-70), network("cafe", q="10"), network("lab")]
+    )
+    assert list(second.added) == ["lab"]
+    assert not second.lost
+    assert list(second.changed) == ["home"]
+    change = second.changed["home"]
+    assert change.delta == -10
+    assert change.previous == network("home")
+    assert change.current == network("home", si=-70)
+
+    third = survey.update([network("home", si=-70, channel="11")])
+    assert sorted(third.lost) == ["cafe", "lab"]
+    assert third.changed["home"].delta == 0
+    assert survey.scans == 3
+    assert len(survey) == 1
+
+
+def test_survey_accumulates_small_changes():
+    survey = SiteSurvey(threshold=3)
+    survey.update([network("home", si=-60)])
+    assert not survey.update([network("home", si=-62)]).changed
+    change = survey.update([network("home", si=-64)]).changed["home"]
+    assert change.delta == -4
+
+
+def test_survey_compares_non_numeric_signal():
+    survey = SiteSurvey()
+    survey.update([network("home", si="weak")])
+    assert survey.update([network("home", si="strong")]).changed["home"].delta is None
+
+
+def test_mebo_survey(local_mebo, robot_server):
+    robot_server.responses["get_rt_list"] = rt_list(network("home"))
+    scans = local_mebo.survey(interval=0, scans=2)
+    assert list(next(scans).added) == ["home"]
+    robot_server.responses["get_rt_list"] = rt_list(network("cafe"))
+    diff = next(scans)
+    assert list(diff.added) == ["cafe"]
+    assert list(diff.lost) == ["home"]
+    assert next(scans, None) is None
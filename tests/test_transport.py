@@ -0,0 +1,116 @@
+import time
+from http.client import HTTPException
+
+import pytest
+
+from mebo import Mebo
+from mebo.commands import CommandRegistry
+from mebo.exceptions import MeboConfigurationError, MeboRequestError
+from mebo.transport import (
+    HTTPTransport,
+    RawTransport,
+    Response,
+    SessionTransport,
+    parse_head,
+)
+
+
+@pytest.mark.parametrize("transport_class", [HTTPTransport, RawTransport])
+def test_keep_alive_detection(robot_server, transport_class):
+    transport = transport_class("127.0.0.1", port=robot_server.server_address[1])
+    transport.connect()
+    expected = robot_server.keep_alive
+    assert transport.keep_alive is expected
+    transport.close()
+    assert transport.keep_alive is None
+
+
+def test_connections_are_reused_with_keep_alive(local_mebo):
+    for _ in range(10):
+        local_mebo.stop()
+    stats = local_mebo.transport.stats
+    if local_mebo.transport.keep_alive:
+        assert stats.reuses >= 10
+        assert stats.connects <= local_mebo.transport.pool_size + 1
+    else:
+        assert stats.reuses == 0
+        assert stats.connects >= 10
+
+
+def test_request_round_trip(local_mebo, robot_server):
+    local_mebo.move("n", speed=100, dur=500)
+    assert robot_server.received[-1] == {
+        "req": "move_forward",
+        "dur": "500",
+        "value": "100",
+    }
+    assert local_mebo.version == "03.02.37"
+
+
+@pytest.mark.parametrize("transport_class", [HTTPTransport, RawTransport])
+def test_idle_connections_dropped_by_the_robot(idle_robot_server, transport_class):
+    transport = transport_class("127.0.0.1", port=idle_robot_server.port)
+    transport.connect()
+    # long enough for the robot to close every pooled connection
+    time.sleep(0.3)
+    assert transport.request({"req": "fb_stop"}).ok
+    assert transport.request({"req": "s_up", "dur": 500}).ok
+    transport.close()
+
+
+def test_unreachable_robot_raises_os_error(unused_port):
+    transport = HTTPTransport("127.0.0.1", port=unused_port, timeout=1)
+    with pytest.raises(OSError):
+        transport.request({"req": "fb_stop"})
+
+
+def test_mebo_wraps_transport_errors(unused_port):
+    m = Mebo(ip="127.0.0.1", port=unused_port, autoconnect=False)
+    with pytest.raises(MeboRequestError):
+        m.stop()
+
+
+def test_response_raise_for_status():
+    Response(200, "OK", b"fb_stop:ok").raise_for_status()
+    with pytest.raises(HTTPException):
+        Response(500, "Internal Server Error", b"").raise_for_status()
+
+
+def test_session_transport(robot_server):
+    transport = SessionTransport("127.0.0.1", port=robot_server.server_address[1])
+    assert transport.request({"req": "get_model"}).text == "get_model:001"
+    assert transport.stats.requests == 1
+    transport.close()
+
+
+def test_serialized_requests_are_reused():
+    serialize = CommandRegistry("127.0.0.1", port=8080)
+    first = serialize({"req": "c_open"})
+    assert first == b"GET /?req=c_open HTTP/1.1\r\nHost: 127.0.0.1:8080\r\n\r\n"
+    assert serialize({"req": "c_open"}) is first
+
+
+@pytest.mark.parametrize(
+    "head,expected",
+    [
+        (b"HTTP/1.1 200 OK\r\nContent-Length: 10", (200, "OK", False, 10)),
+        (
+            b"HTTP/1.1 200 OK\r\nConnection: close\r\nContent-Length: 3",
+            (200, "OK", True, 3),
+        ),
+        (b"HTTP/1.0 200 OK\r\nContent-Length: 3", (200, "OK", True, 3)),
+        (b"HTTP/1.0 404 Not Found", (404, "Not Found", True, None)),
+    ],
+)
+def test_parse_head(head, expected):
+    assert parse_head(head) == expected
+
+
+def test_parse_head_rejects_garbage():
+    with pytest.raises(HTTPException):
+        parse_head(b"garbage")
+
+
+def test_unknown_transport():
+    with pytest.raises(MeboConfigurationError):
+        Mebo(ip="127.0.0.1", autoconnect=False, transport="carrier-pigeon")
@@ -0,0 +1,48 @@
+import pytest
+
+from mebo import Mebo
+from mebo.exceptions import MeboConfigurationError
+from mebo.video import PRESETS, SPEED_TIERS, setting_commands
+
+
+def test_setting_commands_for_tier_zero_have_no_speed():
+    commands = setting_commands(PRESETS["default"], 0)
+    assert len(commands) == 5
+    assert {"req": "set_video_gop", "value": 40} in commands
+
+
+def test_apply_profile_sends_every_tier_once(local_mebo, robot_server, commands):
+    local_mebo.apply_profile("default")
+    assert len(commands(robot_server)) == 5 * len(SPEED_TIERS)
+    assert local_mebo.video_profiles == {
+        tier: PRESETS["default"] for tier in SPEED_TIERS
+    }
+
+    robot_server.received.clear()
+    local_mebo.apply_profile("default")
+    assert commands(robot_server) == []
+
+
+def test_apply_profile_sends_only_changes(local_mebo, robot_server, commands):
+    local_mebo.apply_profile("default")
+    robot_server.received.clear()
+    local_mebo.apply_profile({1: PRESETS["default"]._replace(qp=30)})
+    assert commands(robot_server) == ["set_video_qp"]
+    assert robot_server.received[-1] == {
+        "req": "set_video_qp",
+        "speed": "1",
+        "value": "30",
+    }
+
+
+def test_apply_profile_force(local_mebo, robot_server, commands):
+    local_mebo.apply_profile("default", tiers=[0])
+    local_mebo.apply_profile("default", tiers=[0], force=True)
+    assert len(commands(robot_server)) == 10
+
+
+@pytest.mark.parametrize("profile", ["cinematic", {7: "default"}])
+def test_apply_profile_rejects_unknown(profile):
+    m = Mebo(ip="127.0.0.1", autoconnect=False)
+    with pytest.raises(MeboConfigurationError):
+        m.apply_profile(profile)